@@ -155,6 +155,8 @@ from .router_qr import router as qr_router
 app.include_router(qr_router)
 from .router_display import router as display_router
 app.include_router(display_router)
+from .router_live import router as live_router, publish_records
+app.include_router(live_router)
 
 @app.post("/gateways", response_model=GatewayResponse)
 async def create_gateway(gateway: GatewayCreate, db: AsyncSession = Depends(get_db)):
@@ -325,6 +327,8 @@ async def ingest_telemetry(
 ):
     received_count = len(records)
     print(f"Received {received_count} telemetry records")
+    # Hot path: state, rules and live push (/live/...)
+    await publish_records(records)
     return {"status": "ok", "received": received_count}
 
 # --- Driver Hub Endpoints ---
@@ -0,0 +1,117 @@
+import hashlib
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from .auth import get_current_user_stub, get_user_with_roles, check_access
+from .db import get_db, DisplayDevice
+
+router = APIRouter(prefix="/live", tags=["Live"])
+
+KEEPALIVE_SEC = 15
+
+_hot_path = None
+
+def get_hot_path():
+    """In-process bus + StreamProcessor, wired once (the same stack functions/main.py uses)."""
+    global _hot_path
+    if _hot_path is None:
+        from cloud.processing.bus import bus
+        from cloud.processing.stream_processor import processor
+        bus.subscribe(processor.process_batch)
+        _hot_path = (bus, processor)
+    return _hot_path
+
+def _sse(event: str, data: Dict[str, Any], event_id: Optional[str] = None) -> str:
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+async def site_events(tenant_id: str, site_id: str, last_event_id: Optional[str],
+                      keepalive_sec: float = KEEPALIVE_SEC) -> AsyncIterator[str]:
+    """
+    SSE stream of per-site deltas. Starts with a `snapshot` event (machines,
+    fleet, alerts) unless `last_event_id` is a cursor the feed can resume
+    from. After that it sends one `machine` / `alert` event per delta. A
+    cursor that fell out of history (or comes from an earlier process) gets
+    a new `snapshot`.
+    """
+    from cloud.processing.live_feed import feed
+    _, processor = get_hot_path()
+
+    cursor = feed.parse_id(last_event_id)
+    if cursor is not None and not feed.since(tenant_id, site_id, cursor)[1]:
+        cursor = None
+
+    while True:
+        if cursor is None:
+            # Take the cursor first: deltas racing the snapshot are re-sent, never lost
+            cursor = feed.last_seq
+            view = processor.site_view(tenant_id, site_id)
+            yield _sse("snapshot", view, feed.event_id(cursor))
+
+        deltas, complete = await feed.wait(tenant_id, site_id, cursor, keepalive_sec)
+        if not complete:
+            cursor = None
+            continue
+        if not deltas:
+            yield ": keepalive\n\n"
+            continue
+        for seq, kind, data in deltas:
+            yield _sse(kind, data, feed.event_id(seq))
+            cursor = seq
+
+async def _authorize(request: Request, tenant_id: str, site_id: str, display_token: Optional[str], db: AsyncSession) -> bool:
+    """Display device token (wallboards; EventSource cannot send headers) or a user bearer token."""
+    if display_token:
+        token_hash = hashlib.sha256(display_token.encode()).hexdigest()
+        res = await db.execute(select(DisplayDevice).where(DisplayDevice.token_hash == token_hash))
+        display = res.scalars().first()
+        return bool(display and display.enabled and display.tenant_id == tenant_id and display.site_id == site_id)
+
+    auth_header = request.headers.get("Authorization") or ""
+    if not auth_header.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    user = await get_user_with_roles(await get_current_user_stub(auth_header[len("Bearer "):]), db)
+    return check_access(user, tenant_id, site_id)
+
+@router.get("/tenants/{tenant_id}/sites/{site_id}")
+async def stream_site(
+    tenant_id: str,
+    site_id: str,
+    request: Request,
+    last_event_id: Optional[str] = None,
+    display_token: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Server-Sent Events for a site; resumes from the Last-Event-ID header (or ?last_event_id=)."""
+    if not await _authorize(request, tenant_id, site_id, display_token, db):
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    cursor = request.headers.get("Last-Event-ID") or last_event_id
+
+    async def body():
+        async for chunk in site_events(tenant_id, site_id, cursor):
+            if await request.is_disconnected():
+                break
+            yield chunk
+
+    return StreamingResponse(body(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+async def publish_records(records: List[Dict[str, Any]]) -> int:
+    """Feeds agent telemetry into the hot path. Records without tenant/site/machine are skipped."""
+    keyed = [r for r in records if r.get("tenant_id") and r.get("site_id") and r.get("machine_id") and r.get("timestamp")]
+    if keyed:
+        bus, _ = get_hot_path()
+        await bus.publish(keyed)
+    return len(keyed)
@@ -0,0 +1,292 @@
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+class DedupBackend:
+    """Generic interface for a shared (cross-instance) idempotency store."""
+    def seen(self, keys: List[str]) -> Set[str]:
+        raise NotImplementedError
+
+    def mark(self, keys: List[str], ttl_sec: float):
+        raise NotImplementedError
+
+class SQLiteDedupBackend(DedupBackend):
+    """Local stand-in for the shared store; survives restarts and is shared by local processes."""
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS idempotency_keys (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)")
+
+    def seen(self, keys):
+        if not keys:
+            return set()
+        now = time.time()
+        found = set()
+        with self._lock, sqlite3.connect(self.path) as conn:
+            # SQLite caps bound parameters; chunk the IN list
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT key FROM idempotency_keys WHERE expires_at > ? AND key IN ({','.join('?' * len(chunk))})",
+                    [now, *chunk]
+                ).fetchall()
+                found.update(r[0] for r in rows)
+        return found
+
+    def mark(self, keys, ttl_sec):
+        expires_at = time.time() + ttl_sec
+        with self._lock, sqlite3.connect(self.path) as conn:
+            conn.executemany("INSERT OR REPLACE INTO idempotency_keys (key, expires_at) VALUES (?, ?)",
+                             [(k, expires_at) for k in keys])
+            conn.execute("DELETE FROM idempotency_keys WHERE expires_at <= ?", (time.time(),))
+
+class FirestoreDedupBackend(DedupBackend):
+    """
+    Firestore collection keyed by idempotency key. Configure a TTL policy on
+    `expires_at` so Firestore reclaims expired keys.
+    """
+    def __init__(self, client, collection: str = "ingest_idempotency"):
+        self.client = client
+        self.collection = collection
+
+    def _doc_id(self, key: str) -> str:
+        # Document IDs cannot contain '/'
+        return key.replace("/", "_")
+
+    def seen(self, keys):
+        if not keys:
+            return set()
+        from datetime import datetime, timezone
+        now = datetime.now(timezone.utc)
+        col = self.client.collection(self.collection)
+        by_id = {self._doc_id(k): k for k in keys}
+        found = set()
+        for snap in self.client.get_all([col.document(doc_id) for doc_id in by_id]):
+            if snap.exists:
+                expires_at = (snap.to_dict() or {}).get("expires_at")
+                if expires_at is None or expires_at > now:
+                    found.add(by_id[snap.id])
+        return found
+
+    def mark(self, keys, ttl_sec):
+        from datetime import datetime, timedelta, timezone
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl_sec)
+        col = self.client.collection(self.collection)
+        # Firestore batches are limited to 500 writes
+        for i in range(0, len(keys), 500):
+            batch = self.client.batch()
+            for key in keys[i:i + 500]:
+                batch.set(col.document(self._doc_id(key)), {"expires_at": expires_at})
+            batch.commit()
+
+class RedisDedupBackend(DedupBackend):
+    def __init__(self, url: str, prefix: str = "idem:"):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def seen(self, keys):
+        if not keys:
+            return set()
+        values = self.client.mget([self.prefix + k for k in keys])
+        return {k for k, v in zip(keys, values) if v is not None}
+
+    def mark(self, keys, ttl_sec):
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.set(self.prefix + key, 1, ex=max(1, int(ttl_sec)))
+        pipe.execute()
+
+class IdempotencyCache:
+    """
+    Bounded, TTL'd record of already-ingested batch idempotency keys and
+    record_ids. An in-instance LRU answers most retries; an optional shared
+    backend catches retries that land on a different instance.
+
+    Keys are marked only after the warehouse write succeeds, so a failed
+    attempt is never mistaken for a completed one.
+    """
+    def __init__(self, max_entries: int = 200_000, ttl_sec: float = 24 * 3600,
+                 backend: Optional[DedupBackend] = None):
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self.backend = backend
+        self._lru: "OrderedDict[str, float]" = OrderedDict()  # key -> expires_at (monotonic)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _local_seen(self, keys: Iterable[str]) -> Set[str]:
+        now = time.monotonic()
+        found = set()
+        with self._lock:
+            for key in keys:
+                expires_at = self._lru.get(key)
+                if expires_at is None:
+                    continue
+                if expires_at <= now:
+                    del self._lru[key]
+                    continue
+                self._lru.move_to_end(key)
+                found.add(key)
+        return found
+
+    def _local_mark(self, keys: Iterable[str]):
+        expires_at = time.monotonic() + self.ttl_sec
+        with self._lock:
+            for key in keys:
+                self._lru[key] = expires_at
+                self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+    def seen(self, keys: List[str]) -> Set[str]:
+        """Returns the subset of keys already ingested."""
+        found = self._local_seen(keys)
+        remaining = [k for k in keys if k not in found]
+        if remaining and self.backend:
+            try:
+                shared = self.backend.seen(remaining)
+            except Exception as e:
+                logger.warning(f"Idempotency: shared backend lookup failed: {e}")
+                shared = set()
+            if shared:
+                self._local_mark(shared)
+                found |= shared
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def mark(self, keys: List[str]):
+        if not keys:
+            return
+        self._local_mark(keys)
+        if self.backend:
+            try:
+                self.backend.mark(keys, self.ttl_sec)
+            except Exception as e:
+                logger.warning(f"Idempotency: shared backend write failed: {e}")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._lru),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+class GenerationalSet:
+    """
+    Exact membership set bounded by time and size. Keys go into the newest
+    of `generations` sets; a new generation starts every window_sec /
+    generations seconds (or when the newest fills its share of max_entries)
+    and the oldest is dropped. A key is remembered for at least
+    window_sec * (generations - 1) / generations and at most window_sec,
+    unless size pressure rotates generations sooner.
+
+    Unlike a Bloom filter there are no false positives: a miss means the key
+    was never added or has aged out of the horizon.
+    """
+    # Per-entry estimate for a 64-char hex id: str object + set slot
+    ENTRY_BYTES = sys.getsizeof("0" * 64) + 16
+
+    def __init__(self, window_sec: float = 6 * 3600, generations: int = 6, max_entries: int = 1_000_000,
+                 name: str = "dedup", clock=time.monotonic):
+        self.window_sec = window_sec
+        self.generations = max(2, generations)
+        self.max_entries = max_entries
+        self.name = name
+        self._clock = clock
+        self._gen_span = window_sec / self.generations
+        self._gen_cap = max(1, max_entries // self.generations)
+        self._gens: Deque[Tuple[float, Set[str]]] = deque([(clock(), set())])
+        self.hits = 0
+        self.evicted = 0
+
+    def __contains__(self, key: str) -> bool:
+        self._maybe_rotate()
+        for _, keys in reversed(self._gens):
+            if key in keys:
+                self.hits += 1
+                return True
+        return False
+
+    def add(self, key: str):
+        self._maybe_rotate()
+        self._gens[-1][1].add(key)
+
+    def __len__(self) -> int:
+        return sum(len(keys) for _, keys in self._gens)
+
+    def __iter__(self) -> Iterator[str]:
+        for _, keys in self._gens:
+            yield from keys
+
+    def clear(self):
+        self._gens = deque([(self._clock(), set())])
+
+    def _maybe_rotate(self):
+        started, newest = self._gens[-1]
+        if self._clock() - started < self._gen_span and len(newest) < self._gen_cap:
+            return
+        now = self._clock()
+        self._gens.append((now, set()))
+        # Drop by count, and drop generations that began a full window ago (idle gaps)
+        while len(self._gens) > self.generations or (len(self._gens) > 1 and self._gens[0][0] <= now - self.window_sec):
+            _, dropped = self._gens.popleft()
+            self.evicted += len(dropped)
+        self._report()
+
+    def stats(self) -> Dict[str, float]:
+        entries = len(self)
+        return {
+            "entries": entries,
+            "generations": len(self._gens),
+            "memory_bytes": entries * self.ENTRY_BYTES,
+            "horizon_sec": self._clock() - self._gens[0][0],
+            "hits": self.hits,
+            "evicted": self.evicted,
+        }
+
+    def _report(self):
+        from simco_agent.observability.metrics import cloud_metrics
+        stats = self.stats()
+        labels = {"set": self.name}
+        cloud_metrics.gauge("cloud.processor.dedup_entries", stats["entries"], labels=labels)
+        cloud_metrics.gauge("cloud.processor.dedup_memory_bytes", stats["memory_bytes"], labels=labels)
+        cloud_metrics.gauge("cloud.processor.dedup_horizon_sec", stats["horizon_sec"], labels=labels)
+        cloud_metrics.gauge("cloud.processor.dedup_evicted_total", stats["evicted"], labels=labels)
+
+def build_idempotency_cache(firestore_factory=None) -> IdempotencyCache:
+    """
+    IDEMPOTENCY_BACKEND selects the shared store: none (default, LRU only) |
+    sqlite (IDEMPOTENCY_SQLITE_PATH) | firestore | redis (IDEMPOTENCY_REDIS_URL).
+    """
+    mode = os.environ.get("IDEMPOTENCY_BACKEND", "none")
+    ttl_sec = float(os.environ.get("IDEMPOTENCY_TTL_SEC", 24 * 3600))
+    max_entries = int(os.environ.get("IDEMPOTENCY_MAX_ENTRIES", 200_000))
+
+    backend: Optional[DedupBackend] = None
+    try:
+        if mode == "sqlite":
+            backend = SQLiteDedupBackend(os.environ.get("IDEMPOTENCY_SQLITE_PATH", "idempotency.db"))
+        elif mode == "firestore" and firestore_factory:
+            backend = FirestoreDedupBackend(firestore_factory())
+        elif mode == "redis":
+            backend = RedisDedupBackend(os.environ.get("IDEMPOTENCY_REDIS_URL", "redis://localhost:6379/0"))
+    except Exception as e:
+        logger.warning(f"Idempotency: {mode} backend unavailable ({e}), using in-instance LRU only")
+        backend = None
+
+    return IdempotencyCache(max_entries=max_entries, ttl_sec=ttl_sec, backend=backend)
@@ -0,0 +1,276 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Columns kept per machine (a subset of raw_telemetry)
+LATEST_FIELDS = ("tenant_id", "site_id", "machine_id", "device_id", "timestamp", "status", "metrics", "ip", "vendor")
+
+class LatestBackend:
+    """Generic interface for the shared latest-record-per-machine store."""
+    def upsert(self, rows: List[Dict[str, Any]]):
+        """Writes rows, keyed by (tenant_id, machine_id). A row older than the stored one must not win."""
+        raise NotImplementedError
+
+    def get(self, tenant_id: str, machine_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def find(self, machine_id: str) -> Optional[Dict[str, Any]]:
+        """Latest row for a machine_id in any tenant (QR tokens carry only the machine id)."""
+        raise NotImplementedError
+
+    def list_tenant(self, tenant_id: str) -> List[Dict[str, Any]]:
+        """Latest row of every machine of a tenant (fleet health)."""
+        raise NotImplementedError
+
+class SQLiteLatestBackend(LatestBackend):
+    """Local stand-in for the shared store; survives restarts and is shared by local processes."""
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS machine_latest (
+                    tenant_id TEXT NOT NULL,
+                    machine_id TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    PRIMARY KEY (tenant_id, machine_id)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS machine_latest_by_machine ON machine_latest (machine_id)")
+
+    def upsert(self, rows):
+        with self._lock, sqlite3.connect(self.path) as conn:
+            conn.executemany(
+                """
+                INSERT INTO machine_latest (tenant_id, machine_id, timestamp, payload) VALUES (?, ?, ?, ?)
+                ON CONFLICT (tenant_id, machine_id) DO UPDATE SET timestamp = excluded.timestamp, payload = excluded.payload
+                WHERE excluded.timestamp >= machine_latest.timestamp
+                """,
+                [(r["tenant_id"], r["machine_id"], str(r.get("timestamp") or ""), json.dumps(r, default=str)) for r in rows]
+            )
+
+    def get(self, tenant_id, machine_id):
+        with self._lock, sqlite3.connect(self.path) as conn:
+            row = conn.execute("SELECT payload FROM machine_latest WHERE tenant_id = ? AND machine_id = ?",
+                               (tenant_id, machine_id)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find(self, machine_id):
+        with self._lock, sqlite3.connect(self.path) as conn:
+            row = conn.execute("SELECT payload FROM machine_latest WHERE machine_id = ? ORDER BY timestamp DESC LIMIT 1",
+                               (machine_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_tenant(self, tenant_id):
+        with self._lock, sqlite3.connect(self.path) as conn:
+            rows = conn.execute("SELECT payload FROM machine_latest WHERE tenant_id = ?", (tenant_id,)).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+class FirestoreLatestBackend(LatestBackend):
+    """
+    Firestore collection with one document per `<tenant_id>:<machine_id>`.
+    Each chunk of rows is written in a transaction that reads the stored
+    documents first and skips rows older than them, so a late write from
+    another instance never replaces a newer record.
+    """
+    def __init__(self, client, collection: str = "machine_latest"):
+        self.client = client
+        self.collection = collection
+
+    def _doc_id(self, tenant_id: str, machine_id: str) -> str:
+        # Document IDs cannot contain '/'
+        return f"{tenant_id}:{machine_id}".replace("/", "_")
+
+    def upsert(self, rows):
+        from google.cloud import firestore
+        col = self.client.collection(self.collection)
+
+        @firestore.transactional
+        def write_newer(transaction, chunk):
+            refs = [col.document(self._doc_id(row["tenant_id"], row["machine_id"])) for row in chunk]
+            stored = {snap.id: (snap.to_dict() or {}).get("timestamp")
+                      for snap in self.client.get_all(refs, transaction=transaction) if snap.exists}
+            for ref, row in zip(refs, chunk):
+                if ref.id in stored and str(row.get("timestamp") or "") < str(stored[ref.id] or ""):
+                    continue
+                transaction.set(ref, row)
+
+        # Firestore transactions are limited to 500 writes; contended ones are retried by @transactional
+        for i in range(0, len(rows), 500):
+            write_newer(self.client.transaction(), rows[i:i + 500])
+
+    def get(self, tenant_id, machine_id):
+        snap = self.client.collection(self.collection).document(self._doc_id(tenant_id, machine_id)).get()
+        return snap.to_dict() if snap.exists else None
+
+    def find(self, machine_id):
+        docs = self.client.collection(self.collection).where("machine_id", "==", machine_id).limit(1).get()
+        return docs[0].to_dict() if docs else None
+
+    def list_tenant(self, tenant_id):
+        return [d.to_dict() for d in self.client.collection(self.collection).where("tenant_id", "==", tenant_id).get()]
+
+class _Cached:
+    __slots__ = ("row", "fetched_at", "written_at")
+
+    def __init__(self, row: Optional[Dict[str, Any]], fetched_at: float, written_at: float = 0.0):
+        self.row = row
+        self.fetched_at = fetched_at
+        self.written_at = written_at
+
+class MachineLatestStore:
+    """
+    Latest telemetry record per machine, maintained from the ingest hot path
+    so point reads (machine state, mobile QR context) do not scan
+    raw_telemetry in BigQuery.
+
+    `update()` keeps only the newest record per machine of a batch and never
+    replaces a record with an older one. Writes of an unchanged status are
+    throttled to one per `min_write_interval_sec` per machine (Firestore
+    sustains about one write per second per document); a status change is
+    always written. Reads are served from an in-instance LRU for
+    `read_ttl_sec`, then from the shared backend; a failed backend read
+    returns None so callers fall back to BigQuery. Without a backend the
+    LRU is the store.
+    """
+    def __init__(self, backend: Optional[LatestBackend] = None, max_entries: int = 50_000,
+                 read_ttl_sec: float = 2.0, min_write_interval_sec: float = 1.0):
+        self.backend = backend
+        self.max_entries = max_entries
+        self.read_ttl_sec = read_ttl_sec
+        self.min_write_interval_sec = min_write_interval_sec
+        self._lru: "OrderedDict[Tuple[str, str], _Cached]" = OrderedDict()
+        self._by_machine: Dict[str, str] = {}  # machine_id -> tenant_id of its latest record
+        self._lock = threading.Lock()
+
+    def _remember(self, key: Tuple[str, str], entry: _Cached):
+        self._lru[key] = entry
+        self._lru.move_to_end(key)
+        if entry.row is not None:
+            self._by_machine[key[1]] = key[0]
+        while len(self._lru) > self.max_entries:
+            (tenant_id, machine_id), _ = self._lru.popitem(last=False)
+            if self._by_machine.get(machine_id) == tenant_id:
+                del self._by_machine[machine_id]
+
+    def update(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Applies ingested records (model_dump'ed dicts). Returns the number of rows written to the backend."""
+        from simco_agent.observability.metrics import cloud_metrics
+        newest: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for record in records:
+            if not record.get("tenant_id") or not record.get("machine_id"):
+                continue
+            key = (record["tenant_id"], record["machine_id"])
+            current = newest.get(key)
+            if current is None or str(record.get("timestamp") or "") >= str(current.get("timestamp") or ""):
+                newest[key] = record
+
+        now = time.monotonic()
+        to_write = []
+        with self._lock:
+            for key, record in newest.items():
+                row = {f: record.get(f) for f in LATEST_FIELDS}
+                cached = self._lru.get(key)
+                previous = cached.row if cached else None
+                if previous is not None and str(row["timestamp"] or "") < str(previous.get("timestamp") or ""):
+                    continue
+                write = (previous is None or row["status"] != previous.get("status")
+                         or now - cached.written_at >= self.min_write_interval_sec)
+                self._remember(key, _Cached(row, now, now if write else cached.written_at))
+                if write:
+                    to_write.append(row)
+
+        if self.backend is not None and to_write:
+            start = time.monotonic()
+            self.backend.upsert(to_write)
+            cloud_metrics.histogram("cloud.machine_latest.write_latency_ms", (time.monotonic() - start) * 1000)
+        cloud_metrics.counter("cloud.machine_latest.write_count", len(to_write))
+        cloud_metrics.counter("cloud.machine_latest.throttled_count", len(newest) - len(to_write))
+        return len(to_write)
+
+    def _read(self, key: Optional[Tuple[str, str]], load) -> Optional[Dict[str, Any]]:
+        from simco_agent.observability.metrics import cloud_metrics
+        now = time.monotonic()
+        with self._lock:
+            cached = self._lru.get(key) if key else None
+            if cached is not None:
+                self._lru.move_to_end(key)
+        if cached is not None and (self.backend is None or now - cached.fetched_at < self.read_ttl_sec):
+            cloud_metrics.counter("cloud.machine_latest.read_count", 1, labels={"source": "local"})
+            return cached.row
+        if self.backend is None:
+            cloud_metrics.counter("cloud.machine_latest.read_count", 1, labels={"source": "miss"})
+            return None
+
+        start = time.monotonic()
+        try:
+            row = load()
+        except Exception as e:
+            # Callers fall back to BigQuery on None
+            logger.error(f"MachineLatest: backend read failed: {e}")
+            cloud_metrics.counter("cloud.machine_latest.read_count", 1, labels={"source": "error"})
+            return cached.row if cached is not None else None
+        cloud_metrics.histogram("cloud.machine_latest.read_latency_ms", (time.monotonic() - start) * 1000)
+        cloud_metrics.counter("cloud.machine_latest.read_count", 1, labels={"source": "backend" if row else "miss"})
+        if row is not None:
+            with self._lock:
+                key = (row["tenant_id"], row["machine_id"])
+                cached = self._lru.get(key)
+                self._remember(key, _Cached(row, time.monotonic(), cached.written_at if cached else 0.0))
+        return row
+
+    def get(self, tenant_id: str, machine_id: str) -> Optional[Dict[str, Any]]:
+        """Latest record of a machine, or None if the store has never seen it."""
+        return self._read((tenant_id, machine_id), lambda: self.backend.get(tenant_id, machine_id))
+
+    def find(self, machine_id: str) -> Optional[Dict[str, Any]]:
+        """Latest record of a machine_id in any tenant."""
+        with self._lock:
+            tenant_id = self._by_machine.get(machine_id)
+        key = (tenant_id, machine_id) if tenant_id else None
+        return self._read(key, lambda: self.backend.find(machine_id))
+
+    def list_tenant(self, tenant_id: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Latest record of every machine of a tenant, read from the shared
+        backend. None without a backend (the LRU only holds what this instance
+        ingested) or when the read fails, so callers fall back to BigQuery.
+        """
+        if self.backend is None:
+            return None
+        try:
+            return self.backend.list_tenant(tenant_id)
+        except Exception as e:
+            logger.error(f"MachineLatest: backend list failed: {e}")
+            return None
+
+def build_machine_latest(firestore_factory=None) -> MachineLatestStore:
+    """
+    MACHINE_LATEST_BACKEND selects the shared store: none (default, in-instance
+    only) | sqlite (MACHINE_LATEST_SQLITE_PATH) | firestore.
+    """
+    mode = os.environ.get("MACHINE_LATEST_BACKEND", "none")
+    backend: Optional[LatestBackend] = None
+    try:
+        if mode == "sqlite":
+            backend = SQLiteLatestBackend(os.environ.get("MACHINE_LATEST_SQLITE_PATH", "machine_latest.db"))
+        elif mode == "firestore" and firestore_factory:
+            backend = FirestoreLatestBackend(firestore_factory())
+    except Exception as e:
+        logger.warning(f"MachineLatest: {mode} backend unavailable ({e}), using in-instance store only")
+        backend = None
+
+    return MachineLatestStore(
+        backend=backend,
+        max_entries=int(os.environ.get("MACHINE_LATEST_MAX_ENTRIES", 50_000)),
+        read_ttl_sec=float(os.environ.get("MACHINE_LATEST_READ_TTL_SEC", 2.0)),
+        min_write_interval_sec=float(os.environ.get("MACHINE_LATEST_MIN_WRITE_INTERVAL_SEC", 1.0)),
+    )
@@ -0,0 +1,284 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+class SinkBackend:
+    """Generic interface for a warehouse append backend."""
+    def append_rows(self, rows: List[Dict[str, Any]], row_ids: List[Optional[str]]) -> List[Dict[str, Any]]:
+        """Appends rows. Returns insert_rows_json-style errors: [{"index": i, "errors": [...]}]."""
+        raise NotImplementedError
+
+class StreamingInsertBackend(SinkBackend):
+    """Legacy tabledata.insertAll streaming (best-effort dedup via row_ids)."""
+    def __init__(self, client_factory: Callable[[], Any], table: str):
+        self.client_factory = client_factory
+        self.table = table
+
+    def append_rows(self, rows, row_ids):
+        return self.client_factory().insert_rows_json(self.table, rows, row_ids=row_ids)
+
+_PROTO_TYPES = {"FLOAT64": "TYPE_DOUBLE", "INT64": "TYPE_INT64", "BOOL": "TYPE_BOOL"}
+_PY_TYPES = {"FLOAT64": float, "INT64": int, "BOOL": bool}
+
+class StorageWriteBackend(SinkBackend):
+    """
+    BigQuery Storage Write API, default stream (at-least-once).
+    Rows are encoded against a flat proto2 schema where every column is a
+    string; BigQuery converts strings into the TIMESTAMP/JSON column types.
+    Columns listed in `column_types` as FLOAT64/INT64/BOOL are encoded as
+    double/int64/bool instead, which BigQuery does not convert from strings.
+    Duplicate suppression is handled upstream (record_id idempotency), since
+    the default stream ignores row_ids; build_telemetry_sink only selects this
+    backend when that idempotency cache has a shared store.
+    """
+    def __init__(self, project_id: str, dataset_id: str, table_id: str, columns: Sequence[str],
+                 column_types: Optional[Dict[str, str]] = None):
+        from google.cloud.bigquery_storage_v1 import BigQueryWriteClient, types, writer
+        from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+
+        self.columns = list(columns)
+        self.column_types = {c: t for c, t in (column_types or {}).items() if t in _PROTO_TYPES}
+        self._types = types
+
+        file_proto = descriptor_pb2.FileDescriptorProto(name="simco_sink_row.proto", package="simco", syntax="proto2")
+        msg = file_proto.message_type.add(name="SinkRow")
+        for number, col in enumerate(self.columns, start=1):
+            msg.field.add(
+                name=col, number=number,
+                type=getattr(descriptor_pb2.FieldDescriptorProto, _PROTO_TYPES.get(self.column_types.get(col), "TYPE_STRING")),
+                label=descriptor_pb2.FieldDescriptorProto.LABEL_OPTIONAL
+            )
+        pool = descriptor_pool.DescriptorPool()
+        pool.Add(file_proto)
+        descriptor = pool.FindMessageTypeByName("simco.SinkRow")
+        self._row_cls = message_factory.GetMessageClass(descriptor)
+
+        proto_descriptor = descriptor_pb2.DescriptorProto()
+        descriptor.CopyToProto(proto_descriptor)
+
+        self.client = BigQueryWriteClient()
+        parent = self.client.table_path(project_id, dataset_id, table_id)
+        template = types.AppendRowsRequest(
+            write_stream=f"{parent}/streams/_default",
+            proto_rows=types.AppendRowsRequest.ProtoData(
+                writer_schema=types.ProtoSchema(proto_descriptor=proto_descriptor)
+            ),
+        )
+        self._stream = writer.AppendRowsStream(self.client, template)
+        self._stream_lock = threading.Lock()
+
+    def _encode(self, row: Dict[str, Any]) -> bytes:
+        msg = self._row_cls()
+        for col in self.columns:
+            val = row.get(col)
+            if val is None:
+                continue
+            if col in self.column_types:
+                setattr(msg, col, _PY_TYPES[self.column_types[col]](val))
+            else:
+                setattr(msg, col, val if isinstance(val, str) else json.dumps(val))
+        return msg.SerializeToString()
+
+    def append_rows(self, rows, row_ids):
+        types = self._types
+        proto_rows = types.ProtoRows(serialized_rows=[self._encode(r) for r in rows])
+        request = types.AppendRowsRequest(proto_rows=types.AppendRowsRequest.ProtoData(rows=proto_rows))
+        try:
+            with self._stream_lock:
+                future = self._stream.send(request)
+            response = future.result()
+        except Exception as e:
+            return [{"index": i, "errors": [{"reason": "append_failed", "message": str(e)}]} for i in range(len(rows))]
+        return [
+            {"index": err.index, "errors": [{"reason": str(err.code), "message": err.message}]}
+            for err in getattr(response, "row_errors", [])
+        ]
+
+class SQLiteSinkBackend(SinkBackend):
+    """Local stand-in: persists rows to SQLite, deduplicating on row_id like insertAll."""
+    def __init__(self, path: str, table: str):
+        self.path = path
+        self.table = table
+        self._lock = threading.Lock()
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sink_rows (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    table_name TEXT NOT NULL,
+                    row_id TEXT,
+                    payload TEXT NOT NULL,
+                    appended_at REAL NOT NULL,
+                    UNIQUE(table_name, row_id)
+                )
+            """)
+
+    def append_rows(self, rows, row_ids):
+        now = time.time()
+        with self._lock, sqlite3.connect(self.path) as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO sink_rows (table_name, row_id, payload, appended_at) VALUES (?, ?, ?, ?)",
+                [(self.table, rid, json.dumps(row, default=str), now) for row, rid in zip(rows, row_ids)]
+            )
+        return []
+
+class _PendingWrite:
+    __slots__ = ("rows", "row_ids", "nbytes", "future", "enqueued_at")
+
+    def __init__(self, rows, row_ids, nbytes):
+        self.rows = rows
+        self.row_ids = row_ids
+        self.nbytes = nbytes
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+
+class TelemetrySink:
+    """
+    Coalesces rows from concurrent requests within an instance into larger
+    appends (group commit). A writer blocks until the batch holding its rows
+    is appended, so acknowledging the edge still implies the rows landed.
+    A batch is flushed once it reaches max_batch_rows / max_batch_bytes or
+    the oldest pending write has waited max_linger_ms.
+    """
+    def __init__(self, backend: SinkBackend, name: str = "raw_telemetry",
+                 max_batch_rows: int = 5000, max_batch_bytes: int = 8 * 1024 * 1024,
+                 max_linger_ms: float = 25):
+        self.backend = backend
+        self.name = name
+        self.max_batch_rows = max_batch_rows
+        self.max_batch_bytes = max_batch_bytes
+        self.max_linger = max_linger_ms / 1000.0
+        self._pending: List[_PendingWrite] = []
+        self._pending_rows = 0
+        self._pending_bytes = 0
+        self._cond = threading.Condition()
+        self._flusher: Optional[threading.Thread] = None
+
+    def write(self, rows: List[Dict[str, Any]], row_ids: Optional[List[Optional[str]]] = None,
+              timeout: Optional[float] = 30) -> List[Dict[str, Any]]:
+        """Appends rows and waits for the flush. Returns errors indexed into `rows`."""
+        if not rows:
+            return []
+        return self.submit(rows, row_ids).result(timeout=timeout)
+
+    def submit(self, rows: List[Dict[str, Any]], row_ids: Optional[List[Optional[str]]] = None) -> Future:
+        row_ids = list(row_ids) if row_ids is not None else [None] * len(rows)
+        nbytes = sum(len(json.dumps(r, default=str)) for r in rows)
+        pending = _PendingWrite(rows, row_ids, nbytes)
+        with self._cond:
+            self._pending.append(pending)
+            self._pending_rows += len(rows)
+            self._pending_bytes += nbytes
+            self._ensure_flusher()
+            self._cond.notify()
+        return pending.future
+
+    def backlog(self) -> Dict[str, int]:
+        with self._cond:
+            return {"rows": self._pending_rows, "bytes": self._pending_bytes, "writes": len(self._pending)}
+
+    def _ensure_flusher(self):
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._flush_loop, name=f"sink-{self.name}", daemon=True)
+            self._flusher.start()
+
+    def _budget_reached(self) -> bool:
+        return self._pending_rows >= self.max_batch_rows or self._pending_bytes >= self.max_batch_bytes
+
+    def _take_batch(self) -> List[_PendingWrite]:
+        batch, rows, nbytes = [], 0, 0
+        while self._pending:
+            nxt = self._pending[0]
+            if batch and (rows + len(nxt.rows) > self.max_batch_rows or nbytes + nxt.nbytes > self.max_batch_bytes):
+                break
+            batch.append(self._pending.pop(0))
+            rows += len(nxt.rows)
+            nbytes += nxt.nbytes
+        self._pending_rows -= rows
+        self._pending_bytes -= nbytes
+        return batch
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                deadline = self._pending[0].enqueued_at + self.max_linger
+                while not self._budget_reached():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._take_batch()
+                backlog_rows = self._pending_rows
+            self._append(batch, backlog_rows)
+
+    def _append(self, batch: List[_PendingWrite], backlog_rows: int):
+        from simco_agent.observability.metrics import cloud_metrics
+        rows = [r for p in batch for r in p.rows]
+        row_ids = [rid for p in batch for rid in p.row_ids]
+
+        start = time.monotonic()
+        try:
+            errors = self.backend.append_rows(rows, row_ids) or []
+        except Exception as e:
+            logger.error(f"TelemetrySink[{self.name}]: Append failed: {e}")
+            for p in batch:
+                p.future.set_exception(e)
+            cloud_metrics.counter("cloud.sink.append_failed_count", len(rows), labels={"sink": self.name})
+            return
+
+        labels = {"sink": self.name}
+        cloud_metrics.histogram("cloud.sink.append_latency_ms", (time.monotonic() - start) * 1000, labels=labels)
+        cloud_metrics.histogram("cloud.sink.batch_rows", len(rows), labels=labels)
+        cloud_metrics.gauge("cloud.sink.backlog_rows", backlog_rows, labels=labels)
+        if errors:
+            cloud_metrics.counter("cloud.sink.row_errors_count", len(errors), labels=labels)
+
+        # Hand each writer the errors for its own slice, re-indexed
+        offset = 0
+        for p in batch:
+            end = offset + len(p.rows)
+            mine = [dict(e, index=e["index"] - offset) for e in errors if offset <= e.get("index", -1) < end]
+            p.future.set_result(mine)
+            offset = end
+
+def build_telemetry_sink(dataset: str, table: str, columns: Sequence[str],
+                         client_factory: Callable[[], Any],
+                         column_types: Optional[Dict[str, str]] = None) -> TelemetrySink:
+    """
+    Selects the backend from TELEMETRY_SINK:
+    streaming (default) | storage_write | sqlite (TELEMETRY_SINK_SQLITE_PATH).
+    `column_types` maps non-string columns to their BigQuery type.
+
+    storage_write loses insertId dedup, so it is refused (streaming is used)
+    unless IDEMPOTENCY_BACKEND names a shared store that catches retries
+    routed to another instance.
+    """
+    mode = os.environ.get("TELEMETRY_SINK", "streaming")
+    if mode == "storage_write" and os.environ.get("IDEMPOTENCY_BACKEND", "none") == "none":
+        logger.warning("TelemetrySink: storage_write needs a shared IDEMPOTENCY_BACKEND for dedup, using streaming inserts")
+        mode = "streaming"
+    linger_ms = float(os.environ.get("TELEMETRY_SINK_LINGER_MS", "25"))
+
+    backend: SinkBackend
+    if mode == "sqlite":
+        backend = SQLiteSinkBackend(os.environ.get("TELEMETRY_SINK_SQLITE_PATH", "telemetry_sink.db"), f"{dataset}.{table}")
+    elif mode == "storage_write":
+        try:
+            project_id = client_factory().project
+            backend = StorageWriteBackend(project_id, dataset, table, columns, column_types)
+        except Exception as e:
+            logger.warning(f"TelemetrySink: Storage Write API unavailable ({e}), using streaming inserts")
+            backend = StreamingInsertBackend(client_factory, f"{dataset}.{table}")
+    else:
+        backend = StreamingInsertBackend(client_factory, f"{dataset}.{table}")
+
+    logger.info(f"TelemetrySink: {table} -> {type(backend).__name__} (linger={linger_ms}ms)")
+    return TelemetrySink(backend, name=table, max_linger_ms=linger_ms)
@@ -0,0 +1,66 @@
+import json
+from typing import Any, Dict
+
+from simco_common.signals import SIGNALS, SIGNALS_BY_NAME, SIGNAL_COLUMNS, split_metrics
+
+# raw_telemetry columns written by ingest: envelope, typed catalog signals, JSON overflow in `metrics`
+RAW_TELEMETRY_BASE_FIELDS = ("record_id", "tenant_id", "site_id", "machine_id", "device_id",
+                             "timestamp", "status", "metrics", "ip", "vendor")
+RAW_TELEMETRY_FIELDS = RAW_TELEMETRY_BASE_FIELDS + SIGNAL_COLUMNS
+RAW_TELEMETRY_COLUMN_TYPES: Dict[str, str] = {s.name: s.bq_type for s in SIGNALS}
+# SELECT list that simco_common.signals.merge_metrics() turns back into one metrics dict
+METRICS_SELECT = ", ".join(("metrics",) + SIGNAL_COLUMNS)
+
+def telemetry_row(record: Dict[str, Any]) -> Dict[str, Any]:
+    """raw_telemetry row for an ingested record: catalog signals in their typed columns, the rest in `metrics`."""
+    row = {k: v for k, v in record.items() if k in RAW_TELEMETRY_BASE_FIELDS}
+    metrics = row.get("metrics")
+    if isinstance(metrics, dict):
+        typed, overflow = split_metrics(metrics)
+        row.update(typed)
+        row["metrics"] = json.dumps(overflow) if overflow else None
+    return row
+
+def metric_expr(name: str, cast: str = "FLOAT64") -> str:
+    """
+    SQL for one metric: the typed column for catalog signals (reads only that
+    column), a JSON_VALUE over the `metrics` overflow otherwise. `name` must
+    be a trusted identifier.
+    """
+    if name in SIGNALS_BY_NAME:
+        return name
+    return f"SAFE_CAST(JSON_VALUE(metrics, '$.{name}') AS {cast})"
+
+def time_range(column: str = "timestamp", start: str = "@start_ts", end: str = "@end_ts") -> str:
+    """Half-open range on the raw partitioning column, compared to TIMESTAMP parameters so partitions are pruned."""
+    return f"{column} >= {start} AND {column} < {end}"
+
+def recent(column: str = "timestamp", days: int = 7) -> str:
+    """Last `days` days on the partitioning column (constant expression, partitions are pruned)."""
+    return f"{column} >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL {int(days)} DAY)"
+
+def add_signal_columns_sql(project_id: str, dataset: str) -> str:
+    """Schema evolution: one NULLABLE column per catalog signal (metadata-only, existing rows read NULL)."""
+    adds = ",\n  ".join(f"ADD COLUMN IF NOT EXISTS {s.name} {s.bq_type}" for s in SIGNALS)
+    return f"ALTER TABLE `{project_id}.{dataset}.raw_telemetry`\n  {adds}"
+
+def _json_cast(signal) -> str:
+    value = f"JSON_VALUE(metrics, '$.{signal.name}')"
+    return value if signal.bq_type == "STRING" else f"SAFE_CAST({value} AS {signal.bq_type})"
+
+def backfill_signal_columns_sql(project_id: str, dataset: str) -> str:
+    """
+    Copies catalog signals out of the `metrics` JSON of rows in
+    [@start_ts, @end_ts) into their typed columns. Filled columns are kept,
+    so re-running a range is a no-op. The JSON keys are left in place.
+    """
+    sets = ",\n  ".join(f"{s.name} = COALESCE({s.name}, {_json_cast(s)})" for s in SIGNALS)
+    pending = " OR ".join(f"({s.name} IS NULL AND JSON_VALUE(metrics, '$.{s.name}') IS NOT NULL)" for s in SIGNALS)
+    return f"""
+UPDATE `{project_id}.{dataset}.raw_telemetry`
+SET
+  {sets}
+WHERE {time_range()}
+  AND metrics IS NOT NULL
+  AND ({pending})
+""".strip()
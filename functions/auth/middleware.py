@@ -5,7 +5,7 @@ from functools import wraps
 from flask import request, jsonify, g
 from firebase_functions import https_fn
 import firebase_admin
-from firebase_admin import auth
+from coldstart import LazyModule
 from auth.tokens import verify_gateway_token # PR4
 
 
@@ -15,6 +15,9 @@ if not firebase_admin._apps:
 
 logger = logging.getLogger(__name__)
 
+# Loaded on the first Bearer token check, not at cold start
+auth = LazyModule("firebase_admin.auth")
+
 class AuthClaims:
     """Standardized identity context for a request."""
     def __init__(self, uid: str, tenant_id: str, site_id: str = None, role: str = None):
@@ -1,9 +1,18 @@
 import asyncio
+import json
 import logging
-from typing import Callable, List, Dict, Any, Awaitable
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, List, Dict, Any, Awaitable, Optional
 
 logger = logging.getLogger(__name__)
 
+Handler = Callable[[List[Dict[str, Any]]], Awaitable[None]]
+
+FULL_POLICIES = ("block", "drop_oldest", "spill")
+
 class EventBus:
     """Generic interface for an event bus."""
     async def publish(self, records: List[Dict[str, Any]]):
@@ -12,24 +21,194 @@ class EventBus:
     def subscribe(self, handler: Callable[[List[Dict[str, Any]]], Awaitable[None]]):
         raise NotImplementedError
 
+class _Subscription:
+    """One subscriber: its bounded queue of (batch, enqueued_at), spill file and consumer task."""
+    def __init__(self, handler: Handler, name: str, max_queue: int, spill_path: Optional[str]):
+        self.handler = handler
+        self.name = name
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.spill_path = spill_path
+        self.spilled = 0  # batches waiting in the spill file
+        self.task: Optional[asyncio.Task] = None
+
 class LocalBus(EventBus):
-    """In-process implementation of the event bus for development and testing."""
-    def __init__(self):
-        self.handlers: List[Callable[[List[Dict[str, Any]]], Awaitable[None]]] = []
+    """In-process implementation of the event bus for development and testing.
+
+    Every subscriber gets its own bounded queue and consumer task, running on
+    the bus's own thread and event loop, so `publish` returns once the batch
+    is queued and a slow subscriber never runs in the publisher's task. When
+    a subscriber's queue is full the policy decides what happens:
+
+    - `block`: `publish` waits for room (backpressure on the publisher)
+    - `drop_oldest`: the oldest queued batch is discarded
+    - `spill`: batches go to a JSONL file and are replayed, in order, once
+      the queue has drained
+    """
+    def __init__(self, max_queue: Optional[int] = None, policy: Optional[str] = None,
+                 spill_dir: Optional[str] = None):
+        self.handlers: List[Handler] = []
+        self.max_queue = max_queue or int(os.environ.get("BUS_QUEUE_MAX", 1000))
+        self.policy = policy or os.environ.get("BUS_FULL_POLICY", "block")
+        if self.policy not in FULL_POLICIES:
+            raise ValueError(f"Unknown BUS_FULL_POLICY {self.policy}; expected one of {FULL_POLICIES}")
+        self.spill_dir = spill_dir or os.environ.get("BUS_SPILL_DIR", ".bus_spill")
+
+        self._subscriptions: List[_Subscription] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._outstanding = 0  # accepted (subscriber, batch) pairs not yet handled
+        self._idle = threading.Condition()
 
     async def publish(self, records: List[Dict[str, Any]]):
         if not records:
             return
         logger.debug(f"LocalBus: Publishing {len(records)} records")
-        for handler in self.handlers:
-            try:
-                await handler(records)
-            except Exception as e:
-                logger.error(f"LocalBus: Handler failed: {e}")
+        self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self._offer(records), self._loop)
+        await asyncio.wrap_future(future)
 
     def subscribe(self, handler: Callable[[List[Dict[str, Any]]], Awaitable[None]]):
         self.handlers.append(handler)
-        logger.debug("LocalBus: New subscriber added")
+        self._ensure_loop()
+        name = getattr(handler, "__qualname__", None) or f"subscriber-{len(self.handlers)}"
+        spill_path = os.path.join(self.spill_dir, f"{id(self)}-{len(self.handlers)}.jsonl") if self.policy == "spill" else None
+        ready = threading.Event()
+
+        def _start():
+            sub = _Subscription(handler, name, self.max_queue, spill_path)
+            sub.task = self._loop.create_task(self._consume(sub))
+            self._subscriptions.append(sub)
+            ready.set()
+
+        self._loop.call_soon_threadsafe(_start)
+        ready.wait()
+        logger.debug(f"LocalBus: New subscriber added ({name}, policy={self.policy}, max_queue={self.max_queue})")
+
+    # --- Bus thread ---
+    def _ensure_loop(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run_loop, args=(ready,), name="local-bus", daemon=True)
+            self._thread.start()
+            ready.wait()
+
+    def _run_loop(self, ready: threading.Event):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        ready.set()
+        loop.run_forever()
+
+    async def _offer(self, records: List[Dict[str, Any]]):
+        from simco_agent.observability.metrics import cloud_metrics
+        for sub in list(self._subscriptions):
+            item = (records, time.monotonic())
+            labels = {"subscriber": sub.name}
+            # A batch is counted as outstanding only once it is queued or spilled,
+            # and a failure for one subscriber does not skip the others
+            try:
+                if sub.spilled or (self.policy == "spill" and sub.queue.full()):
+                    # Once spilling, later batches spill too so order is kept
+                    if self._spill(sub, item):
+                        self._accepted(1)
+                        cloud_metrics.counter("cloud.bus.spilled_count", 1, labels=labels)
+                    else:
+                        cloud_metrics.counter("cloud.bus.dropped_count", 1, labels={**labels, "reason": "spill_failed"})
+                elif self.policy == "drop_oldest" and sub.queue.full():
+                    sub.queue.get_nowait()
+                    sub.queue.task_done()
+                    self._done(1)
+                    cloud_metrics.counter("cloud.bus.dropped_count", 1, labels={**labels, "reason": "queue_full"})
+                    logger.warning(f"LocalBus: {sub.name} queue full, dropped oldest batch")
+                    sub.queue.put_nowait(item)
+                    self._accepted(1)
+                else:
+                    await sub.queue.put(item)
+                    self._accepted(1)
+            except Exception as e:
+                logger.error(f"LocalBus: Failed to offer batch to {sub.name}: {e}")
+                cloud_metrics.counter("cloud.bus.dropped_count", 1, labels={**labels, "reason": "error"})
+            cloud_metrics.gauge("cloud.bus.queue_depth", sub.queue.qsize() + sub.spilled, labels=labels)
+
+    def _spill(self, sub: _Subscription, item) -> bool:
+        """Appends a batch to the subscriber's spill file. False (batch dropped) if it cannot be written."""
+        records, enqueued_at = item
+        try:
+            line = json.dumps({"records": records, "enqueued_at": enqueued_at}, default=str)
+            os.makedirs(os.path.dirname(sub.spill_path) or ".", exist_ok=True)
+            with open(sub.spill_path, "a") as f:
+                f.write(line + "\n")
+        except (OSError, TypeError, ValueError) as e:
+            logger.error(f"LocalBus: {sub.name} spill failed, dropped batch: {e}")
+            return False
+        sub.spilled += 1
+        return True
+
+    def _unspill(self, sub: _Subscription) -> List[Any]:
+        with open(sub.spill_path) as f:
+            items = [(entry["records"], entry["enqueued_at"]) for entry in map(json.loads, f)]
+        os.remove(sub.spill_path)
+        sub.spilled = 0
+        return items
+
+    async def _consume(self, sub: _Subscription):
+        replay: deque = deque()
+        while True:
+            if replay:
+                item, from_queue = replay.popleft(), False
+            elif sub.queue.empty() and sub.spilled:
+                replay.extend(self._unspill(sub))
+                continue
+            else:
+                item, from_queue = await sub.queue.get(), True
+            records, enqueued_at = item
+            await self._handle(sub, records, enqueued_at)
+            if from_queue:
+                sub.queue.task_done()
+
+    async def _handle(self, sub: _Subscription, records: List[Dict[str, Any]], enqueued_at: float):
+        from simco_agent.observability.metrics import cloud_metrics
+        labels = {"subscriber": sub.name}
+        cloud_metrics.histogram("cloud.bus.lag_ms", (time.monotonic() - enqueued_at) * 1000, labels=labels)
+        start = time.monotonic()
+        try:
+            await sub.handler(records)
+        except Exception as e:
+            logger.error(f"LocalBus: Handler failed: {e}")
+        finally:
+            self._done(1)
+        cloud_metrics.histogram("cloud.bus.handler_latency_ms", (time.monotonic() - start) * 1000, labels=labels)
+        cloud_metrics.gauge("cloud.bus.queue_depth", sub.queue.qsize() + sub.spilled, labels=labels)
+
+    def _accepted(self, n: int):
+        with self._idle:
+            self._outstanding += n
+
+    def _done(self, n: int):
+        with self._idle:
+            self._outstanding -= n
+            if self._outstanding <= 0:
+                self._idle.notify_all()
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Blocks until every published batch has been handled by every subscriber. For tests and shutdown."""
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self._outstanding > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def depth(self) -> Dict[str, int]:
+        """Pending batches per subscriber (queued + spilled)."""
+        return {sub.name: sub.queue.qsize() + sub.spilled for sub in self._subscriptions}
 
 # Singleton instance for local/dev use
 bus = LocalBus()
@@ -0,0 +1,181 @@
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+def _epoch(timestamp: Any, default: float) -> float:
+    """Seconds since the epoch for an RFC3339 string or datetime; `default` if it cannot be parsed."""
+    if isinstance(timestamp, datetime):
+        return timestamp.timestamp()
+    try:
+        return datetime.fromisoformat(str(timestamp).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return default
+
+class FleetIndex:
+    """
+    Per-tenant fleet health, maintained incrementally from ingested telemetry
+    and gateway heartbeats:
+
+    - per machine: site, status, last_seen and the gateway (device_id) that reported it
+    - per gateway: last heartbeat, buffer depth, agent version and the machines it reports
+
+    Each record or heartbeat is an O(1) update. A health query walks only the
+    tenant's own machines and gateways. A machine is stale when its last
+    record is older than `stale_after_sec`; a gateway is stale when its last
+    heartbeat (or record) is. A gateway heartbeat that arrives before any
+    telemetry, and without a tenant_id, is attached to its tenant once the
+    first record from that device arrives.
+
+    `observe_records` is fed by ingest, which runs in other functions than
+    the portal. Readers call `seed()` with the latest record per machine
+    from a shared source and re-seed once `seed_age()` exceeds their TTL.
+    Gateway heartbeat fields are reported only for gateways whose heartbeat
+    this instance received.
+    """
+    def __init__(self, stale_after_sec: float = 300):
+        self.stale_after_sec = stale_after_sec
+        self.machines: Dict[str, Dict[str, Dict[str, Any]]] = {}  # tenant -> machine_id -> entry
+        self.gateways: Dict[str, Dict[str, Any]] = {}  # gateway_id -> entry
+        self.gateways_by_tenant: Dict[str, Set[str]] = {}
+        self.seeded_at: Dict[str, float] = {}  # tenant -> time of the last seed()
+        self._lock = threading.Lock()
+
+    def _gateway(self, gateway_id: str, tenant_id: Optional[str]) -> Dict[str, Any]:
+        gateway = self.gateways.get(gateway_id)
+        if gateway is None:
+            gateway = self.gateways[gateway_id] = {
+                "gateway_id": gateway_id, "tenant_id": None, "last_seen": None, "last_seen_epoch": 0.0,
+                "last_heartbeat": None, "buffer_depth": None, "agent_version": None, "machines": set(),
+            }
+        if tenant_id and gateway["tenant_id"] != tenant_id:
+            if gateway["tenant_id"]:
+                self.gateways_by_tenant.get(gateway["tenant_id"], set()).discard(gateway_id)
+            gateway["tenant_id"] = tenant_id
+            self.gateways_by_tenant.setdefault(tenant_id, set()).add(gateway_id)
+        return gateway
+
+    def observe_records(self, records: Iterable[Dict[str, Any]], now: Optional[float] = None):
+        """Applies telemetry records (model_dump'ed dicts or warehouse rows)."""
+        now = time.time() if now is None else now
+        with self._lock:
+            for record in records:
+                tenant_id, machine_id = record.get("tenant_id"), record.get("machine_id")
+                if not tenant_id or not machine_id:
+                    continue
+                seen = _epoch(record.get("timestamp"), now)
+                machines = self.machines.setdefault(tenant_id, {})
+                machine = machines.get(machine_id)
+                if machine is not None and seen < machine["last_seen_epoch"]:
+                    continue  # late record
+                gateway_id = record.get("device_id")
+                if machine is not None and machine["gateway_id"] and machine["gateway_id"] != gateway_id:
+                    previous = self.gateways.get(machine["gateway_id"])
+                    if previous is not None:
+                        previous["machines"].discard(machine_id)
+                machines[machine_id] = {
+                    "machine_id": machine_id,
+                    "site_id": record.get("site_id"),
+                    "status": record.get("status"),
+                    "last_seen": record.get("timestamp"),
+                    "last_seen_epoch": seen,
+                    "gateway_id": gateway_id,
+                }
+                if gateway_id:
+                    gateway = self._gateway(gateway_id, tenant_id)
+                    gateway["machines"].add(machine_id)
+                    if seen > gateway["last_seen_epoch"]:
+                        gateway["last_seen"], gateway["last_seen_epoch"] = record.get("timestamp"), seen
+
+    def observe_heartbeat(self, gateway_id: str, tenant_id: Optional[str] = None, buffer_depth: Optional[int] = None,
+                          agent_version: Optional[str] = None, now: Optional[float] = None):
+        """Records a gateway heartbeat, received now."""
+        now = time.time() if now is None else now
+        with self._lock:
+            gateway = self._gateway(gateway_id, tenant_id)
+            gateway["last_heartbeat"] = datetime.fromtimestamp(now, timezone.utc).isoformat()
+            gateway["last_seen"], gateway["last_seen_epoch"] = gateway["last_heartbeat"], now
+            if buffer_depth is not None:
+                gateway["buffer_depth"] = buffer_depth
+            if agent_version is not None:
+                gateway["agent_version"] = agent_version
+
+    def has_tenant(self, tenant_id: str) -> bool:
+        return bool(self.machines.get(tenant_id))
+
+    def seed(self, tenant_id: str, records: Iterable[Dict[str, Any]], now: Optional[float] = None):
+        """Applies the latest record per machine of a tenant from a shared source (newer entries are kept)."""
+        now = time.time() if now is None else now
+        self.observe_records(({**r, "tenant_id": tenant_id} for r in records), now=now)
+        with self._lock:
+            self.seeded_at[tenant_id] = now
+
+    def seed_age(self, tenant_id: str, now: Optional[float] = None) -> Optional[float]:
+        """Seconds since the tenant was last seeded, None if never."""
+        seeded = self.seeded_at.get(tenant_id)
+        if seeded is None:
+            return None
+        return (time.time() if now is None else now) - seeded
+
+    def health(self, tenant_id: str, site_id: Optional[str] = None, status: Optional[str] = None,
+               stale_after_sec: Optional[float] = None, stale_only: bool = False,
+               now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Fleet health of a tenant: machines and gateways with staleness, and a
+        summary. `stale_after_sec` overrides the index default; `stale_only`
+        keeps only stale entries (e.g. ?stale_minutes=10 for "silent > 10 min").
+        """
+        now = time.time() if now is None else now
+        stale_after = self.stale_after_sec if stale_after_sec is None else stale_after_sec
+        status = status.upper() if status else None
+        with self._lock:
+            machine_entries = list(self.machines.get(tenant_id, {}).values())
+            gateway_entries = [dict(self.gateways[g], machines=len(self.gateways[g]["machines"]))
+                               for g in self.gateways_by_tenant.get(tenant_id, ())]
+
+        machines: List[Dict[str, Any]] = []
+        summary = {"machines": 0, "stale_machines": 0, "by_status": {}, "gateways": 0, "stale_gateways": 0}
+        for entry in machine_entries:
+            if site_id and entry["site_id"] != site_id:
+                continue
+            entry_status = (entry["status"] or "OFFLINE").upper()
+            if status and entry_status != status:
+                continue
+            age = max(0.0, now - entry["last_seen_epoch"])
+            stale = age > stale_after
+            summary["machines"] += 1
+            summary["stale_machines"] += int(stale)
+            summary["by_status"][entry_status] = summary["by_status"].get(entry_status, 0) + 1
+            if stale_only and not stale:
+                continue
+            out = {k: v for k, v in entry.items() if k != "last_seen_epoch"}
+            machines.append(dict(out, status=entry_status, age_sec=round(age, 1), stale=stale))
+
+        gateways: List[Dict[str, Any]] = []
+        for entry in gateway_entries:
+            age = max(0.0, now - entry["last_seen_epoch"])
+            stale = age > stale_after
+            summary["gateways"] += 1
+            summary["stale_gateways"] += int(stale)
+            if stale_only and not stale:
+                continue
+            hidden = ("last_seen_epoch", "tenant_id")
+            if entry["last_heartbeat"] is None:
+                # No heartbeat reached this instance: do not report empty heartbeat fields
+                hidden += ("last_heartbeat", "buffer_depth", "agent_version")
+            out = {k: v for k, v in entry.items() if k not in hidden}
+            gateways.append(dict(out, age_sec=round(age, 1), stale=stale))
+
+        machines.sort(key=lambda m: m["age_sec"], reverse=True)
+        gateways.sort(key=lambda g: g["age_sec"], reverse=True)
+        return {
+            "tenant_id": tenant_id,
+            "stale_after_sec": stale_after,
+            "summary": summary,
+            "machines": machines,
+            "gateways": gateways,
+        }
+
+# Singleton instance
+fleet_index = FleetIndex(stale_after_sec=float(os.environ.get("FLEET_STALE_AFTER_SEC", 300)))
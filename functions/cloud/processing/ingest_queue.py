@@ -0,0 +1,270 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# A leased message: (ack handle, payload, enqueued_at epoch seconds, delivery attempt starting at 1)
+Lease = Tuple[Any, Dict[str, Any], float, int]
+
+class IngestQueue:
+    """Generic interface for the durable accept-then-flush ingest queue."""
+    def enqueue(self, payload: Dict[str, Any]) -> str:
+        """Durably stores the payload. Returns once the queue has accepted it."""
+        raise NotImplementedError
+
+    def lease(self, max_messages: int) -> List[Lease]:
+        raise NotImplementedError
+
+    def ack(self, handles: List[Any]):
+        raise NotImplementedError
+
+    def nack(self, handles: List[Any]):
+        """Makes leased messages deliverable again now. By default they reappear when the lease expires."""
+
+    def dead_letter(self, leases: List[Lease], reason: str):
+        """Moves leased messages out of the queue for inspection; they are not delivered again."""
+        raise NotImplementedError
+
+    def depth(self) -> Optional[int]:
+        """Pending messages, if the backend can tell cheaply."""
+        return None
+
+class PubSubIngestQueue(IngestQueue):
+    """
+    Pub/Sub topic for accepts, pull subscription for the consumer. Pub/Sub
+    reports the delivery attempt only when the subscription has a
+    dead-letter policy; without one, deliveries are counted per message id
+    in this process. Dead-lettered messages are republished to
+    `dead_letter_topic`.
+    """
+    def __init__(self, project_id: str, topic: str, subscription: str, dead_letter_topic: str):
+        from google.cloud import pubsub_v1
+        self.publisher = pubsub_v1.PublisherClient()
+        self.subscriber = pubsub_v1.SubscriberClient()
+        self.topic_path = self.publisher.topic_path(project_id, topic)
+        self.dead_letter_path = self.publisher.topic_path(project_id, dead_letter_topic)
+        self.subscription_path = self.subscriber.subscription_path(project_id, subscription)
+        self._attempts: Dict[str, int] = {}  # message_id -> deliveries seen here
+        self._message_ids: Dict[str, str] = {}  # ack_id -> message_id of a leased message
+
+    def enqueue(self, payload):
+        data = json.dumps(payload).encode("utf-8")
+        return self.publisher.publish(self.topic_path, data).result()
+
+    def lease(self, max_messages):
+        response = self.subscriber.pull(
+            request={"subscription": self.subscription_path, "max_messages": max_messages},
+            timeout=10
+        )
+        leases = []
+        for received in response.received_messages:
+            msg = received.message
+            self._attempts[msg.message_id] = self._attempts.get(msg.message_id, 0) + 1
+            self._message_ids[received.ack_id] = msg.message_id
+            attempts = received.delivery_attempt or self._attempts[msg.message_id]
+            leases.append((received.ack_id, json.loads(msg.data.decode("utf-8")), msg.publish_time.timestamp(), attempts))
+        return leases
+
+    def ack(self, handles):
+        if handles:
+            self.subscriber.acknowledge(request={"subscription": self.subscription_path, "ack_ids": handles})
+        for handle in handles:
+            self._attempts.pop(self._message_ids.pop(handle, None), None)
+
+    def nack(self, handles):
+        if handles:
+            self.subscriber.modify_ack_deadline(request={"subscription": self.subscription_path, "ack_ids": handles,
+                                                         "ack_deadline_seconds": 0})
+        for handle in handles:
+            self._message_ids.pop(handle, None)
+
+    def dead_letter(self, leases, reason):
+        for _, payload, _, attempts in leases:
+            self.publisher.publish(self.dead_letter_path, json.dumps(payload).encode("utf-8"),
+                                   reason=reason, attempts=str(attempts)).result()
+        self.ack([handle for handle, *_ in leases])
+
+class SQLiteIngestQueue(IngestQueue):
+    """Local stand-in: a SQLite table with visibility timeouts, like a pull subscription."""
+    def __init__(self, path: str, lease_sec: float = 60):
+        self.path = path
+        self.lease_sec = lease_sec
+        self._lock = threading.Lock()
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ingest_queue (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    payload TEXT NOT NULL,
+                    enqueued_at REAL NOT NULL,
+                    leased_until REAL NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(ingest_queue)")}
+            if "attempts" not in columns:
+                conn.execute("ALTER TABLE ingest_queue ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ingest_dead_letter (
+                    id INTEGER PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    enqueued_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    reason TEXT,
+                    dead_at REAL NOT NULL
+                )
+            """)
+
+    def enqueue(self, payload):
+        with self._lock, sqlite3.connect(self.path) as conn:
+            cur = conn.execute("INSERT INTO ingest_queue (payload, enqueued_at) VALUES (?, ?)",
+                               (json.dumps(payload), time.time()))
+            return str(cur.lastrowid)
+
+    def lease(self, max_messages):
+        now = time.time()
+        with self._lock, sqlite3.connect(self.path) as conn:
+            rows = conn.execute(
+                "SELECT id, payload, enqueued_at, attempts FROM ingest_queue WHERE leased_until <= ? ORDER BY id LIMIT ?",
+                (now, max_messages)
+            ).fetchall()
+            conn.executemany("UPDATE ingest_queue SET leased_until = ?, attempts = attempts + 1 WHERE id = ?",
+                             [(now + self.lease_sec, r[0]) for r in rows])
+        return [(r[0], json.loads(r[1]), r[2], r[3] + 1) for r in rows]
+
+    def ack(self, handles):
+        with self._lock, sqlite3.connect(self.path) as conn:
+            conn.executemany("DELETE FROM ingest_queue WHERE id = ?", [(h,) for h in handles])
+
+    def nack(self, handles):
+        with self._lock, sqlite3.connect(self.path) as conn:
+            conn.executemany("UPDATE ingest_queue SET leased_until = 0 WHERE id = ?", [(h,) for h in handles])
+
+    def dead_letter(self, leases, reason):
+        now = time.time()
+        with self._lock, sqlite3.connect(self.path) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO ingest_dead_letter (id, payload, enqueued_at, attempts, reason, dead_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(h, json.dumps(payload), enqueued_at, attempts, reason, now) for h, payload, enqueued_at, attempts in leases]
+            )
+            conn.executemany("DELETE FROM ingest_queue WHERE id = ?", [(h,) for h, *_ in leases])
+
+    def dead_letters(self) -> List[Dict[str, Any]]:
+        with self._lock, sqlite3.connect(self.path) as conn:
+            rows = conn.execute("SELECT payload, attempts, reason FROM ingest_dead_letter ORDER BY id").fetchall()
+        return [{"payload": json.loads(r[0]), "attempts": r[1], "reason": r[2]} for r in rows]
+
+    def depth(self):
+        with self._lock, sqlite3.connect(self.path) as conn:
+            return conn.execute("SELECT COUNT(*) FROM ingest_queue").fetchone()[0]
+
+class IngestConsumer:
+    """
+    Drains the ingest queue in large batches: records from many accepted
+    requests are merged and handed to `handler` in one call (one warehouse
+    append, one hot-path publish). A message is acked only once all of its
+    records were handled, so a crash mid-drain redelivers it. A handler
+    that returns `(count, errors)` with insert_rows_json-style errors (row
+    indexes into the records it was given) gets only the messages owning
+    the failed rows nacked; record dedup skips their rows that did land
+    when they are redelivered. A message that fails on its
+    `max_attempts`-th delivery is dead-lettered instead.
+    """
+    def __init__(self, queue: IngestQueue, handler: Callable[[List[Dict[str, Any]]], Any],
+                 max_messages: int = 500, max_records: int = 20000, max_attempts: int = 5):
+        self.queue = queue
+        self.handler = handler
+        self.max_messages = max_messages
+        self.max_records = max_records
+        self.max_attempts = max_attempts
+
+    def drain_once(self) -> int:
+        """Processes one batch of leased messages. Returns the number of records acked."""
+        return self._drain_batch()[1]
+
+    def _drain_batch(self) -> Tuple[int, int]:
+        """(messages leased, records acked) for one batch."""
+        from simco_agent.observability.metrics import cloud_metrics
+        leases = self.queue.lease(self.max_messages)
+        if not leases:
+            cloud_metrics.gauge("cloud.ingest_queue.lag_sec", 0)
+            return 0, 0
+
+        oldest = min(lease[2] for lease in leases)
+        cloud_metrics.gauge("cloud.ingest_queue.lag_sec", time.time() - oldest)
+
+        records: List[Dict[str, Any]] = []
+        owners: List[int] = []  # record index -> lease index
+        for n, (_, payload, _, _) in enumerate(leases):
+            message_records = payload.get("records", [])
+            records.extend(message_records)
+            owners.extend([n] * len(message_records))
+
+        start = time.monotonic()
+        failed = set()
+        for i in range(0, len(records), self.max_records):
+            result = self.handler(records[i:i + self.max_records])
+            if isinstance(result, tuple) and len(result) == 2 and result[1]:
+                for error in result[1]:
+                    index = error.get("index")
+                    # An error without a usable row index fails the whole chunk
+                    if isinstance(index, int) and 0 <= index < len(records) - i:
+                        failed.add(owners[i + index])
+                    else:
+                        failed.update(owners[i:i + self.max_records])
+
+        acked = [lease for n, lease in enumerate(leases) if n not in failed]
+        self.queue.ack([lease[0] for lease in acked])
+        if failed:
+            retry = [leases[n] for n in sorted(failed) if leases[n][3] < self.max_attempts]
+            dead = [leases[n] for n in sorted(failed) if leases[n][3] >= self.max_attempts]
+            if retry:
+                logger.error(f"IngestConsumer: rows failed in {len(retry)} messages, redelivering them")
+                cloud_metrics.counter("cloud.ingest_queue.nack_count", len(retry))
+                self.queue.nack([lease[0] for lease in retry])
+            if dead:
+                logger.error(f"IngestConsumer: {len(dead)} messages failed {self.max_attempts} deliveries, dead-lettering them")
+                cloud_metrics.counter("cloud.ingest_queue.dead_letter_count", len(dead))
+                self.queue.dead_letter(dead, reason="row_errors")
+
+        handled = sum(len(lease[1].get("records", [])) for lease in acked)
+        cloud_metrics.histogram("cloud.ingest_queue.drain_latency_ms", (time.monotonic() - start) * 1000)
+        cloud_metrics.histogram("cloud.ingest_queue.batch_rows", len(records))
+        depth = self.queue.depth()
+        if depth is not None:
+            cloud_metrics.gauge("cloud.ingest_queue.depth", depth)
+        return len(leases), handled
+
+    def drain(self, time_budget_sec: float = 50) -> int:
+        """Drains until the queue is empty or the time budget is spent. Returns the number of records acked."""
+        deadline = time.monotonic() + time_budget_sec
+        total = 0
+        while time.monotonic() < deadline:
+            leased, handled = self._drain_batch()
+            if not leased:
+                break
+            total += handled
+        return total
+
+def build_ingest_queue(project_factory: Optional[Callable[[], str]] = None) -> IngestQueue:
+    """
+    Selects the backend from INGEST_QUEUE:
+    pubsub (default; INGEST_QUEUE_TOPIC / INGEST_QUEUE_SUBSCRIPTION / INGEST_QUEUE_DEAD_LETTER_TOPIC)
+    | sqlite (INGEST_QUEUE_SQLITE_PATH).
+    """
+    mode = os.environ.get("INGEST_QUEUE", "pubsub")
+    if mode == "sqlite":
+        return SQLiteIngestQueue(os.environ.get("INGEST_QUEUE_SQLITE_PATH", "ingest_queue.db"))
+
+    project_id = os.environ.get("GCLOUD_PROJECT") or (project_factory() if project_factory else None)
+    return PubSubIngestQueue(
+        project_id,
+        os.environ.get("INGEST_QUEUE_TOPIC", "telemetry-ingest"),
+        os.environ.get("INGEST_QUEUE_SUBSCRIPTION", "telemetry-ingest-consumer"),
+        os.environ.get("INGEST_QUEUE_DEAD_LETTER_TOPIC", "telemetry-ingest-dead-letter"),
+    )
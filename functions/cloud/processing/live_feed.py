@@ -0,0 +1,97 @@
+import asyncio
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# (tenant_id, site_id)
+SiteKey = Tuple[str, str]
+# (seq, kind, data)
+Delta = Tuple[int, str, Dict[str, Any]]
+
+class LiveFeed:
+    """
+    Per-site change feed of processor updates for server push.
+
+    StreamProcessor publishes a `machine` delta for every state update and
+    an `alert` delta for every new event. Each site keeps its last
+    `history_per_site` deltas, so a client that reconnects with its last
+    event id gets exactly what it missed. Ids are `<epoch>-<seq>`. The epoch
+    changes on every process start, so a cursor from an earlier process, or
+    one that has fallen out of the history, is reported as a gap. The client
+    then needs a fresh snapshot.
+
+    Publishing is thread-safe (the processor runs on the bus thread);
+    waiters are woken on their own event loops.
+    """
+    def __init__(self, history_per_site: int = 500):
+        self.history_per_site = history_per_site
+        self.epoch = str(int(time.time() * 1000))
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+        self._history: Dict[SiteKey, Deque[Delta]] = {}
+        self._evicted_upto: Dict[SiteKey, int] = {}  # seq of the newest delta dropped from history
+        self._waiters: Dict[SiteKey, List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+        self.last_seq = 0
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.epoch}-{seq}"
+
+    def parse_id(self, event_id: Optional[str]) -> Optional[int]:
+        """Sequence number of a cursor from this process, None for missing or foreign cursors."""
+        if not event_id:
+            return None
+        epoch, _, seq = event_id.partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def publish(self, tenant_id: str, site_id: str, kind: str, data: Dict[str, Any]):
+        site = (tenant_id, site_id)
+        with self._lock:
+            seq = next(self._seq)
+            self.last_seq = seq
+            history = self._history.get(site)
+            if history is None:
+                history = self._history[site] = deque()
+            history.append((seq, kind, data))
+            if len(history) > self.history_per_site:
+                self._evicted_upto[site] = history.popleft()[0]
+            waiters = self._waiters.pop(site, [])
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def since(self, tenant_id: str, site_id: str, after_seq: int) -> Tuple[List[Delta], bool]:
+        """Deltas for the site after `after_seq`. The flag is False if some were already evicted (gap)."""
+        site = (tenant_id, site_id)
+        with self._lock:
+            complete = after_seq >= self._evicted_upto.get(site, 0)
+            history = self._history.get(site, ())
+            return [d for d in history if d[0] > after_seq], complete
+
+    async def wait(self, tenant_id: str, site_id: str, after_seq: int, timeout: float) -> Tuple[List[Delta], bool]:
+        """Like since(), but waits up to `timeout` seconds for a delta if there is none yet."""
+        deltas, complete = self.since(tenant_id, site_id, after_seq)
+        if deltas or not complete:
+            return deltas, complete
+        event = asyncio.Event()
+        site = (tenant_id, site_id)
+        with self._lock:
+            self._waiters.setdefault(site, []).append((asyncio.get_running_loop(), event))
+        # Re-check: a publish may have landed before the waiter was registered
+        deltas, complete = self.since(tenant_id, site_id, after_seq)
+        if not deltas and complete:
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            deltas, complete = self.since(tenant_id, site_id, after_seq)
+        with self._lock:
+            waiters = self._waiters.get(site)
+            if waiters:
+                self._waiters[site] = [w for w in waiters if w[1] is not event]
+        return deltas, complete
+
+# Singleton instance
+feed = LiveFeed()
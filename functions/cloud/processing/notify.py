@@ -1,17 +1,60 @@
+import asyncio
+import atexit
+import hashlib
 import logging
 import json
+import os
+import random
+import threading
 import time
-from typing import Dict, Any, List
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
 class NotificationDispatcher:
-    """Dispatches alerts to various connectors (Webhook, Email)."""
-    
+    """Dispatches alerts to various connectors (Webhook, Email).
+
+    `dispatch` only rate-limits, records the audit entry and hands the event
+    to a background delivery loop (its own thread and event loop), so a slow
+    connector never adds latency to ingest. The delivery loop coalesces
+    events per tenant/site into one digest per window, delivers digests from
+    a worker pool over pooled HTTP connections (one client per webhook
+    target), and retries failures with exponential backoff. A retry only
+    goes to the targets that failed; every POST carries the digest's stable
+    `digest_id` so receivers can drop redeliveries.
+
+    Delivery is best effort from memory: `flush(close_digests=True)` sends
+    what is queued without waiting out the digest window, and runs at
+    interpreter exit (bounded by NOTIFY_SHUTDOWN_FLUSH_SEC). Notifications
+    still queued when a process is killed, or when the flush times out, are lost.
+    """
+
     def __init__(self):
-        self.notification_log = []
+        # Bounded audit log; entries are updated in place when delivery finishes
+        self.notification_log = deque(maxlen=int(os.environ.get("NOTIFY_AUDIT_MAX_ENTRIES", 10000)))
+        self.audit_path = os.environ.get("NOTIFY_AUDIT_PATH")  # optional JSONL persistence
         self.rate_limits: Dict[str, float] = {}  # {key: last_sent_timestamp}
         self.MIN_INTERVAL = 60  # Rate limit: 1 alert per machine per minute
+        self.RATE_LIMIT_MAX_KEYS = 50000  # expired keys are pruned past this size
+
+        self.webhook_urls = [u.strip() for u in os.environ.get("NOTIFY_WEBHOOK_URLS", "").split(",") if u.strip()]
+        self.digest_window = float(os.environ.get("NOTIFY_DIGEST_WINDOW_MS", 2000)) / 1000.0
+        self.workers = int(os.environ.get("NOTIFY_WORKERS", 4))
+        self.max_queue = int(os.environ.get("NOTIFY_QUEUE_MAX", 10000))
+        self.max_attempts = int(os.environ.get("NOTIFY_MAX_ATTEMPTS", 4))
+        self.backoff_base = float(os.environ.get("NOTIFY_BACKOFF_BASE_SEC", 0.5))
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._queue: Optional[asyncio.Queue] = None
+        self._digests: Dict[Tuple[str, str], List[Tuple[Dict[str, Any], Dict[str, Any]]]] = {}
+        self._digest_timers: Dict[Tuple[str, str], asyncio.TimerHandle] = {}
+        self._atexit_registered = False
+        self._clients: Dict[str, Any] = {}
+        self._outstanding = 0
+        self._idle = threading.Condition()
 
     async def dispatch(self, event: Dict[str, Any]):
         """Dispatches an event to all configured connectors."""
@@ -19,7 +62,7 @@ class NotificationDispatcher:
         site_id = event.get("site_id")
         machine_id = event.get("machine_id")
         event_type = event.get("event_type")
-        
+
         # 1. Rate Limiting
         limit_key = f"{tenant_id}:{site_id}:{machine_id}:{event_type}"
         now = time.time()
@@ -28,43 +71,230 @@ class NotificationDispatcher:
             return
 
         self.rate_limits[limit_key] = now
-        
-        # 2. Connector Logic
-        logger.info(f"Notify: Dispatching {event_type} for {machine_id}")
-        
+        if len(self.rate_limits) > self.RATE_LIMIT_MAX_KEYS:
+            self._prune_rate_limits(now)
+
+        # 2. Audit entry, then hand off to the delivery loop
+        logger.info(f"Notify: Queueing {event_type} for {machine_id}")
+        audit_entry = self._log_notification(event)
+        self._enqueue(event, audit_entry)
+
+    def _prune_rate_limits(self, now: float):
+        self.rate_limits = {k: ts for k, ts in self.rate_limits.items() if now - ts < self.MIN_INTERVAL}
+
+    # --- Delivery loop (background thread) ---
+    def _ensure_loop(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run_loop, args=(ready,), name="notify-delivery", daemon=True)
+            self._thread.start()
+            ready.wait()
+            if not self._atexit_registered:
+                atexit.register(self.shutdown)
+                self._atexit_registered = True
+
+    def _run_loop(self, ready: threading.Event):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._digests = {}
+        self._digest_timers = {}
+        for i in range(self.workers):
+            loop.create_task(self._worker(i))
+        ready.set()
+        loop.run_forever()
+
+    def _enqueue(self, event: Dict[str, Any], audit_entry: Dict[str, Any]):
+        self._ensure_loop()
+        with self._idle:
+            self._outstanding += 1
+        self._loop.call_soon_threadsafe(self._add_to_digest, event, audit_entry)
+
+    def _add_to_digest(self, event: Dict[str, Any], audit_entry: Dict[str, Any]):
+        key = (event.get("tenant_id"), event.get("site_id"))
+        pending = self._digests.get(key)
+        if pending is None:
+            pending = self._digests[key] = []
+            self._digest_timers[key] = self._loop.call_later(self.digest_window, self._close_digest, key)
+        pending.append((event, audit_entry))
+
+    def _close_digest(self, key: Tuple[str, str]):
+        from simco_agent.observability.metrics import cloud_metrics
+        self._digest_timers.pop(key, None)
+        items = self._digests.pop(key, [])
+        if not items:
+            return
+        try:
+            self._queue.put_nowait((key, items, time.monotonic()))
+        except asyncio.QueueFull:
+            cloud_metrics.counter("cloud.notifications.dropped_count", len(items), labels={"reason": "queue_full"})
+            self._finish(items, "DROPPED", 0)
+            return
+        cloud_metrics.gauge("cloud.notifications.queue_depth", self._queue.qsize())
+
+    def _close_all_digests(self):
+        for key in list(self._digests):
+            handle = self._digest_timers.pop(key, None)
+            if handle is not None:
+                handle.cancel()
+            self._close_digest(key)
+
+    async def _worker(self, worker_id: int):
+        while True:
+            key, items, enqueued_at = await self._queue.get()
+            try:
+                await self._deliver(key, items, enqueued_at)
+            except Exception as e:
+                logger.error(f"Notify: Worker {worker_id} failed: {e}")
+                self._finish(items, "FAILED", 0)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, key: Tuple[str, str], items: List[Tuple[Dict[str, Any], Dict[str, Any]]], enqueued_at: float):
         from simco_agent.observability.metrics import cloud_metrics
+        events = [event for event, _ in items]
+        digest = {
+            "digest_id": self._digest_id(key, events),
+            "type": "digest" if len(events) > 1 else "event",
+            "tenant_id": key[0],
+            "site_id": key[1],
+            "count": len(events),
+            "events": events,
+        }
+        for _, audit_entry in items:
+            audit_entry["digest_id"] = digest["digest_id"]
+        cloud_metrics.histogram("cloud.notifications.digest_size", len(events))
+        cloud_metrics.histogram("cloud.notifications.queue_wait_ms", (time.monotonic() - enqueued_at) * 1000)
+
+        start = time.monotonic()
+        pending_urls = list(self.webhook_urls)  # Targets that have not acknowledged the digest yet
+        webhook_done = email_sent = False
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                if not webhook_done:
+                    pending_urls = await self._send_webhook(digest, pending_urls)
+                    if pending_urls:
+                        raise ConnectionError(f"{len(pending_urls)} of {len(self.webhook_urls)} webhook targets failed")
+                    webhook_done = True
+                if not email_sent:
+                    # Mock Email
+                    await self._send_email(digest)
+                    email_sent = True
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    logger.error(f"Notify: Dispatch failed after {attempt} attempts: {e}")
+                    for event in events:
+                        cloud_metrics.counter("cloud.notifications.failed_count", 1, labels={"event_type": event.get("event_type"), "error": str(type(e).__name__)})
+                    self._finish(items, "FAILED", attempt)
+                    return
+                delay = self.backoff_base * (2 ** (attempt - 1)) * (1 + random.random() * 0.25)
+                cloud_metrics.counter("cloud.notifications.retry_count", 1)
+                logger.warning(f"Notify: Attempt {attempt} failed ({e}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            for event in events:
+                cloud_metrics.counter("cloud.notifications.sent_count", 1, labels={"event_type": event.get("event_type")})
+            cloud_metrics.histogram("cloud.notifications.delivery_latency_ms", (time.monotonic() - start) * 1000)
+            self._finish(items, "SENT", attempt)
+            return
+
+    @staticmethod
+    def _digest_id(key: Tuple[str, str], events: List[Dict[str, Any]]) -> str:
+        """Same site and events give the same id, across retries and re-queued digests."""
+        ids = [event.get("event_id") or json.dumps(event, sort_keys=True, default=str) for event in events]
+        return hashlib.sha256(json.dumps([key[0], key[1], ids]).encode()).hexdigest()[:32]
+
+    async def _send_webhook(self, digest: Dict[str, Any], urls: List[str]) -> List[str]:
+        """POSTs the digest to each URL in `urls`. Returns the URLs that failed."""
+        if not urls:
+            logger.debug(f"Notify [Webhook]: POST to configured endpoint for {digest['tenant_id']}:{digest['site_id']} ({digest['count']} events)")
+            return []
+        results = await asyncio.gather(*(self._post(url, digest) for url in urls), return_exceptions=True)
+        failed = []
+        for url, result in zip(urls, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Notify: Webhook {url} failed: {result}")
+                failed.append(url)
+        return failed
+
+    async def _post(self, url: str, payload: Dict[str, Any]):
+        client = self._clients.get(url)
+        if client is None:
+            import httpx
+            # One pooled client (keep-alive connections) per webhook target
+            client = self._clients[url] = httpx.AsyncClient(
+                timeout=httpx.Timeout(10.0, connect=3.0),
+                limits=httpx.Limits(max_connections=self.workers, max_keepalive_connections=self.workers)
+            )
+        response = await client.post(url, json=payload, headers={"X-Idempotency-Key": payload["digest_id"]})
+        response.raise_for_status()
+
+    async def _send_email(self, digest: Dict[str, Any]):
+        logger.debug(f"Notify [Email]: Sending {digest['count']} alert(s) for {digest['tenant_id']}:{digest['site_id']} to subscribers")
+
+    def _finish(self, items: List[Tuple[Dict[str, Any], Dict[str, Any]]], status: str, attempts: int):
+        for _, audit_entry in items:
+            audit_entry["status"] = status
+            audit_entry["attempts"] = attempts
+            audit_entry["delivered_at"] = time.time()
+            logger.info(f"Notify [Audit]: {json.dumps(audit_entry)}")
+        self._persist([entry for _, entry in items])
+        with self._idle:
+            self._outstanding -= len(items)
+            if self._outstanding <= 0:
+                self._idle.notify_all()
+
+    def _persist(self, entries: List[Dict[str, Any]]):
+        if not self.audit_path:
+            return
         try:
-            # Mock Webhook
-            await self._send_webhook(event)
-            # Mock Email
-            await self._send_email(event)
-            
-            cloud_metrics.counter("cloud.notifications.sent_count", 1, labels={"event_type": event_type})
-        except Exception as e:
-            logger.error(f"Notify: Dispatch failed: {e}")
-            cloud_metrics.counter("cloud.notifications.failed_count", 1, labels={"event_type": event_type, "error": str(type(e).__name__)})
-
-        # 3. Audit Logging
-        self._log_notification(event)
-
-    async def _send_webhook(self, event: Dict[str, Any]):
-        # In production, use a library like 'httpx' or 'requests'
-        logger.debug(f"Notify [Webhook]: POST to configured endpoint for {event.get('machine_id')}")
-
-    async def _send_email(self, event: Dict[str, Any]):
-        logger.debug(f"Notify [Email]: Sending alert for {event.get('machine_id')} to subscribers")
-
-    def _log_notification(self, event: Dict[str, Any]):
+            with open(self.audit_path, "a") as f:
+                for entry in entries:
+                    f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            logger.error(f"Notify: Failed to persist audit log: {e}")
+
+    def flush(self, timeout: float = 10.0, close_digests: bool = False) -> bool:
+        """Blocks until every queued notification is delivered or has failed. For tests and shutdown.
+
+        With `close_digests`, digests still collecting are sent now instead of at the end of their window.
+        """
+        deadline = time.monotonic() + timeout
+        if close_digests and self._thread is not None and self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._close_all_digests)
+        with self._idle:
+            while self._outstanding > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def shutdown(self):
+        """atexit hook: delivers what is still queued, for at most NOTIFY_SHUTDOWN_FLUSH_SEC (default 5)."""
+        with self._idle:
+            if self._outstanding <= 0:
+                return
+            pending = self._outstanding
+        if not self.flush(float(os.environ.get("NOTIFY_SHUTDOWN_FLUSH_SEC", 5)), close_digests=True):
+            logger.warning(f"Notify: Shutdown flush timed out; {self._outstanding} of {pending} notifications not delivered")
+
+    def _log_notification(self, event: Dict[str, Any]) -> Dict[str, Any]:
         audit_entry = {
             "timestamp": time.time(),
             "event_id": event.get("event_id"),
             "tenant_id": event.get("tenant_id"),
             "machine_id": event.get("machine_id"),
-            "status": "SENT"
+            "status": "QUEUED"
         }
         self.notification_log.append(audit_entry)
-        # In production, write to a DB
-        logger.info(f"Notify [Audit]: {json.dumps(audit_entry)}")
+        return audit_entry
 
 # Singleton instance
 dispatcher = NotificationDispatcher()
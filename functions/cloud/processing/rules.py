@@ -1,15 +1,121 @@
 import yaml
 import logging
 import hashlib
-from typing import Dict, Any, List, Optional
+import operator
+from collections import deque
+from datetime import datetime
+from typing import Callable, Deque, Dict, Any, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+AGGREGATES = ("avg", "min", "max", "rate")
+
+# (tenant_id, site_id); None matches any tenant/site
+Scope = Tuple[Optional[str], Optional[str]]
+
+class CompiledRule:
+    """A rule with its fields read once and its operator bound to a callable."""
+    __slots__ = ("rule", "id", "order", "metric", "compare", "value", "from_status", "to_status",
+                 "duration", "window", "aggregate", "stateful")
+
+    def __init__(self, rule: Dict[str, Any], order: int):
+        self.rule = rule
+        self.id = rule["id"]
+        self.order = order
+        self.metric = rule.get("metric")
+        self.value = rule.get("value")
+        self.compare = OPERATORS[rule["operator"]] if rule["type"] == "threshold" else None
+        self.from_status = rule.get("from")
+        self.to_status = rule.get("to")
+        self.duration = float(rule.get("duration_sec") or 0)
+        self.window = float(rule.get("window_sec") or 0)
+        self.aggregate = rule.get("aggregate", "avg") if self.window else None
+        if self.aggregate is not None and self.aggregate not in AGGREGATES:
+            raise KeyError(f"aggregate={self.aggregate}")
+        self.stateful = bool(self.duration or self.window)
+
+class RollingWindow:
+    """Samples of one metric over the last window_sec; avg/min/max/rate in O(1) amortized per sample."""
+    __slots__ = ("window", "samples", "total", "mins", "maxs")
+
+    def __init__(self, window_sec: float):
+        self.window = window_sec
+        self.samples: Deque[Tuple[float, float]] = deque()
+        self.total = 0.0
+        # Monotonic deques: front is the current min / max
+        self.mins: Deque[Tuple[float, float]] = deque()
+        self.maxs: Deque[Tuple[float, float]] = deque()
+
+    def add(self, ts: float, val: float):
+        self.samples.append((ts, val))
+        self.total += val
+        while self.mins and self.mins[-1][1] >= val:
+            self.mins.pop()
+        self.mins.append((ts, val))
+        while self.maxs and self.maxs[-1][1] <= val:
+            self.maxs.pop()
+        self.maxs.append((ts, val))
+
+        cutoff = ts - self.window
+        while self.samples[0][0] < cutoff:
+            _, old = self.samples.popleft()
+            self.total -= old
+        while self.mins[0][0] < cutoff:
+            self.mins.popleft()
+        while self.maxs[0][0] < cutoff:
+            self.maxs.popleft()
+
+    def value(self, aggregate: str) -> float:
+        if aggregate == "avg":
+            return self.total / len(self.samples)
+        if aggregate == "min":
+            return self.mins[0][1]
+        if aggregate == "max":
+            return self.maxs[0][1]
+        # rate: change per second across the window
+        (t0, v0), (t1, v1) = self.samples[0], self.samples[-1]
+        return (v1 - v0) / (t1 - t0) if t1 > t0 else 0.0
+
+class RuleState:
+    """Per-(machine, rule) rolling state for duration/window rules."""
+    __slots__ = ("window", "breach_since", "fired")
+
+    def __init__(self, rule: CompiledRule):
+        self.window = RollingWindow(rule.window) if rule.window else None
+        self.breach_since: Optional[float] = None
+        self.fired = False
+
+def _epoch(timestamp: str) -> float:
+    return datetime.fromisoformat(timestamp.replace("Z", "+00:00")).timestamp()
+
 class RuleEvaluator:
-    """Loads and evaluates rules against telemetry batches."""
-    
-    def __init__(self, rules_path: str = "cloud/rules/ruleset.yaml"):
-        self.rules = self._load_rules(rules_path)
+    """Loads and evaluates rules against telemetry batches.
+
+    Rules are compiled into indexes keyed by scope and then by metric name
+    (threshold rules) or (from, to) transition (state_change rules), so a
+    record only touches the rules for the metrics it carries. A rule may be
+    scoped with optional `tenant_id` / `site_id` keys.
+
+    Threshold rules with `duration_sec` and/or `window_sec` + `aggregate`
+    keep per-machine rolling state, updated incrementally per sample. They
+    fire once when the condition starts to hold (for the full duration) and
+    re-arm when it clears.
+    """
+
+    def __init__(self, rules_path: str = "cloud/rules/ruleset.yaml", rules: Optional[List[Dict[str, Any]]] = None):
+        self.rules = rules if rules is not None else self._load_rules(rules_path)
+        self._compile(self.rules)
+        # (machine_key, rule_id) -> RuleState
+        self._state: Dict[Tuple[str, str], RuleState] = {}
 
     def _load_rules(self, path: str) -> List[Dict[str, Any]]:
         try:
@@ -20,54 +126,115 @@ class RuleEvaluator:
             logger.error(f"Rules: Failed to load {path}: {e}")
             return []
 
-    def evaluate(self, record: Dict[str, Any], previous_state: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
-        """Evaluates a record against all rules. Returns derived EventRecords."""
-        derived_events = []
-        
-        for rule in self.rules:
-            event = None
+    def _compile(self, rules: List[Dict[str, Any]]):
+        self._thresholds: Dict[Scope, Dict[str, List[CompiledRule]]] = {}
+        self._transitions: Dict[Scope, Dict[Tuple[str, str], List[CompiledRule]]] = {}
+        for order, rule in enumerate(rules):
+            try:
+                compiled = CompiledRule(rule, order)
+            except KeyError as e:
+                logger.error(f"Rules: Skipping invalid rule {rule.get('id')}: missing/unknown {e}")
+                continue
+            scope = (rule.get("tenant_id"), rule.get("site_id"))
+            if scope[1] and not scope[0]:
+                logger.error(f"Rules: Skipping {compiled.id}: site_id scope requires tenant_id")
+                continue
             if rule["type"] == "threshold":
-                event = self._eval_threshold(rule, record)
-            elif rule["type"] == "state_change" and previous_state:
-                event = self._eval_state_change(rule, record, previous_state)
-            
-            if event:
-                derived_events.append(event)
-                
-        return derived_events
-
-    def _eval_threshold(self, rule: Dict[str, Any], record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        metric_name = rule["metric"]
-        metrics = record.get("metrics", {})
-        if metric_name not in metrics:
+                self._thresholds.setdefault(scope, {}).setdefault(compiled.metric, []).append(compiled)
+            elif rule["type"] == "state_change":
+                key = (compiled.from_status, compiled.to_status)
+                self._transitions.setdefault(scope, {}).setdefault(key, []).append(compiled)
+            else:
+                logger.warning(f"Rules: Unknown rule type {rule['type']} for {compiled.id}")
+
+    def _scopes(self, record: Dict[str, Any]) -> Tuple[Scope, ...]:
+        tenant_id, site_id = record.get("tenant_id"), record.get("site_id")
+        if not tenant_id:
+            return ((None, None),)
+        if not site_id:
+            return ((None, None), (tenant_id, None))
+        return ((None, None), (tenant_id, None), (tenant_id, site_id))
+
+    def evaluate(self, record: Dict[str, Any], previous_state: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Evaluates a record against the matching rules. Returns derived EventRecords."""
+        fired: List[Tuple[CompiledRule, str]] = []
+        metrics = record.get("metrics") or {}
+        scopes = self._scopes(record)
+        ts: Optional[float] = None  # parsed lazily, only for stateful rules
+
+        for scope in scopes:
+            by_metric = self._thresholds.get(scope)
+            if not by_metric:
+                continue
+            # Iterate whichever side is smaller
+            names = metrics if len(metrics) <= len(by_metric) else by_metric
+            for name in names:
+                candidates = by_metric.get(name)
+                if not candidates or name not in metrics:
+                    continue
+                val = metrics[name]
+                for rule in candidates:
+                    try:
+                        if rule.stateful:
+                            if ts is None:
+                                ts = _epoch(record["timestamp"])
+                            message = self._eval_stateful(rule, record, val, ts)
+                            if message:
+                                fired.append((rule, message))
+                        elif rule.compare(val, rule.value):
+                            fired.append((rule, f"Threshold {rule.value} breached: {val}"))
+                    except (TypeError, ValueError):
+                        logger.debug(f"Rules: Non-comparable value for {name}: {val!r}")
+
+        if previous_state:
+            transition = (previous_state.get("status"), record.get("status"))
+            for scope in scopes:
+                by_transition = self._transitions.get(scope)
+                if not by_transition:
+                    continue
+                for rule in by_transition.get(transition, ()):
+                    fired.append((rule, f"State change {rule.from_status} -> {rule.to_status} detected"))
+
+        if len(fired) > 1:
+            # Ruleset order, independent of index layout
+            fired.sort(key=lambda f: f[0].order)
+        return [self._create_derived_event(rule.rule, record, message) for rule, message in fired]
+
+    def _eval_stateful(self, rule: CompiledRule, record: Dict[str, Any], val: Any, ts: float) -> Optional[str]:
+        key = (f"{record['tenant_id']}:{record['site_id']}:{record['machine_id']}", rule.id)
+        state = self._state.get(key)
+        if state is None:
+            state = self._state[key] = RuleState(rule)
+
+        observed = val
+        if state.window is not None:
+            state.window.add(ts, float(val))
+            observed = state.window.value(rule.aggregate)
+
+        if not rule.compare(observed, rule.value):
+            state.breach_since = None
+            state.fired = False
             return None
-            
-        val = metrics[metric_name]
-        threshold = rule["value"]
-        triggered = False
-        
-        if rule["operator"] == ">" and val > threshold:
-            triggered = True
-        elif rule["operator"] == "<" and val < threshold:
-            triggered = True
-            
-        if triggered:
-            return self._create_derived_event(rule, record, f"Threshold {threshold} breached: {val}")
-        return None
-
-    def _eval_state_change(self, rule: Dict[str, Any], record: Dict[str, Any], prev: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        current_status = record.get("status")
-        previous_status = prev.get("status")
-        
-        if previous_status == rule["from"] and current_status == rule["to"]:
-            return self._create_derived_event(rule, record, f"State change {rule['from']} -> {rule['to']} detected")
-        return None
+        if state.breach_since is None:
+            state.breach_since = ts
+        held = ts - state.breach_since
+        if state.fired or held < rule.duration:
+            return None
+
+        state.fired = True
+        if state.window is not None:
+            message = f"{rule.aggregate}({rule.metric}) over {rule.window:.0f}s = {observed:.2f} breached {rule.value}"
+        else:
+            message = f"Threshold {rule.value} breached: {val}"
+        if rule.duration:
+            message += f" for {held:.0f}s"
+        return message
 
     def _create_derived_event(self, rule: Dict[str, Any], record: Dict[str, Any], message: str) -> Dict[str, Any]:
         # Deterministic Event ID for idempotency: tenant:site:machine:rule_id:record_timestamp
         seed = f"{record['tenant_id']}:{record['site_id']}:{record['machine_id']}:{rule['id']}:{record['timestamp']}"
         event_id = hashlib.sha256(seed.encode()).hexdigest()
-        
+
         return {
             "event_id": event_id,
             "tenant_id": record["tenant_id"],
@@ -0,0 +1,295 @@
+import asyncio
+import atexit
+import bisect
+import hashlib
+import heapq
+import itertools
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+def machine_key(record: Dict[str, Any]) -> str:
+    return f"{record['tenant_id']}:{record['site_id']}:{record['machine_id']}"
+
+class HashRing:
+    """Consistent hash ring over shard indexes (stable across processes, unlike hash())."""
+    def __init__(self, shards: int, vnodes: int = 64):
+        self.shards = shards
+        points = []
+        for shard in range(shards):
+            for v in range(vnodes):
+                points.append((self._hash(f"shard-{shard}#{v}"), shard))
+        points.sort()
+        self._hashes = [h for h, _ in points]
+        self._owners = [s for _, s in points]
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+    def shard_for(self, key: str) -> int:
+        i = bisect.bisect(self._hashes, self._hash(key)) % len(self._hashes)
+        return self._owners[i]
+
+def _shard_main(shard_id: int, inbox, results):
+    """Worker process: owns one StreamProcessor and applies commands in arrival order.
+
+    Replies go over the worker's own pipe, so a worker killed mid-reply cannot
+    wedge the other shards' results.
+    """
+    from cloud.processing.stream_processor import StreamProcessor
+    processor = StreamProcessor()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    while True:
+        msg = inbox.get()
+        if msg is None:
+            break
+        req_id, op, args = msg
+        try:
+            if op == "process_batch":
+                result = loop.run_until_complete(processor.process_batch(*args))
+            elif op == "ingest_events":
+                result = loop.run_until_complete(processor.ingest_events(*args))
+            elif op == "machine_states":
+                result = processor.machine_states(*args)
+            elif op == "machine_events":
+                result = processor.machine_events(*args)
+            elif op == "site_view":
+                result = processor.site_view(*args)
+            elif op == "site_version":
+                result = processor.site_version(*args)
+            elif op == "seen_event_ids":
+                result = processor.seen_event_ids()
+            elif op == "snapshot":
+                result = processor.snapshot()
+            elif op == "restore":
+                result = processor.restore(*args)
+            else:
+                raise ValueError(f"Unknown op {op}")
+            results.send((req_id, True, result))
+        except Exception as e:
+            results.send((req_id, False, f"shard {shard_id}: {type(e).__name__}: {e}"))
+    # Worker processes skip atexit hooks, so deliver this shard's queued notifications here
+    from cloud.processing.notify import dispatcher
+    dispatcher.shutdown()
+    loop.close()
+
+class ShardedProcessor:
+    """
+    Runs N StreamProcessors in worker processes. Records are routed by a
+    consistent hash of tenant:site:machine, so each machine's state, rolling
+    rule state and events live on one shard and its records are applied in
+    order. Exposes the StreamProcessor handler and query interface; queries
+    fan out to every shard and merge the results.
+
+    Batches wait at most `batch_timeout` for their shards. A monitor thread
+    checks the workers; when one exits, its pending commands fail and it is
+    restarted with an empty processor (the shard's state is lost until the
+    next snapshot restore or new records).
+    """
+    def __init__(self, shards: int, query_timeout: float = 5.0, start_method: str = "spawn",
+                 batch_timeout: float = 30.0, monitor_interval: float = 0.5):
+        self._ctx = multiprocessing.get_context(start_method)
+        self.shards = shards
+        self.query_timeout = query_timeout
+        self.batch_timeout = batch_timeout
+        self.monitor_interval = monitor_interval
+        self.ring = HashRing(shards)
+        self._inboxes = [None] * shards
+        self._results = [None] * shards
+        self._workers = [None] * shards
+        for shard in range(shards):
+            self._start_worker(shard)
+
+        self._ids = itertools.count()
+        self._pending: Dict[int, Tuple[int, Future]] = {}
+        # Reentrant: failing a future under the lock runs its _forget callback in the same thread
+        self._lock = threading.RLock()
+        self._closing = threading.Event()
+        self._reader = threading.Thread(target=self._read_results, name="processor-shard-results", daemon=True)
+        self._reader.start()
+        self._monitor = threading.Thread(target=self._watch_workers, name="processor-shard-monitor", daemon=True)
+        self._monitor.start()
+        atexit.register(self.close)
+        logger.info(f"ShardedProcessor: {shards} shard processes started")
+
+    # --- Plumbing ---
+    def _start_worker(self, shard: int):
+        # A fresh inbox, so commands sent to a dead worker are not replayed on its successor
+        self._inboxes[shard] = self._ctx.Queue()
+        reader, writer = self._ctx.Pipe(duplex=False)
+        self._results[shard] = reader
+        self._workers[shard] = self._ctx.Process(target=_shard_main, args=(shard, self._inboxes[shard], writer),
+                                                 name=f"processor-shard-{shard}", daemon=True)
+        self._workers[shard].start()
+        # Only the worker holds the write end, so its exit shows up as EOF
+        writer.close()
+
+    def _send(self, shard: int, op: str, *args) -> Future:
+        future: Future = Future()
+        with self._lock:
+            if not self._workers[shard].is_alive() and not self._closing.is_set():
+                self._restart(shard)
+            req_id = next(self._ids)
+            self._pending[req_id] = (shard, future)
+            self._inboxes[shard].put((req_id, op, args))
+        # Timed-out (cancelled) commands do not stay pending
+        future.add_done_callback(lambda _, req_id=req_id: self._forget(req_id))
+        return future
+
+    def _forget(self, req_id: int):
+        with self._lock:
+            self._pending.pop(req_id, None)
+
+    def _restart(self, shard: int):
+        """Fails the dead worker's pending commands and starts a new one. Caller holds `_lock`."""
+        from simco_agent.observability.metrics import cloud_metrics
+        dead = self._workers[shard]
+        failed = [req_id for req_id, (owner, _) in self._pending.items() if owner == shard]
+        logger.error(f"ShardedProcessor: shard {shard} exited (code {dead.exitcode}); "
+                     f"failing {len(failed)} pending commands and restarting it")
+        for req_id in failed:
+            _, future = self._pending.pop(req_id)
+            if not future.done():
+                future.set_exception(RuntimeError(f"shard {shard} exited with code {dead.exitcode}"))
+        cloud_metrics.counter("cloud.processor.shard_restart_count", 1, labels={"shard": str(shard)})
+        self._start_worker(shard)
+
+    def _watch_workers(self):
+        while not self._closing.wait(self.monitor_interval):
+            with self._lock:
+                if self._closing.is_set():
+                    return
+                for shard, worker in enumerate(self._workers):
+                    if not worker.is_alive():
+                        self._restart(shard)
+
+    def _read_results(self):
+        from multiprocessing.connection import wait
+        while not self._closing.is_set():
+            for conn in wait([c for c in self._results if not c.closed], timeout=self.monitor_interval):
+                try:
+                    msg = conn.recv()
+                except (EOFError, OSError):
+                    # Worker gone; the monitor fails its pending commands and restarts it
+                    conn.close()
+                    continue
+                self._resolve(*msg)
+
+    def _resolve(self, req_id: int, ok: bool, result: Any):
+        with self._lock:
+            _, future = self._pending.pop(req_id, (None, None))
+        if future is None or future.done():
+            return
+        if ok:
+            future.set_result(result)
+        else:
+            future.set_exception(RuntimeError(result))
+
+    def _partition(self, records: List[Dict[str, Any]]) -> Dict[int, List[Dict[str, Any]]]:
+        parts: Dict[int, List[Dict[str, Any]]] = {}
+        for record in records:
+            parts.setdefault(self.ring.shard_for(machine_key(record)), []).append(record)
+        return parts
+
+    def _fan_out(self, op: str, *args) -> List[Any]:
+        futures = [self._send(shard, op, *args) for shard in range(self.shards)]
+        try:
+            return [f.result(timeout=self.query_timeout) for f in futures]
+        finally:
+            for f in futures:
+                f.cancel()
+
+    async def _gather(self, futures: List[Future]) -> List[Any]:
+        """Awaits shard commands for at most `batch_timeout`; on timeout they are cancelled and dropped."""
+        from simco_agent.observability.metrics import cloud_metrics
+        try:
+            return await asyncio.wait_for(asyncio.gather(*(asyncio.wrap_future(f) for f in futures)), self.batch_timeout)
+        except asyncio.TimeoutError:
+            cloud_metrics.counter("cloud.processor.shard_timeout_count", 1)
+            logger.error(f"ShardedProcessor: shard commands timed out after {self.batch_timeout}s")
+            raise
+
+    # --- StreamProcessor handler interface ---
+    async def process_batch(self, records: List[Dict[str, Any]]):
+        from simco_agent.observability.metrics import cloud_metrics
+        start = time.monotonic()
+        parts = self._partition(records)
+        await self._gather([self._send(shard, "process_batch", part) for shard, part in parts.items()])
+        cloud_metrics.histogram("cloud.processor.shard_batch_latency_ms", (time.monotonic() - start) * 1000)
+        cloud_metrics.gauge("cloud.processor.shards_touched", len(parts))
+
+    async def ingest_events(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        parts = self._partition(events)
+        results = await self._gather([self._send(shard, "ingest_events", part) for shard, part in parts.items()])
+        return [e for accepted in results for e in accepted]
+
+    # --- Query interface ---
+    def machine_states(self, tenant_id: Optional[str] = None, site_id: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        merged: Dict[str, Dict[str, Any]] = {}
+        for part in self._fan_out("machine_states", tenant_id, site_id):
+            merged.update(part)
+        return merged
+
+    def machine_events(self, tenant_id: Optional[str] = None, site_id: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+        merged: Dict[str, List[Dict[str, Any]]] = {}
+        for part in self._fan_out("machine_events", tenant_id, site_id):
+            merged.update(part)
+        return merged
+
+    def site_view(self, tenant_id: str, site_id: Optional[str] = None, top_n: int = 20) -> Dict[str, Any]:
+        from cloud.processing.site_index import empty_fleet
+        machines: Dict[str, Dict[str, Any]] = {}
+        fleet = empty_fleet()
+        alerts: List[Dict[str, Any]] = []
+        for part in self._fan_out("site_view", tenant_id, site_id, top_n):
+            machines.update(part["machines"])
+            for bucket, n in part["fleet"].items():
+                fleet[bucket] += n
+            alerts.extend(part["alerts"])
+        alerts = heapq.nlargest(top_n, alerts, key=lambda e: e.get("timestamp") or "")
+        return {"machines": machines, "fleet": fleet, "alerts": alerts}
+
+    def site_version(self, tenant_id: str, site_id: Optional[str] = None) -> int:
+        return sum(self._fan_out("site_version", tenant_id, site_id))
+
+    def seen_event_ids(self) -> List[str]:
+        return [eid for part in self._fan_out("seen_event_ids") for eid in part]
+
+    # --- Snapshot / warm restore ---
+    def snapshot(self) -> Dict[str, Any]:
+        merged: Dict[str, Any] = {"state": {}, "events": {}}
+        for part in self._fan_out("snapshot"):
+            merged["state"].update(part["state"])
+            merged["events"].update(part["events"])
+        return merged
+
+    def restore(self, snapshot: Dict[str, Any]):
+        """Routes each machine's entries to its owning shard (the shard count may have changed)."""
+        parts: Dict[int, Dict[str, Any]] = {shard: {"state": {}, "events": {}} for shard in range(self.shards)}
+        for section in ("state", "events"):
+            for key, value in snapshot.get(section, {}).items():
+                parts[self.ring.shard_for(key)][section][key] = value
+        futures = [self._send(shard, "restore", part) for shard, part in parts.items()]
+        try:
+            for f in futures:
+                f.result(timeout=self.query_timeout)
+        finally:
+            for f in futures:
+                f.cancel()
+
+    def close(self):
+        self._closing.set()
+        if not any(w.is_alive() for w in self._workers):
+            return
+        for inbox in self._inboxes:
+            inbox.put(None)
+        for w in self._workers:
+            w.join(timeout=5)
@@ -0,0 +1,109 @@
+import heapq
+import itertools
+from typing import Any, Dict, List, Optional, Tuple
+
+# (tenant_id, site_id)
+SiteKey = Tuple[str, str]
+
+FLEET_BUCKETS = ("running", "idle", "alarm", "offline")
+
+def fleet_bucket(status: Optional[str]) -> str:
+    """Wallboard fleet bucket for a machine status."""
+    status = (status or "OFFLINE").upper()
+    if status in ("RUNNING", "ACTIVE"):
+        return "running"
+    if status == "IDLE":
+        return "idle"
+    if status in ("ALARM", "FAULT"):
+        return "alarm"
+    return "offline"
+
+def empty_fleet() -> Dict[str, int]:
+    return {"total": 0, **{b: 0 for b in FLEET_BUCKETS}}
+
+class SiteIndex:
+    """
+    Secondary indexes over processor state, keyed by (tenant, site) and
+    updated incrementally as records and events arrive:
+
+    - latest record per machine of the site
+    - fleet counts per bucket (running / idle / alarm / offline)
+    - the newest `alerts_per_site` events, as a min-heap on timestamp
+    - a version per site, bumped on every change, so readers can tell
+      whether a view they built earlier is still current
+
+    A site view is then O(machines in site) instead of a scan of every
+    machine key in the processor.
+    """
+    def __init__(self, alerts_per_site: int = 20):
+        self.alerts_per_site = alerts_per_site
+        self.machines: Dict[SiteKey, Dict[str, Dict[str, Any]]] = {}
+        self.fleet: Dict[SiteKey, Dict[str, int]] = {}
+        self.alerts: Dict[SiteKey, List[Tuple[str, int, Dict[str, Any]]]] = {}
+        self.sites_by_tenant: Dict[str, set] = {}
+        self.versions: Dict[SiteKey, int] = {}
+        self._seq = itertools.count()  # heap tie-breaker
+
+    @staticmethod
+    def _split(machine_key: str) -> Tuple[SiteKey, str]:
+        tenant_id, site_id, machine_id = machine_key.split(":", 2)
+        return (tenant_id, site_id), machine_id
+
+    def _site(self, site: SiteKey):
+        if site not in self.machines:
+            self.machines[site] = {}
+            self.fleet[site] = empty_fleet()
+            self.alerts[site] = []
+            self.versions[site] = 0
+            self.sites_by_tenant.setdefault(site[0], set()).add(site[1])
+
+    def update_state(self, machine_key: str, record: Dict[str, Any]):
+        site, machine_id = self._split(machine_key)
+        self._site(site)
+        counts = self.fleet[site]
+        previous = self.machines[site].get(machine_id)
+        if previous is None:
+            counts["total"] += 1
+        else:
+            counts[fleet_bucket(previous.get("status"))] -= 1
+        counts[fleet_bucket(record.get("status"))] += 1
+        self.machines[site][machine_id] = record
+        self.versions[site] += 1
+
+    def add_alert(self, machine_key: str, event: Dict[str, Any]):
+        site, _ = self._split(machine_key)
+        self._site(site)
+        heap = self.alerts[site]
+        item = (event.get("timestamp") or "", next(self._seq), event)
+        if len(heap) < self.alerts_per_site:
+            heapq.heappush(heap, item)
+        elif item[0] >= heap[0][0]:
+            heapq.heapreplace(heap, item)
+        else:
+            return
+        self.versions[site] += 1
+
+    def _sites(self, tenant_id: str, site_id: Optional[str]) -> List[SiteKey]:
+        if site_id:
+            return [(tenant_id, site_id)] if (tenant_id, site_id) in self.machines else []
+        return [(tenant_id, s) for s in list(self.sites_by_tenant.get(tenant_id, ()))]
+
+    def version(self, tenant_id: str, site_id: Optional[str] = None) -> int:
+        """Changes whenever the view for the site (or tenant) changes. Versions only grow, so a sum works."""
+        return sum(self.versions[site] for site in self._sites(tenant_id, site_id))
+
+    def view(self, tenant_id: str, site_id: Optional[str] = None, top_n: int = 20) -> Dict[str, Any]:
+        """Machines (by machine_id), fleet counts and newest-first alerts for a site, or a whole tenant."""
+        machines: Dict[str, Dict[str, Any]] = {}
+        fleet = empty_fleet()
+        alerts: List[Tuple[str, int, Dict[str, Any]]] = []
+        for site in self._sites(tenant_id, site_id):
+            machines.update(self.machines[site])
+            for bucket, n in self.fleet[site].items():
+                fleet[bucket] += n
+            alerts.extend(self.alerts[site])
+        return {
+            "machines": machines,
+            "fleet": fleet,
+            "alerts": [event for _, _, event in heapq.nlargest(top_n, alerts)],
+        }
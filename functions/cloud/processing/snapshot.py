@@ -0,0 +1,290 @@
+import atexit
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+class SnapshotStore:
+    """Generic interface for the durable processor snapshot store."""
+    def save(self, key: str, data: bytes):
+        raise NotImplementedError
+
+    def load(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def keys(self, prefix: str) -> List[str]:
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+class FileSnapshotStore(SnapshotStore):
+    """Local stand-in: one file per key, replaced atomically."""
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json.gz")
+
+    def save(self, key, data):
+        path = self._path(key)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def load(self, key):
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def keys(self, prefix):
+        suffix = ".json.gz"
+        return sorted(name[:-len(suffix)] for name in os.listdir(self.directory)
+                      if name.startswith(prefix) and name.endswith(suffix))
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+class GCSSnapshotStore(SnapshotStore):
+    """Cloud Storage objects under gs://<bucket>/<prefix>/<key>.json.gz."""
+    def __init__(self, bucket: str, prefix: str = "processor-snapshots"):
+        from google.cloud import storage
+        self.bucket = storage.Client().bucket(bucket)
+        self.prefix = prefix
+
+    def save(self, key, data):
+        self.bucket.blob(f"{self.prefix}/{key}.json.gz").upload_from_string(data, content_type="application/gzip")
+
+    def load(self, key):
+        from google.api_core.exceptions import NotFound
+        try:
+            return self.bucket.blob(f"{self.prefix}/{key}.json.gz").download_as_bytes()
+        except NotFound:
+            return None
+
+    def keys(self, prefix):
+        start, suffix = len(self.prefix) + 1, ".json.gz"
+        return sorted(blob.name[start:-len(suffix)] for blob in self.bucket.list_blobs(prefix=f"{self.prefix}/{prefix}")
+                      if blob.name.endswith(suffix))
+
+    def delete(self, key):
+        from google.api_core.exceptions import NotFound
+        try:
+            self.bucket.blob(f"{self.prefix}/{key}.json.gz").delete()
+        except NotFound:
+            pass
+
+def encode(snapshot: Dict[str, Any]) -> bytes:
+    return gzip.compress(json.dumps(snapshot, separators=(",", ":"), default=str).encode("utf-8"), compresslevel=5)
+
+def decode(data: bytes) -> Dict[str, Any]:
+    return json.loads(gzip.decompress(data))
+
+def merge_snapshots(snapshots: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    One snapshot from several instances' snapshots: the newest record per
+    machine (by record timestamp), and the union of events per machine
+    (deduplicated on event_id, oldest first).
+    """
+    state: Dict[str, Dict[str, Any]] = {}
+    events: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for snapshot in snapshots:
+        for key, record in snapshot.get("state", {}).items():
+            current = state.get(key)
+            if current is None or str(record.get("timestamp") or "") > str(current.get("timestamp") or ""):
+                state[key] = record
+        for key, machine_events in snapshot.get("events", {}).items():
+            merged = events.setdefault(key, {})
+            for event in machine_events:
+                merged.setdefault(event["event_id"], event)
+    return {
+        "state": state,
+        "events": {key: sorted(by_id.values(), key=lambda e: str(e.get("timestamp") or "")) for key, by_id in events.items()},
+    }
+
+class ProcessorSnapshotter:
+    """
+    Periodically saves processor state (latest record per machine, recent
+    events per machine) and restores it on startup, so a restarted
+    instance serves the wallboard from warm state instead of scanning
+    BigQuery, and state-change rules see the previous status.
+
+    `processor` is anything with `snapshot() -> dict` and `restore(dict)`
+    (StreamProcessor or ShardedProcessor).
+
+    Each instance writes its own object, `<key>-<instance_id>`, so
+    concurrent instances never overwrite each other. Restore merges every
+    snapshot under `key` that is younger than max_age_sec (see
+    merge_snapshots) and deletes the stale ones. It then compacts: the
+    merged result is written back under `key` and the per-instance objects
+    it absorbed are deleted, so the next cold start reads one object plus
+    whatever live instances have saved since.
+    """
+    def __init__(self, processor, store: SnapshotStore, key: str = "processor_state",
+                 interval_sec: float = 60, max_age_sec: float = 24 * 3600, instance_id: Optional[str] = None):
+        self.processor = processor
+        self.store = store
+        self.key = key
+        self.instance_id = instance_id or uuid.uuid4().hex[:12]
+        self.instance_key = f"{key}-{self.instance_id}"
+        self.interval_sec = interval_sec
+        self.max_age_sec = max_age_sec
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def save(self) -> int:
+        """Writes one snapshot. Returns its size in bytes."""
+        from simco_agent.observability.metrics import cloud_metrics
+        start = time.monotonic()
+        snapshot = self.processor.snapshot()
+        snapshot["version"] = SNAPSHOT_VERSION
+        snapshot["taken_at"] = time.time()
+        data = encode(snapshot)
+        self.store.save(self.instance_key, data)
+        cloud_metrics.histogram("cloud.processor.snapshot_latency_ms", (time.monotonic() - start) * 1000)
+        cloud_metrics.gauge("cloud.processor.snapshot_bytes", len(data))
+        cloud_metrics.gauge("cloud.processor.snapshot_machines", len(snapshot.get("state", {})))
+        return len(data)
+
+    def restore(self) -> bool:
+        """Loads the merged instance snapshots into the processor. False if there is none usable."""
+        from simco_agent.observability.metrics import cloud_metrics
+        start = time.monotonic()
+        try:
+            keys = self.store.keys(self.key)
+        except Exception as e:
+            logger.error(f"Snapshot: Failed to list {self.key}: {e}")
+            return False
+
+        loaded: Dict[str, Dict[str, Any]] = {}
+        for key in keys:
+            # Per-instance keys plus the compacted key (also written by older deploys)
+            if key != self.key and not key.startswith(f"{self.key}-"):
+                continue
+            snapshot = self._load(key)
+            if snapshot is not None:
+                loaded[key] = snapshot
+        snapshots = list(loaded.values())
+        if not snapshots:
+            logger.info(f"Snapshot: No usable snapshot under {self.key}, starting cold")
+            return False
+
+        merged = merge_snapshots(snapshots)
+        self.processor.restore(merged)
+        newest = max(snapshot.get("taken_at", 0) for snapshot in snapshots)
+        self._compact(merged, newest, [key for key in loaded if key != self.key])
+        cloud_metrics.gauge("cloud.processor.snapshot_objects_merged", len(snapshots))
+        cloud_metrics.gauge("cloud.processor.snapshot_age_sec", time.time() - newest)
+        cloud_metrics.histogram("cloud.processor.restore_latency_ms", (time.monotonic() - start) * 1000)
+        logger.info(f"Snapshot: Restored {len(merged['state'])} machines from {len(snapshots)} snapshot(s) under {self.key}")
+        return True
+
+    def _compact(self, merged: Dict[str, Any], taken_at: float, absorbed: List[str]):
+        """Writes the merged snapshot under `key` and deletes the instance snapshots it absorbed.
+
+        Keeps the newest absorbed taken_at, so max_age_sec still ages the compacted
+        object out. An instance that saves between our load and delete loses that
+        one save; its next save (interval_sec) brings it back.
+        """
+        if not absorbed:
+            return
+        try:
+            self.store.save(self.key, encode(dict(merged, version=SNAPSHOT_VERSION, taken_at=taken_at)))
+        except Exception as e:
+            logger.error(f"Snapshot: Failed to compact into {self.key}: {e}")
+            return
+        for key in absorbed:
+            try:
+                self.store.delete(key)
+            except Exception as e:
+                logger.warning(f"Snapshot: Failed to delete compacted {key}: {e}")
+        logger.info(f"Snapshot: Compacted {len(absorbed)} instance snapshot(s) into {self.key}")
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        """One instance snapshot, or None if it is missing, unreadable, foreign or stale (stale ones are deleted)."""
+        try:
+            data = self.store.load(key)
+        except Exception as e:
+            logger.error(f"Snapshot: Failed to load {key}: {e}")
+            return None
+        if data is None:
+            return None
+        try:
+            snapshot = decode(data)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Snapshot: Ignoring unreadable {key}: {e}")
+            return None
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            logger.warning(f"Snapshot: Ignoring {key} with version {snapshot.get('version')}")
+            return None
+        age = time.time() - snapshot.get("taken_at", 0)
+        if age > self.max_age_sec:
+            logger.warning(f"Snapshot: Ignoring {key}, {age:.0f}s old (max {self.max_age_sec:.0f}s)")
+            try:
+                self.store.delete(key)
+            except Exception as e:
+                logger.warning(f"Snapshot: Failed to delete stale {key}: {e}")
+            return None
+        return snapshot
+
+    def start(self):
+        """Saves every interval_sec on a daemon thread until stop(), and once more at exit."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="processor-snapshot", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stop.wait(self.interval_sec):
+            try:
+                self.save()
+            except Exception as e:
+                logger.error(f"Snapshot: Failed to save {self.instance_key}: {e}")
+
+    def stop(self, final_save: bool = True):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        if final_save:
+            try:
+                self.save()
+            except Exception as e:
+                logger.error(f"Snapshot: Final save failed: {e}")
+
+def build_snapshotter(processor) -> Optional[ProcessorSnapshotter]:
+    """
+    Selects the store from PROCESSOR_SNAPSHOT:
+    none (default) | file (PROCESSOR_SNAPSHOT_DIR) | gcs (PROCESSOR_SNAPSHOT_BUCKET).
+    PROCESSOR_INSTANCE_ID names this instance's snapshot (random per process by default).
+    """
+    mode = os.environ.get("PROCESSOR_SNAPSHOT", "none")
+    if mode == "none":
+        return None
+    if mode == "file":
+        store: SnapshotStore = FileSnapshotStore(os.environ.get("PROCESSOR_SNAPSHOT_DIR", ".processor_snapshots"))
+    elif mode == "gcs":
+        store = GCSSnapshotStore(os.environ["PROCESSOR_SNAPSHOT_BUCKET"])
+    else:
+        raise ValueError(f"Unknown PROCESSOR_SNAPSHOT mode {mode}")
+    return ProcessorSnapshotter(
+        processor, store,
+        interval_sec=float(os.environ.get("PROCESSOR_SNAPSHOT_INTERVAL_SEC", 60)),
+        max_age_sec=float(os.environ.get("PROCESSOR_SNAPSHOT_MAX_AGE_SEC", 24 * 3600)),
+        instance_id=os.environ.get("PROCESSOR_INSTANCE_ID"),
+    )
@@ -0,0 +1,162 @@
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+HOURLY_TABLE = "hourly_machine_stats"
+DAILY_TABLE = "daily_machine_stats"
+
+# Status buckets, as in the former hourly_machine_stats view
+STATUS_BUCKETS = {
+    "minutes_active": ("ACTIVE", "RUNNING"),
+    "minutes_idle": ("IDLE", "READY"),
+    "minutes_alarm": ("ALARM", "FAULT", "ERROR"),
+    "minutes_stopped": ("STOPPED", "OFFLINE"),
+}
+STAT_COLUMNS = tuple(STATUS_BUCKETS) + ("samples",)
+
+def _merge_actions(keys, columns) -> str:
+    updates = ", ".join(f"{c} = S.{c}" for c in columns)
+    names = ", ".join(keys + columns)
+    return f"""WHEN MATCHED THEN UPDATE SET {updates}, updated_at = CURRENT_TIMESTAMP()
+WHEN NOT MATCHED THEN INSERT ({names}, updated_at) VALUES ({", ".join(f"S.{c}" for c in keys + columns)}, CURRENT_TIMESTAMP())"""
+
+def hourly_merge_sql(project_id: str, dataset: str) -> str:
+    """
+    Recomputes the hours in [@since, @until) from raw_telemetry and MERGEs
+    them into hourly_machine_stats. Both raw_telemetry and the target are
+    filtered on their partition column, so a run reads only the hours it
+    rewrites. The last sample of the range counts one minute, as in the
+    view; the next run recomputes that hour once its successor arrived.
+    """
+    buckets = ",\n    ".join(
+        f"SUM(IF(status IN ({', '.join(repr(s) for s in statuses)}), duration_sec, 0)) / 60.0 AS {column}"
+        for column, statuses in STATUS_BUCKETS.items()
+    )
+    return f"""
+MERGE `{project_id}.{dataset}.{HOURLY_TABLE}` T
+USING (
+  WITH base AS (
+    SELECT
+      tenant_id, site_id, machine_id, status, timestamp,
+      LEAD(timestamp) OVER (PARTITION BY tenant_id, machine_id ORDER BY timestamp) AS next_ts
+    FROM `{project_id}.{dataset}.raw_telemetry`
+    WHERE timestamp >= @since AND timestamp < @until
+  ),
+  durations AS (
+    SELECT
+      tenant_id, site_id, machine_id, status,
+      TIMESTAMP_TRUNC(timestamp, HOUR) AS hour_bucket,
+      TIMESTAMP_DIFF(COALESCE(next_ts, TIMESTAMP_ADD(timestamp, INTERVAL 1 MINUTE)), timestamp, SECOND) AS duration_sec
+    FROM base
+  )
+  SELECT
+    tenant_id, site_id, machine_id, hour_bucket,
+    {buckets},
+    COUNT(1) AS samples
+  FROM durations
+  GROUP BY tenant_id, site_id, machine_id, hour_bucket
+) S
+ON T.hour_bucket >= @since AND T.hour_bucket < @until
+  AND T.tenant_id = S.tenant_id AND T.site_id = S.site_id AND T.machine_id = S.machine_id
+  AND T.hour_bucket = S.hour_bucket
+{_merge_actions(["tenant_id", "site_id", "machine_id", "hour_bucket"], list(STAT_COLUMNS))}
+""".strip()
+
+def daily_merge_sql(project_id: str, dataset: str) -> str:
+    """Re-aggregates the (UTC) days touched since @since from hourly_machine_stats into daily_machine_stats."""
+    sums = ",\n    ".join(f"SUM({c}) AS {c}" for c in STAT_COLUMNS)
+    return f"""
+MERGE `{project_id}.{dataset}.{DAILY_TABLE}` T
+USING (
+  SELECT
+    tenant_id, site_id, machine_id, DATE(hour_bucket) AS day,
+    {sums},
+    COUNT(1) AS hours
+  FROM `{project_id}.{dataset}.{HOURLY_TABLE}`
+  WHERE hour_bucket >= TIMESTAMP(DATE(@since))
+  GROUP BY tenant_id, site_id, machine_id, day
+) S
+ON T.day >= DATE(@since)
+  AND T.tenant_id = S.tenant_id AND T.site_id = S.site_id AND T.machine_id = S.machine_id
+  AND T.day = S.day
+{_merge_actions(["tenant_id", "site_id", "machine_id", "day"], list(STAT_COLUMNS) + ["hours"])}
+""".strip()
+
+def _hour_floor(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+class StatsRollup:
+    """
+    Incremental rollup of raw_telemetry into the partitioned, clustered
+    hourly_machine_stats and daily_machine_stats tables.
+
+    Each run starts at the newest rolled-up hour minus `grace_hours` (late
+    or buffered edge data), recomputes every hour from there up to now and
+    MERGEs the result, then re-aggregates the affected days. An empty table
+    is backfilled over `backfill_days`; `run(since=...)` rebuilds an
+    explicit range. Late records older than the grace window are picked up
+    only by such an explicit run.
+    """
+    def __init__(self, client, project_id: str, dataset: str, grace_hours: int = 6, backfill_days: int = 30):
+        self.client = client
+        self.project_id = project_id
+        self.dataset = dataset
+        self.grace_hours = grace_hours
+        self.backfill_days = backfill_days
+
+    def _job_config(self, **params):
+        from google.cloud import bigquery
+        return bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ScalarQueryParameter(name, "TIMESTAMP", value) for name, value in params.items()
+        ])
+
+    def watermark(self, now: datetime) -> Optional[datetime]:
+        """Newest rolled-up hour, looking back at most `backfill_days` (a partition-pruned scan)."""
+        sql = f"""
+            SELECT MAX(hour_bucket) AS hour_bucket
+            FROM `{self.project_id}.{self.dataset}.{HOURLY_TABLE}`
+            WHERE hour_bucket >= @floor
+        """
+        floor = now - timedelta(days=self.backfill_days)
+        rows = list(self.client.query(sql, job_config=self._job_config(floor=floor)).result())
+        return rows[0]["hour_bucket"] if rows else None
+
+    def run(self, since: Optional[datetime] = None, now: Optional[datetime] = None) -> Dict[str, Any]:
+        from simco_agent.observability.metrics import cloud_metrics
+        now = now or datetime.now(timezone.utc)
+        if since is None:
+            mark = self.watermark(now)
+            since = mark - timedelta(hours=self.grace_hours) if mark else now - timedelta(days=self.backfill_days)
+        since = _hour_floor(since)
+        until = now
+
+        hourly = self.client.query(hourly_merge_sql(self.project_id, self.dataset),
+                                   job_config=self._job_config(since=since, until=until))
+        hourly.result()
+        daily = self.client.query(daily_merge_sql(self.project_id, self.dataset),
+                                  job_config=self._job_config(since=since))
+        daily.result()
+
+        result = {
+            "since": since.isoformat(),
+            "until": until.isoformat(),
+            "hourly_rows": getattr(hourly, "num_dml_affected_rows", None),
+            "daily_rows": getattr(daily, "num_dml_affected_rows", None),
+            "bytes_processed": (getattr(hourly, "total_bytes_processed", None) or 0)
+                               + (getattr(daily, "total_bytes_processed", None) or 0),
+        }
+        cloud_metrics.gauge("cloud.stats_rollup.hours", (until - since).total_seconds() / 3600)
+        cloud_metrics.counter("cloud.stats_rollup.bytes_processed", result["bytes_processed"])
+        logger.info(f"StatsRollup: {result}")
+        return result
+
+def build_stats_rollup(client, project_id: str, dataset: str) -> StatsRollup:
+    """ROLLUP_GRACE_HOURS (default 6) and ROLLUP_BACKFILL_DAYS (default 30) tune the incremental window."""
+    return StatsRollup(
+        client, project_id, dataset,
+        grace_hours=int(os.environ.get("ROLLUP_GRACE_HOURS", 6)),
+        backfill_days=int(os.environ.get("ROLLUP_BACKFILL_DAYS", 30)),
+    )
@@ -1,64 +1,197 @@
 import logging
 import asyncio
-from typing import List, Dict, Any
+import os
+import threading
+from typing import List, Dict, Any, Optional
+from .idempotency import GenerationalSet
 from .rules import RuleEvaluator
 from .notify import dispatcher
+from .site_index import SiteIndex
+from .live_feed import feed
 from simco_agent.observability.metrics import cloud_metrics
 
 logger = logging.getLogger(__name__)
 
+def in_scope(machine_key: str, tenant_id: Optional[str], site_id: Optional[str]) -> bool:
+    """True if a tenant:site:machine key belongs to tenant_id (and site_id, if given)."""
+    if tenant_id is None:
+        return True
+    tid, sid, _ = machine_key.split(":", 2)
+    return tid == tenant_id and (not site_id or sid == site_id)
+
 class StreamProcessor:
-    """Orchestrates machine state updates and rule evaluation."""
+    """Orchestrates machine state updates and rule evaluation.
+
+    Batches arrive on the bus thread while events, reads and snapshots come
+    from request and snapshotter threads, so every touch of the stores goes
+    through `_lock`. The lock is never held across an await: notifications
+    and live-feed pushes happen after it is released.
+    """
     
     def __init__(self):
+        self._lock = threading.RLock()
         self.evaluator = RuleEvaluator()
         # Simulated operational store: {machine_key: last_record}
         self.state_store: Dict[str, Dict[str, Any]] = {}
-        # Simulated event store for idempotency check
-        self.event_ids = set()
+        # Event IDs seen within the dedup horizon (bounded by time and size)
+        self.event_ids = GenerationalSet(
+            window_sec=float(os.environ.get("EVENT_DEDUP_WINDOW_SEC", 6 * 3600)),
+            generations=int(os.environ.get("EVENT_DEDUP_GENERATIONS", 6)),
+            max_entries=int(os.environ.get("EVENT_DEDUP_MAX_ENTRIES", 1_000_000)),
+            name="event_ids"
+        )
         # Persistence for retrieval via Portal API (Ring buffer: machine_key -> list[event])
         self.event_store: Dict[str, List[Dict[str, Any]]] = {}
         self.MAX_EVENTS_PER_MACHINE = 100
+        # Per-(tenant, site) latest state, fleet counts and newest alerts for the wallboard
+        self.site_index = SiteIndex(alerts_per_site=int(os.environ.get("SITE_ALERTS_TOP_N", 20)))
 
     async def process_batch(self, records: List[Dict[str, Any]]):
-        """Handler for EventBus subscriptions."""
+        """Handler for EventBus subscriptions.
+
+        Records are grouped by machine: each machine's records run in arrival
+        order, while different machines proceed concurrently.
+        """
+        by_machine: Dict[str, List[Dict[str, Any]]] = {}
+        for record in records:
+            machine_key = f"{record['tenant_id']}:{record['site_id']}:{record['machine_id']}"
+            by_machine.setdefault(machine_key, []).append(record)
+
+        if len(by_machine) == 1:
+            await self._process_machine(records)
+            return
+        await asyncio.gather(*(self._process_machine(group) for group in by_machine.values()))
+
+    async def _process_machine(self, records: List[Dict[str, Any]]):
         for record in records:
             await self.process_record(record)
 
     async def process_record(self, record: Dict[str, Any]):
         machine_key = f"{record['tenant_id']}:{record['site_id']}:{record['machine_id']}"
-        prev_state = self.state_store.get(machine_key)
-        
-        # 1. Evaluate Rules
-        derived_events = self.evaluator.evaluate(record, prev_state)
-        
-        # 2. Handle Derived Events
-        for event in derived_events:
-            if event["event_id"] in self.event_ids:
-                logger.debug(f"Processor: Skipping duplicate event {event['event_id']}")
-                continue
-            
-            self.event_ids.add(event["event_id"])
-            logger.info(f"Processor: NEW EVENT generated: {event['event_type']} for {record['machine_id']}")
-            cloud_metrics.counter("cloud.processor.events_emitted_count", 1, labels={"event_type": event["event_type"]})
+        with self._lock:
+            prev_state = self.state_store.get(machine_key)
 
-            # Write to operational event store
-            machine_key = f"{record['tenant_id']}:{record['site_id']}:{record['machine_id']}"
-            if machine_key not in self.event_store:
-                self.event_store[machine_key] = []
-            
-            self.event_store[machine_key].append(event)
-            # Keep only last N events
-            if len(self.event_store[machine_key]) > self.MAX_EVENTS_PER_MACHINE:
-                self.event_store[machine_key].pop(0)
-            
-            # 3. Dispatch Notifications
-            await dispatcher.dispatch(event)
-
-        # 4. Update Operational State
-        self.state_store[machine_key] = record
+            # 1. Evaluate Rules
+            derived_events = self.evaluator.evaluate(record, prev_state)
+
+            # 2. Store Derived Events
+            new_events = [e for e in derived_events if self._store_event(machine_key, e)]
+
+            # 3. Update Operational State
+            self.state_store[machine_key] = record
+            self.site_index.update_state(machine_key, record)
+
+        # 4. Publish / notify outside the lock
+        for event in new_events:
+            await self._announce_event(event)
+        feed.publish(record["tenant_id"], record["site_id"], "machine", record)
         # In production, write to Firestore/Redis
         logger.debug(f"Processor: Updated operational state for {machine_key}")
 
+    # --- Query interface (shared with ShardedProcessor) ---
+    def machine_states(self, tenant_id: Optional[str] = None, site_id: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Latest record per machine key, optionally limited to a tenant / site."""
+        with self._lock:
+            return {k: v for k, v in self.state_store.items() if in_scope(k, tenant_id, site_id)}
+
+    def machine_events(self, tenant_id: Optional[str] = None, site_id: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """Recent events per machine key, optionally limited to a tenant / site."""
+        with self._lock:
+            return {k: list(v) for k, v in self.event_store.items() if in_scope(k, tenant_id, site_id)}
+
+    def site_view(self, tenant_id: str, site_id: Optional[str] = None, top_n: int = 20) -> Dict[str, Any]:
+        """Indexed machines, fleet counts and newest alerts for a site (or all sites of a tenant)."""
+        with self._lock:
+            return self.site_index.view(tenant_id, site_id, top_n)
+
+    def site_version(self, tenant_id: str, site_id: Optional[str] = None) -> int:
+        """Bumped whenever a record or event changes site_view for the site (or tenant)."""
+        with self._lock:
+            return self.site_index.version(tenant_id, site_id)
+
+    def seen_event_ids(self) -> List[str]:
+        with self._lock:
+            return list(self.event_ids)
+
+    # --- Snapshot / warm restore (see cloud/processing/snapshot.py) ---
+    def snapshot(self) -> Dict[str, Any]:
+        """Compact copy of the latest record and recent events per machine."""
+        with self._lock:
+            return {"state": self.machine_states(), "events": self.machine_events()}
+
+    def restore(self, snapshot: Dict[str, Any]):
+        """Loads a snapshot. Live entries win over snapshot entries for the same machine."""
+        with self._lock:
+            self._restore(snapshot)
+
+    def _restore(self, snapshot: Dict[str, Any]):
+        for key, record in snapshot.get("state", {}).items():
+            if key not in self.state_store:
+                self.state_store[key] = record
+                self.site_index.update_state(key, record)
+        for key, events in snapshot.get("events", {}).items():
+            if key in self.event_store:
+                continue
+            self.event_store[key] = events[-self.MAX_EVENTS_PER_MACHINE:]
+            # Re-derived copies of restored events stay deduplicated
+            for event in self.event_store[key]:
+                self.event_ids.add(event["event_id"])
+                self.site_index.add_alert(key, event)
+
+    async def ingest_events(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Feeds edge-generated events (EventRecord dicts) into the event store and notifications.
+
+        Returns the events that were new to this processor.
+        """
+        accepted = []
+        for event in events:
+            hot_event = {
+                "event_id": event["event_id"],
+                "tenant_id": event["tenant_id"],
+                "site_id": event["site_id"],
+                "machine_id": event["machine_id"],
+                "timestamp": event["timestamp"],
+                "event_type": event["type"],
+                "severity": event["severity"],
+                "message": (event.get("details") or {}).get("message") or event["type"],
+                "details": event.get("details"),
+                "source": "edge"
+            }
+            machine_key = f"{event['tenant_id']}:{event['site_id']}:{event['machine_id']}"
+            with self._lock:
+                new = self._store_event(machine_key, hot_event)
+            if new:
+                await self._announce_event(hot_event)
+                accepted.append(hot_event)
+        return accepted
+
+    def _store_event(self, machine_key: str, event: Dict[str, Any]) -> bool:
+        """Dedup check-and-add plus event store / site index update. Caller holds `_lock`."""
+        if event["event_id"] in self.event_ids:
+            logger.debug(f"Processor: Skipping duplicate event {event['event_id']}")
+            cloud_metrics.counter("cloud.processor.dedup_hit_count", 1, labels={"event_type": event["event_type"]})
+            return False
+
+        self.event_ids.add(event["event_id"])
+        logger.info(f"Processor: NEW EVENT generated: {event['event_type']} for {event['machine_id']}")
+        cloud_metrics.counter("cloud.processor.events_emitted_count", 1, labels={"event_type": event["event_type"]})
+
+        # Write to operational event store
+        if machine_key not in self.event_store:
+            self.event_store[machine_key] = []
+
+        self.event_store[machine_key].append(event)
+        # Keep only last N events
+        if len(self.event_store[machine_key]) > self.MAX_EVENTS_PER_MACHINE:
+            self.event_store[machine_key].pop(0)
+        self.site_index.add_alert(machine_key, event)
+        return True
+
+    async def _announce_event(self, event: Dict[str, Any]):
+        feed.publish(event["tenant_id"], event["site_id"], "alert", event)
+
+        # Dispatch Notifications
+        await dispatcher.dispatch(event)
+
 # Singleton instance
 processor = StreamProcessor()
@@ -0,0 +1,126 @@
+"""
+Cold-start support for the Cloud Functions entry point.
+
+Every function in main.py is deployed from the same module, so anything
+imported at module load is paid by every endpoint. Heavy dependencies are
+therefore reached through LazyModule proxies, and API clients are created
+once per process and shared across requests.
+"""
+import importlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger("functions.coldstart")
+
+class LazyModule:
+    """Module proxy that defers the import until the first attribute access."""
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr: str) -> Any:
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+bigquery = LazyModule("google.cloud.bigquery")
+
+# --- Process-wide clients ---
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.Lock()
+
+def shared_client(name: str, factory: Callable[[], Any]) -> Any:
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = factory()
+                _clients[name] = client
+    return client
+
+def get_bq_client():
+    return shared_client("bigquery", lambda: bigquery.Client())
+
+def get_firestore_client():
+    from firebase_admin import firestore
+    return shared_client("firestore", firestore.client)
+
+CLIENT_FACTORIES: Dict[str, Callable[[], Any]] = {
+    "bigquery": get_bq_client,
+    "firestore": get_firestore_client,
+}
+
+# --- Per-endpoint dependencies (what a cold instance of each function needs) ---
+_PROCESSING = ["cloud.processing.stream_processor", "cloud.processing.bus", "cloud.processing.fleet_index"]
+
+ENDPOINT_DEPS: Dict[str, Dict[str, List[str]]] = {
+    "ingest_telemetry": {"modules": ["simco_common.schemas_v3", "firebase_admin.auth", "cloud.processing.telemetry_sink", "cloud.processing.idempotency",
+                                     "cloud.processing.telemetry_sql", "cloud.processing.machine_latest"] + _PROCESSING,
+                         "clients": ["bigquery"]},
+    "drain_ingest_queue": {"modules": ["cloud.processing.ingest_queue", "cloud.processing.telemetry_sink", "cloud.processing.telemetry_sql",
+                                       "cloud.processing.idempotency", "cloud.processing.machine_latest"] + _PROCESSING,
+                           "clients": ["bigquery"]},
+    "rollup_machine_stats": {"modules": ["cloud.processing.stats_rollup"], "clients": ["bigquery"]},
+    "ingest_events": {"modules": ["simco_common.schemas_v3", "cloud.processing.telemetry_sink",
+                                  "cloud.processing.idempotency"] + _PROCESSING,
+                      "clients": ["bigquery"]},
+    "ingest_assets": {"modules": [], "clients": ["bigquery"]},
+    "portal_api": {"modules": ["firebase_admin.auth", "cloud.processing.machine_latest"] + _PROCESSING, "clients": ["bigquery", "firestore"]},
+    "equations_api": {"modules": ["equation_engine", "cloud.processing.telemetry_sql"], "clients": ["bigquery"]},
+    "metrics_history": {"modules": ["firebase_admin.auth"], "clients": ["bigquery"]},
+    "get_mobile_context": {"modules": ["cloud.processing.machine_latest"], "clients": ["bigquery"]},
+    "resolve_mobile_context": {"modules": ["cloud.processing.machine_latest"], "clients": ["bigquery"]},
+    "ask": {"modules": ["cloud.processing.telemetry_sql"], "clients": ["bigquery"]},
+    "pair_init": {"modules": [], "clients": ["firestore"]},
+    "pair_confirm": {"modules": ["firebase_admin.auth"], "clients": ["firestore"]},
+    "pair_token": {"modules": [], "clients": ["firestore"]},
+    "admin_api": {"modules": ["admin_api.routes"], "clients": []},
+}
+
+def warm_up(endpoint: Optional[str] = None, clients: bool = True) -> Dict[str, float]:
+    """
+    Imports the endpoint's dependencies and (optionally) creates its clients.
+    Returns {module_or_client: milliseconds}. Unknown/None endpoint warms nothing.
+    """
+    deps = ENDPOINT_DEPS.get(endpoint or "", {})
+    timings: Dict[str, float] = {}
+    for mod in deps.get("modules", []):
+        start = time.perf_counter()
+        try:
+            importlib.import_module(mod)
+        except Exception as e:
+            logger.warning(f"Warm-up: import {mod} failed: {e}")
+            continue
+        timings[mod] = (time.perf_counter() - start) * 1000
+    if clients:
+        for name in deps.get("clients", []):
+            start = time.perf_counter()
+            try:
+                CLIENT_FACTORIES[name]()
+            except Exception as e:
+                logger.warning(f"Warm-up: client {name} failed: {e}")
+                continue
+            timings[f"client:{name}"] = (time.perf_counter() - start) * 1000
+    return timings
+
+def prewarm_in_background() -> Optional[threading.Thread]:
+    """
+    Warms the deployed function (FUNCTION_TARGET) on a daemon thread so its
+    imports and client handshakes overlap with the first request's arrival.
+    Disable with COLDSTART_PREWARM=0.
+    """
+    target = os.environ.get("FUNCTION_TARGET")
+    if os.environ.get("COLDSTART_PREWARM", "1") != "1" or target not in ENDPOINT_DEPS:
+        return None
+
+    def _run():
+        timings = warm_up(target)
+        logger.info(f"Warm-up [{target}]: {sum(timings.values()):.1f}ms {timings}")
+
+    thread = threading.Thread(target=_run, name="coldstart-prewarm", daemon=True)
+    thread.start()
+    return thread
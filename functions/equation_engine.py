@@ -0,0 +1,215 @@
+"""
+Local evaluator for equations_api.
+
+The equation AST (already validated by main._compile_expr) is compiled into
+NumPy operations over hourly per-machine rollups of raw_telemetry and
+raw_events. One rollup query per (tenant, site, window) is shared by every
+equation over that window, so interactive "what-if" equations are evaluated
+in process in milliseconds. Long windows, ERP variables and windows that
+do not start and end on a full hour still use the BigQuery SQL plan.
+"""
+import ast
+import math
+from datetime import datetime
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Sequence
+
+import numpy as np
+
+# Rollup columns per (hour, machine_id). "<metric>_sum" / "<metric>_n" give exact averages over any hours.
+ROLLUP_METRICS = ("spindle_load", "feed_rate", "power_kw")
+
+def rollup_sql(project_id: str, dataset: str) -> str:
+    """Hourly per-machine rollup of telemetry and events for @tenant_id/@site_id in [@start_ts, @end_ts)."""
+    from cloud.processing.telemetry_sql import metric_expr, time_range
+    metric_cols = ",\n    ".join(
+        f"SUM({metric_expr(m)}) AS {m}_sum,\n"
+        f"    COUNT({metric_expr(m)}) AS {m}_n"
+        for m in ROLLUP_METRICS
+    )
+    window = time_range()
+    return f"""
+WITH
+telemetry AS (
+  SELECT
+    TIMESTAMP_TRUNC(timestamp, HOUR) AS hour, machine_id,
+    COUNT(1) AS samples,
+    {metric_cols}
+  FROM `{project_id}.{dataset}.raw_telemetry`
+  WHERE tenant_id = @tenant_id AND site_id = @site_id AND {window}
+  GROUP BY hour, machine_id
+),
+events AS (
+  SELECT
+    TIMESTAMP_TRUNC(timestamp, HOUR) AS hour, machine_id,
+    COUNT(1) AS events,
+    COUNTIF(type = 'ALARM') AS alarms,
+    COUNTIF(type = 'DOWNTIME') AS downtimes,
+    SUM(CASE WHEN type='DOWNTIME' THEN SAFE_CAST(JSON_VALUE(details, '$.duration_seconds') AS FLOAT64) ELSE 0 END) AS downtime_sec
+  FROM `{project_id}.{dataset}.raw_events`
+  WHERE tenant_id = @tenant_id AND site_id = @site_id AND {window}
+  GROUP BY hour, machine_id
+)
+SELECT * FROM telemetry FULL OUTER JOIN events USING (hour, machine_id)
+""".strip()
+
+class LocalUnsupported(Exception):
+    """The equation needs the BigQuery plan (ERP variables, constant-only grouped equations...)."""
+
+def _round_half_away(x: np.ndarray, digits: np.ndarray) -> np.ndarray:
+    # BigQuery ROUND rounds halfway cases away from zero; np.round rounds to even
+    scale = np.power(10.0, digits)
+    return np.sign(x) * np.floor(np.abs(x) * scale + 0.5) / scale
+
+def _safe_divide(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(b == 0, np.nan, a / np.where(b == 0, 1, b))
+
+def _nullif(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.where(a == b, np.nan, a)
+
+def _log(x: np.ndarray, base: Optional[np.ndarray] = None) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = np.log(np.where(x > 0, x, np.nan))
+        if base is not None:
+            out = out / np.log(np.where((base > 0) & (base != 1), base, np.nan))
+    return out
+
+_FUNCS: Dict[str, Callable[..., np.ndarray]] = {
+    "ABS": np.abs,
+    "ROUND": lambda x, d=None: _round_half_away(x, np.zeros_like(x) if d is None else d),
+    "SQRT": lambda x: np.sqrt(np.where(x >= 0, x, np.nan)),
+    "LOG": _log,
+    "EXP": np.exp,
+    "NULLIF": _nullif,
+}
+
+class LocalPlan:
+    """
+    An equation compiled to a function of per-group variable arrays. NaN
+    stands for SQL NULL. `integral` is True when BigQuery would return
+    INT64 (counts combined with +, -, * and ABS).
+    """
+    def __init__(self, fn: Callable[[Dict[str, np.ndarray]], np.ndarray], used: FrozenSet[str],
+                 sources: FrozenSet[str], integral: bool):
+        self.fn = fn
+        self.used = used
+        self.sources = sources
+        self.integral = integral
+
+def _compile(node: ast.AST, specs: Dict[str, Dict[str, str]], used: set):
+    """Returns (fn(vars, n) -> array, integral)."""
+    if isinstance(node, ast.Expression):
+        return _compile(node.body, specs, used)
+
+    if isinstance(node, ast.Constant):
+        value = float(node.value)
+        return (lambda v, n: np.full(n, value)), isinstance(node.value, int)
+
+    if isinstance(node, ast.Name):
+        spec = specs[node.id]
+        if "local" not in spec:
+            raise LocalUnsupported(f"{node.id} has no local rollup")
+        used.add(node.id)
+        name = node.id
+        integral = spec["local"].startswith("count:")  # COUNT/COUNTIF are INT64 in BigQuery
+        return (lambda v, n: v[name]), integral
+
+    if isinstance(node, ast.UnaryOp):
+        inner, integral = _compile(node.operand, specs, used)
+        if isinstance(node.op, ast.USub):
+            return (lambda v, n: -inner(v, n)), integral
+        return inner, integral
+
+    if isinstance(node, ast.BinOp):
+        left, li = _compile(node.left, specs, used)
+        right, ri = _compile(node.right, specs, used)
+        if isinstance(node.op, ast.Add):
+            return (lambda v, n: left(v, n) + right(v, n)), li and ri
+        if isinstance(node.op, ast.Sub):
+            return (lambda v, n: left(v, n) - right(v, n)), li and ri
+        if isinstance(node.op, ast.Mult):
+            return (lambda v, n: left(v, n) * right(v, n)), li and ri
+        return (lambda v, n: _safe_divide(left(v, n), right(v, n))), False
+
+    if isinstance(node, ast.Call):
+        name = node.func.id.upper()
+        args = [_compile(a, specs, used) for a in node.args]
+        fns = [a[0] for a in args]
+        func = _FUNCS[name]
+        integral = name == "ABS" and all(a[1] for a in args)
+        def call(v, n):
+            with np.errstate(over="ignore", invalid="ignore"):
+                return func(*(f(v, n) for f in fns))
+        return call, integral
+
+    raise LocalUnsupported(f"Unsupported node {type(node).__name__}")
+
+def compile_local(tree: ast.Expression, variables: Dict[str, Dict[str, str]]) -> LocalPlan:
+    """Compiles a parsed equation (validated by the SQL compiler first) into a LocalPlan."""
+    used: set = set()
+    fn, integral = _compile(tree, variables, used)
+    if not used:
+        raise LocalUnsupported("Constant equation")
+    sources = frozenset(variables[v]["src"] for v in used)
+    return LocalPlan(lambda v: fn(v, len(next(iter(v.values())))), frozenset(used), sources, integral)
+
+def _column(rows: Sequence[Dict[str, Any]], name: str) -> np.ndarray:
+    return np.array([r.get(name) if r.get(name) is not None else 0.0 for r in rows], dtype=float)
+
+def evaluate(plan: LocalPlan, variables: Dict[str, Dict[str, str]], rows: Sequence[Dict[str, Any]],
+             group_by: str, start_ts: datetime, end_ts: datetime, limit: int = 500) -> List[Dict[str, Any]]:
+    """
+    Evaluates the plan over rollup rows, with the same grouping, NULL and
+    ordering semantics as the SQL plan (variables COALESCE to 0, a group
+    exists when a source it uses has rows in it).
+    """
+    rows = [r for r in rows if start_ts <= r["hour"] < end_ts]
+    if not rows:
+        return []
+
+    if group_by == "day":
+        keys = np.array([r["hour"].date().isoformat() for r in rows])
+    elif group_by == "machine":
+        keys = np.array([str(r["machine_id"]) for r in rows])
+    else:
+        keys = np.zeros(len(rows), dtype=int)
+    groups, inverse = np.unique(keys, return_inverse=True)
+    n = len(groups)
+
+    def total(column: str) -> np.ndarray:
+        return np.bincount(inverse, weights=_column(rows, column), minlength=n)
+
+    present = np.zeros(n, dtype=bool)
+    if "telemetry" in plan.sources:
+        present |= total("samples") > 0
+    if "events" in plan.sources:
+        present |= total("events") > 0
+
+    values: Dict[str, np.ndarray] = {}
+    for name in plan.used:
+        # "count:<col>" / "sum:<col>" add up the rollup column, "avg:<metric>" divides <metric>_sum by <metric>_n
+        agg, column = variables[name]["local"].split(":", 1)
+        if agg == "avg":
+            sums, counts = total(f"{column}_sum"), total(f"{column}_n")
+            # AVG over no values is NULL, then COALESCE(..., 0)
+            values[name] = np.where(counts > 0, sums / np.where(counts > 0, counts, 1), 0.0)
+        else:
+            values[name] = total(column)
+
+    result = plan.fn(values)
+    out = []
+    for i in np.flatnonzero(present)[:limit]:
+        value = result[i]
+        if math.isnan(value) or math.isinf(value):
+            value = None
+        elif plan.integral:
+            value = int(value)
+        else:
+            value = float(value)
+        if group_by == "day":
+            out.append({"day": str(groups[i]), "value": value})
+        elif group_by == "machine":
+            out.append({"machine_id": str(groups[i]), "value": value})
+        else:
+            out.append({"value": value})
+    return out
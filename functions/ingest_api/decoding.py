@@ -0,0 +1,126 @@
+"""
+Streaming request-body decoding for the ingest endpoints.
+
+Bodies are read from the WSGI stream in blocks, gunzipped incrementally
+when `Content-Encoding: gzip` is set, and (for NDJSON) parsed one line at a
+time, so a large backlog flush is validated and forwarded in chunks instead
+of being materialized as one Python object graph. Every read counts against
+a hard per-request limit on both the wire and the decoded size.
+"""
+import json
+import os
+import zlib
+from typing import Any, Iterable, Iterator, List
+
+READ_BLOCK_BYTES = 64 * 1024
+NDJSON_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines"}
+
+class PayloadTooLarge(Exception):
+    pass
+
+class PayloadDecodeError(ValueError):
+    pass
+
+def max_body_bytes() -> int:
+    """Hard per-request limit (wire and decoded), INGEST_MAX_BODY_BYTES, default 32 MiB."""
+    return int(os.environ.get("INGEST_MAX_BODY_BYTES", 32 * 1024 * 1024))
+
+def chunk_rows() -> int:
+    return int(os.environ.get("INGEST_CHUNK_ROWS", 1000))
+
+def is_ndjson(req) -> bool:
+    return (req.mimetype or "").lower() in NDJSON_TYPES
+
+def iter_body(req, max_bytes: int) -> Iterator[bytes]:
+    """Yields decoded body blocks, raising PayloadTooLarge past max_bytes."""
+    if req.content_length and req.content_length > max_bytes:
+        raise PayloadTooLarge(f"Content-Length {req.content_length} exceeds {max_bytes} bytes")
+
+    encoding = (req.headers.get("Content-Encoding") or "identity").lower()
+    if encoding not in ("identity", "gzip"):
+        raise PayloadDecodeError(f"Unsupported Content-Encoding: {encoding}")
+    # 16 + MAX_WBITS: expect a gzip header and trailer
+    inflater = zlib.decompressobj(16 + zlib.MAX_WBITS) if encoding == "gzip" else None
+
+    wire = decoded = 0
+    while True:
+        block = req.stream.read(READ_BLOCK_BYTES)
+        if not block:
+            break
+        wire += len(block)
+        if wire > max_bytes:
+            raise PayloadTooLarge(f"Body exceeds {max_bytes} bytes")
+        if inflater is None:
+            decoded += len(block)
+            yield block
+            continue
+        try:
+            # Bounded output per call guards against decompression bombs
+            out = inflater.decompress(block, max_bytes - decoded + 1)
+            while out:
+                decoded += len(out)
+                if decoded > max_bytes:
+                    raise PayloadTooLarge(f"Decompressed body exceeds {max_bytes} bytes")
+                yield out
+                out = inflater.decompress(inflater.unconsumed_tail, max_bytes - decoded + 1) if inflater.unconsumed_tail else b""
+        except zlib.error as e:
+            raise PayloadDecodeError(f"Invalid gzip body: {e}")
+    if inflater is not None:
+        tail = inflater.flush()
+        if decoded + len(tail) > max_bytes:
+            raise PayloadTooLarge(f"Decompressed body exceeds {max_bytes} bytes")
+        if tail:
+            yield tail
+
+def read_json(req, max_bytes: int) -> Any:
+    """Whole-document JSON body (gzip-aware, size-limited). Returns None for an empty body."""
+    body = b"".join(iter_body(req, max_bytes))
+    if not body.strip():
+        return None
+    try:
+        return json.loads(body)
+    except ValueError as e:
+        raise PayloadDecodeError(f"Invalid JSON body: {e}")
+
+def iter_ndjson(req, max_bytes: int) -> Iterator[Any]:
+    """Yields one parsed object per non-blank line as the body streams in."""
+    pending = b""
+    line_no = 0
+
+    def _parse(line: bytes):
+        try:
+            return json.loads(line)
+        except ValueError as e:
+            raise PayloadDecodeError(f"Invalid NDJSON at line {line_no}: {e}")
+
+    for block in iter_body(req, max_bytes):
+        pending += block
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            line_no += 1
+            if line.strip():
+                yield _parse(line)
+    if pending.strip():
+        line_no += 1
+        yield _parse(pending)
+
+def iter_items(req, max_bytes: int) -> Iterator[Any]:
+    """Rows of an NDJSON body, or of a JSON array / single JSON object body."""
+    if is_ndjson(req):
+        yield from iter_ndjson(req, max_bytes)
+        return
+    data = read_json(req, max_bytes)
+    if isinstance(data, list):
+        yield from data
+    elif data is not None:
+        yield data
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    chunk: List[Any] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -1,23 +1,20 @@
-from firebase_functions import https_fn, options
-from firebase_admin import initialize_app, firestore, auth
+from firebase_functions import https_fn, options, scheduler_fn
+from firebase_admin import initialize_app
 import firebase_admin
-from google.cloud import bigquery
 import sys
 import os
 import json
 import logging
-import portal_api as portal_api_routes
-import mgmt_api as mgmt_api_routes
-import ingest_api as ingest_api_routes
-from admin_api import routes as admin_api_routes # PR2
 
 from datetime import datetime, timezone
-from typing import Optional
+from typing import List, Optional, Tuple
 
 import functools
 from auth.middleware import require_auth
 
-# sys.path handled above
+# Cold start: heavy SDKs and route modules load on first use (see coldstart.py)
+from coldstart import LazyModule, bigquery, get_bq_client, get_firestore_client, shared_client, prewarm_in_background
+auth = LazyModule("firebase_admin.auth")
 
 # Add root directory to sys.path to allow imports from simco_common
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -62,17 +59,208 @@ def cors_enabled(func):
         return response
     return wrapper
 
-def get_bq_client():
-    return bigquery.Client()
-
 dataset_id = "simco_telemetry"
 table_id = "raw_telemetry"
 
-from cloud.processing.bus import bus
-from cloud.processing.stream_processor import processor
+# Explicit BQ Schema Fields to avoid "no such field" errors (e.g. driver)
+def get_telemetry_sink():
+    """Per-instance raw_telemetry sink (see cloud/processing/telemetry_sink.py)."""
+    def _build():
+        from cloud.processing.telemetry_sink import build_telemetry_sink
+        from cloud.processing.telemetry_sql import RAW_TELEMETRY_COLUMN_TYPES, RAW_TELEMETRY_FIELDS
+        return build_telemetry_sink(
+            os.environ.get("BQ_DATASET", "simco_telemetry"), table_id,
+            RAW_TELEMETRY_FIELDS, client_factory=get_bq_client, column_types=RAW_TELEMETRY_COLUMN_TYPES
+        )
+    return shared_client("telemetry_sink", _build)
+
+RAW_EVENT_FIELDS = ("event_id", "tenant_id", "site_id", "machine_id", "device_id",
+                    "actor_user_id", "timestamp", "type", "severity", "details")
+
+def get_event_sink():
+    """Per-instance raw_events sink; same backend selection as raw_telemetry."""
+    def _build():
+        from cloud.processing.telemetry_sink import build_telemetry_sink
+        return build_telemetry_sink(
+            os.environ.get("BQ_DATASET", "simco_telemetry"), "raw_events",
+            RAW_EVENT_FIELDS, client_factory=get_bq_client
+        )
+    return shared_client("event_sink", _build)
+
+def get_event_validator():
+    """List[EventRecord] TypeAdapter, built once per instance and reused for every batch."""
+    def _build():
+        from pydantic import TypeAdapter
+        from simco_common.schemas_v3 import EventRecord
+        return TypeAdapter(List[EventRecord])
+    return shared_client("event_validator", _build)
+
+def get_idempotency_cache():
+    """Per-instance ingest dedup cache (see cloud/processing/idempotency.py)."""
+    def _build():
+        from cloud.processing.idempotency import build_idempotency_cache
+        return build_idempotency_cache(firestore_factory=get_firestore_client)
+    return shared_client("idempotency_cache", _build)
+
+def get_ingest_queue():
+    """Accept-then-flush queue for INGEST_MODE=async (see cloud/processing/ingest_queue.py)."""
+    def _build():
+        from cloud.processing.ingest_queue import build_ingest_queue
+        return build_ingest_queue(project_factory=lambda: get_bq_client().project)
+    return shared_client("ingest_queue", _build)
+
+def get_machine_latest():
+    """Latest record per machine, fed by ingest (see cloud/processing/machine_latest.py)."""
+    def _build():
+        from cloud.processing.machine_latest import build_machine_latest
+        return build_machine_latest(firestore_factory=get_firestore_client)
+    return shared_client("machine_latest", _build)
+
+def get_query_cache():
+    """Shared BigQuery result cache for the read endpoints (functions/query_cache.py)."""
+    from query_cache import build_query_cache
+    return shared_client("query_cache", build_query_cache)
+
+# Hot-path processing stack, loaded by the endpoints that use it
+bus = None
+processor = None
+
+def get_processor():
+    global bus, processor
+    if processor is None:
+        from cloud.processing.bus import bus as _bus
+        shards = int(os.environ.get("PROCESSOR_SHARDS", "1"))
+        if shards > 1:
+            # Multi-process: state partitioned by tenant:site:machine (cloud/processing/sharding.py)
+            from cloud.processing.sharding import ShardedProcessor
+            _processor = ShardedProcessor(shards, batch_timeout=float(os.environ.get("PROCESSOR_SHARD_TIMEOUT_SEC", "30")))
+        else:
+            from cloud.processing.stream_processor import processor as _processor
+        # Warm restart: reload the last state snapshot before taking traffic
+        from cloud.processing.snapshot import build_snapshotter
+        snapshotter = build_snapshotter(_processor)
+        if snapshotter is not None:
+            snapshotter.restore()
+            snapshotter.start()
+        # Initialize Background Processor (Local/Dev)
+        _bus.subscribe(_processor.process_batch)
+        bus, processor = _bus, _processor
+    return processor
+
+def get_bus():
+    get_processor()
+    return bus
+
+prewarm_in_background()
+
+def _run_hot_path(coro):
+    """Drives a hot-path coroutine from a synchronous handler in a single loop pass."""
+    import asyncio
+    try:
+        loop = asyncio.get_event_loop()
+    except RuntimeError:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+    # For Unified Dev Router optimization: ensure processing runs now
+    if loop.is_running():
+        loop.create_task(coro)
+    else:
+        loop.run_until_complete(coro)
 
-# Initialize Background Processor (Local/Dev)
-bus.subscribe(processor.process_batch)
+def _settle_hot_path():
+    """Waits (bounded) for published batches and their notifications before a handler returns.
+
+    Bus subscribers and notification delivery run after `publish` / `dispatch`
+    return. On Cloud Functions / Cloud Run CPU is throttled once the response
+    is sent, so there the handler waits up to HOT_PATH_SETTLE_SEC (default 10;
+    0 elsewhere, where the background threads keep running and the dispatcher
+    flushes at exit).
+    """
+    import time
+    from cloud.processing.notify import dispatcher
+    from simco_agent.observability.metrics import cloud_metrics
+    default = "10" if os.environ.get("K_SERVICE") or os.environ.get("FUNCTION_TARGET") else "0"
+    timeout = float(os.environ.get("HOT_PATH_SETTLE_SEC", default))
+    if timeout <= 0:
+        return
+    deadline = time.monotonic() + timeout
+    flush = getattr(get_bus(), "flush", None)
+    settled = flush(timeout) if flush is not None else True
+    # Open digests are sent now rather than after NOTIFY_DIGEST_WINDOW_MS
+    settled = dispatcher.flush(max(deadline - time.monotonic(), 0), close_digests=True) and settled
+    if not settled:
+        logger.warning(f"Hot path still busy after {timeout}s; response sent before processing finished")
+        cloud_metrics.counter("cloud.ingest.hot_path_settle_timeout_count", 1)
+
+def _ingest_records(records: List[dict]) -> Tuple[int, List[dict]]:
+    """
+    Writes validated telemetry (model_dump'ed dicts) to raw_telemetry and publishes
+    it to the hot path. Shared by the synchronous endpoint and the queue consumer.
+    Returns (records ingested, sink errors indexed into `records`).
+    """
+    import time
+    from simco_agent.observability.metrics import cloud_metrics
+
+    # Drop record_ids that already landed (edge retries, queue redelivery)
+    dedup = get_idempotency_cache()
+    record_keys = [f"record:{r.get('tenant_id')}:{r.get('record_id')}" for r in records]
+    already = dedup.seen(record_keys)
+    kept = list(range(len(records)))  # index into the caller's records, for the returned errors
+    if already:
+        cloud_metrics.counter("cloud.ingest.dedup_hit_count", len(already), labels={"level": "record"})
+        kept = [i for i, k in enumerate(record_keys) if k not in already]
+        records = [records[i] for i in kept]
+        record_keys = [record_keys[i] for i in kept]
+    cloud_metrics.counter("cloud.ingest.dedup_miss_count", len(records))
+    cloud_metrics.gauge("cloud.ingest.dedup_hit_rate", dedup.stats()["hit_rate"])
+    if not records:
+        return 0, []
+
+    # Transform for BQ: catalog signals to typed columns, other metrics to the JSON overflow
+    from cloud.processing.telemetry_sql import telemetry_row
+
+    rows_to_insert = []
+    row_ids = []
+    for d in records:
+        rows_to_insert.append(telemetry_row(d))
+        # PR11: Deduplication via InsertID
+        # record_id is deterministic {device_id}:{sqlite_id} set by Agent
+        row_ids.append(d.get("record_id"))
+
+    # Cold Path: Storage Write API sink, coalesced with concurrent requests
+    bq_start = time.time()
+    errors = get_telemetry_sink().write(rows_to_insert, row_ids=row_ids)
+    cloud_metrics.histogram("cloud.ingest.bq_insert_latency_ms", (time.time() - bq_start) * 1000)
+    if errors:
+        logger.error(f"BQ Insert Errors: {errors}")
+        # We might still want to proceed to Hot Path, or partial fail?
+        # For strict warehouse, this is an issue.
+
+    # Hot Path: one publish for the whole batch (Expansion Task 1).
+    # StreamProcessor.process_batch keeps per-machine ordering. This times the
+    # enqueue only; processing time is cloud.bus.handler_latency_ms.
+    proc_start = time.time()
+    _run_hot_path(get_bus().publish(records))
+    cloud_metrics.histogram("cloud.ingest.hot_path_publish_latency_ms", (time.time() - proc_start) * 1000)
+
+    # Latest-state store for point reads (/state, mobile context)
+    try:
+        get_machine_latest().update(records)
+    except Exception as e:
+        logger.error(f"machine_latest update failed: {e}")
+
+    # Fleet health index (/health/fleet)
+    from cloud.processing.fleet_index import fleet_index
+    fleet_index.observe_records(records)
+
+    # Remember what landed; rows that failed stay retryable
+    failed = {e.get("index") for e in errors}
+    dedup.mark([k for i, k in enumerate(record_keys) if i not in failed])
+    # Errors index the caller's records, so the queue consumer can nack the messages that own them
+    errors = [dict(e, index=kept[e["index"]]) if isinstance(e.get("index"), int) and 0 <= e["index"] < len(kept) else e
+              for e in errors]
+    return len(records), errors
 
 def log_audit_event(actor: str, action: str, details: dict):
     """Common audit logger for privileged actions."""
@@ -91,165 +279,234 @@ def log_audit_event(actor: str, action: str, details: dict):
 @require_auth
 def ingest_telemetry(req: https_fn.Request) -> https_fn.Response:
     """Unified Edge-to-Cloud Ingestion Point (v3.1)."""
-    from simco_common.schemas_v3 import TelemetryBatch, TelemetryRecordV3
+    from simco_common.schemas_v3 import TelemetryBatch, TelemetryRecordV3, content_record_id
+    from ingest_api.decoding import PayloadTooLarge, chunk_rows, chunked, is_ndjson, iter_ndjson, max_body_bytes, read_json
 
     if req.method != 'POST':
         return https_fn.Response('Only POST allowed', status=405)
 
+    import itertools
+    import time
+    from simco_agent.observability.metrics import cloud_metrics
+    start_time = time.time()
+    accepted = ingested = 0
     try:
-        import time
-        from simco_agent.observability.metrics import cloud_metrics
-        start_time = time.time()
-        
-        data = req.get_json()
-        if not data:
-            cloud_metrics.counter("cloud.ingest.rejected_count", 1, labels={"reason": "no_json"})
-            return https_fn.Response('No JSON provided', status=400)
+        def _single(data: dict):
+            # Records sent without a record_id get one derived from their content, so distinct
+            # readings of a machine never share a dedup key
+            if "record_id" not in data:
+                data["record_id"] = content_record_id(data)
+            return TelemetryRecordV3(**data)
 
         # 1. Flexible Schema Validation (Task 5-1 adaptation)
-        # Supports both TelemetryBatch and single TelemetryRecordV3
-        if "records" in data and "gateway_id" in data:
-            payload = TelemetryBatch(**data)
-            records = payload.records
+        # Supports TelemetryBatch, a single TelemetryRecordV3, or an NDJSON stream of
+        # records (gzip-aware). NDJSON is validated and forwarded chunk by chunk as it is read.
+        if is_ndjson(req):
+            chunks = ([_single(d) for d in chunk] for chunk in chunked(iter_ndjson(req, max_body_bytes()), chunk_rows()))
         else:
-            # Wrap single record into a list for consistent processing
-            # Ensure deterministic record_id if missing
-            if "record_id" not in data:
-                data["record_id"] = f"{data.get('machine_id', 'unknown')}:{int(time.time())}"
-            record = TelemetryRecordV3(**data)
-            records = [record]
+            data = read_json(req, max_body_bytes())
+            if not data:
+                cloud_metrics.counter("cloud.ingest.rejected_count", 1, labels={"reason": "no_json"})
+                return https_fn.Response('No JSON provided', status=400)
+            if "records" in data and "gateway_id" in data:
+                chunks = iter([TelemetryBatch(**data).records])
+            else:
+                # Wrap single record into a list for consistent processing
+                chunks = iter([[_single(data)]])
+
+        first = next(chunks, None)
+        if first is None:
+            cloud_metrics.counter("cloud.ingest.rejected_count", 1, labels={"reason": "no_json"})
+            return https_fn.Response('No JSON provided', status=400)
 
-        cloud_metrics.counter("cloud.ingest.accepted_count", len(records))
-        
         # 2. Idempotency & Routing & Hot-Path Publishing
-        ingested_ids = []
-        import asyncio
-        import os
-        
-        # Cold Path: BigQuery Insert
-        bq = get_bq_client()
-        dataset = os.environ.get("BQ_DATASET", "simco_telemetry")
-        table = f"{dataset}.raw_telemetry"
-        
-        # Transform for BQ (flatten or use JSON column)
-        # Transform for BQ (flatten or use JSON column)
-        # Explicit BQ Schema Fields to avoid "no such field" errors (e.g. driver)
-        BQ_FIELDS = {"record_id", "tenant_id", "site_id", "machine_id", "device_id", 
-                     "timestamp", "status", "metrics", "ip", "vendor"}
-        
-        rows_to_insert = []
-        row_ids = []
-        for r in records:
-            d = r.model_dump(mode='json')
-            # Filter keys
-            row = {k: v for k, v in d.items() if k in BQ_FIELDS}
-            
-            # Serialize metrics for BQ JSON type compatibility
-            if isinstance(row.get("metrics"), dict):
-                row["metrics"] = json.dumps(row["metrics"])
-            
-            rows_to_insert.append(row)
-            # PR11: Deduplication via InsertID
-            # record_id is deterministic {device_id}:{sqlite_id} set by Agent
-            row_ids.append(r.record_id)
-        
-        # In PROD: Use Storage Write API for high throughput.
-        # Here: Streaming API with deduplication
-        errors = bq.insert_rows_json(table, rows_to_insert, row_ids=row_ids)
-        if errors:
-            logger.error(f"BQ Insert Errors: {errors}")
-            # We might still want to proceed to Hot Path, or partial fail?
-            # For strict warehouse, this is an issue.
-            
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-
-        for record in records:
-            # Hot Path: Publish to Processing Bus (Expansion Task 1)
-            record_data = record.model_dump()
-            
-            # Serialize metrics for BQ if needed (JSON column quirk)
-            if isinstance(record_data.get("metrics"), dict):
-                record_data["metrics"] = json.dumps(record_data["metrics"])
-            
-            # For Unified Dev Router optimization: ensure processing runs now
-            task = processor.process_record(record_data)
-            if loop.is_running():
-                 loop.create_task(task)
+        # A retried batch (same X-Idempotency-Key) skips everything; already-ingested
+        # record_ids are dropped in _ingest_records.
+        dedup = get_idempotency_cache()
+        idem_key = req.headers.get("X-Idempotency-Key")
+        tenant_scope = first[0].tenant_id if first else "unknown"
+        batch_key = f"batch:{tenant_scope}:{idem_key}" if idem_key else None
+        if batch_key and dedup.seen([batch_key]):
+            cloud_metrics.counter("cloud.ingest.dedup_hit_count", 1, labels={"level": "batch"})
+            cloud_metrics.gauge("cloud.ingest.dedup_hit_rate", dedup.stats()["hit_rate"])
+            return https_fn.Response(
+                json.dumps({"status": "SUCCESS", "records_ingested": 0, "duplicate": True}),
+                status=200,
+                mimetype="application/json"
+            )
+
+        asynchronous = os.environ.get("INGEST_MODE", "sync") == "async"
+        message_ids = []
+        all_landed = True
+        for records in itertools.chain([first], chunks):
+            cloud_metrics.counter("cloud.ingest.accepted_count", len(records))
+            accepted += len(records)
+            # Dump once; the queue, the hot path and the warehouse row share it
+            dumped = [r.model_dump(mode='json') for r in records]
+
+            if asynchronous:
+                # Accept-then-flush: durably enqueue; drain_ingest_queue does the rest
+                enq_start = time.time()
+                message_ids.append(get_ingest_queue().enqueue({"records": dumped}))
+                cloud_metrics.histogram("cloud.ingest.enqueue_latency_ms", (time.time() - enq_start) * 1000)
             else:
-                 loop.run_until_complete(task)
-            
-            ingested_ids.append(record.record_id)
-            
+                n, errors = _ingest_records(dumped)
+                ingested += n
+                all_landed = all_landed and not errors
+
+        if batch_key and all_landed:
+            dedup.mark([batch_key])
+        if ingested:
+            _settle_hot_path()
+
         latency = (time.time() - start_time) * 1000
         cloud_metrics.histogram("cloud.ingest.latency_ms", latency)
-        
+
+        if asynchronous:
+            return https_fn.Response(
+                json.dumps({"status": "ACCEPTED", "records_accepted": accepted,
+                            "message_id": message_ids[0] if len(message_ids) == 1 else message_ids}),
+                status=202,
+                mimetype="application/json"
+            )
         return https_fn.Response(
-            json.dumps({"status": "SUCCESS", "records_ingested": len(records)}),
+            json.dumps({"status": "SUCCESS", "records_ingested": ingested}),
             status=200,
             mimetype="application/json"
         )
+    except PayloadTooLarge as e:
+        # Chunks forwarded before the limit stay ingested; record dedup drops them on retry
+        cloud_metrics.counter("cloud.ingest.rejected_count", 1, labels={"reason": "too_large"})
+        return https_fn.Response(json.dumps({"status": "ERROR", "message": str(e), "records_ingested": ingested}),
+                                 status=413, mimetype="application/json")
     except Exception as e:
         logger.error(f"Telemetry ingestion error: {e}")
-        from simco_agent.observability.metrics import cloud_metrics
         cloud_metrics.counter("cloud.ingest.rejected_count", 1, labels={"reason": "exception"})
-        return https_fn.Response(json.dumps({"status": "ERROR", "message": str(e)}), status=400, mimetype="application/json")
+        return https_fn.Response(json.dumps({"status": "ERROR", "message": str(e), "records_ingested": ingested}),
+                                 status=400, mimetype="application/json")
+
+@scheduler_fn.on_schedule(schedule="every 1 minutes")
+def drain_ingest_queue(event) -> None:
+    """Consumer for INGEST_MODE=async: drains accepted telemetry into BigQuery and the hot path in large batches."""
+    from cloud.processing.ingest_queue import IngestConsumer
+    consumer = IngestConsumer(get_ingest_queue(), handler=_ingest_records,
+                              max_attempts=int(os.environ.get("INGEST_MAX_ATTEMPTS", "5")))
+    drained = consumer.drain(time_budget_sec=float(os.environ.get("INGEST_DRAIN_BUDGET_SEC", "50")))
+    _settle_hot_path()
+    logger.info(f"drain_ingest_queue: {drained} records")
+
+@scheduler_fn.on_schedule(schedule="every 15 minutes")
+def rollup_machine_stats(event) -> None:
+    """MERGEs newly arrived hours of raw_telemetry into hourly_machine_stats / daily_machine_stats."""
+    from cloud.processing.stats_rollup import build_stats_rollup
+    project_id, dataset = _equation_target()
+    build_stats_rollup(get_bq_client(), project_id, dataset).run()
 
 @https_fn.on_request()
 @cors_enabled
 def ingest_events(req: https_fn.Request) -> https_fn.Response:
     """Ingest Events to BigQuery + Hot Path."""
+    from ingest_api.decoding import PayloadTooLarge, chunk_rows, chunked, iter_items, max_body_bytes
     if req.method != 'POST': return https_fn.Response('POST only', status=405)
     
-    # Needs Schema for Batch? Or single? Let's assume Batch for consistency
-    # For now, simple list of records
-    data = req.get_json()
-    if not isinstance(data, list):
-         data = [data]
-         
-    bq = get_bq_client()
-    dataset = os.environ.get("BQ_DATASET", "simco_telemetry")
-    table = f"{dataset}.raw_events"
+    # JSON list / single record, or NDJSON (gzip-aware), forwarded in chunks as parsed
+    count = duplicates = 0
+    try:
+        for chunk in chunked(iter_items(req, max_body_bytes()), chunk_rows()):
+            ingested, skipped, errors = _ingest_event_batch(chunk)
+            count += ingested
+            duplicates += skipped
+            if errors:
+                return https_fn.Response(json.dumps({"status": "PARTIAL_ERROR", "errors": errors, "count": count}), status=500)
+    except PayloadTooLarge as e:
+        return https_fn.Response(json.dumps({"status": "ERROR", "message": str(e), "count": count}), status=413, mimetype="application/json")
+    except ValueError as e:
+        # Includes pydantic ValidationError
+        from simco_agent.observability.metrics import cloud_metrics
+        cloud_metrics.counter("cloud.events.rejected_count", 1, labels={"reason": "invalid"})
+        return https_fn.Response(json.dumps({"status": "ERROR", "message": str(e), "count": count}), status=400, mimetype="application/json")
     
-    # Flatten/Validate
+    if count:
+        _settle_hot_path()
+    return https_fn.Response(json.dumps({"status": "SUCCESS", "count": count, "duplicates": duplicates}), mimetype="application/json")
+
+def _ingest_event_batch(items: List[dict]) -> Tuple[int, int, List[dict]]:
+    """
+    Validates a batch of edge events against EventRecord, drops duplicates by
+    event_id, appends the rest to raw_events in one write and feeds them to the
+    StreamProcessor event store / notifications. Returns (ingested, duplicates, sink errors).
+    """
+    import time
+    from simco_agent.observability.metrics import cloud_metrics
+
+    # 1. Validate (one pass through the cached adapter)
+    stage = time.time()
+    events = [e.model_dump(mode='json') for e in get_event_validator().validate_python(items)]
+    cloud_metrics.histogram("cloud.events.validate_latency_ms", (time.time() - stage) * 1000)
+    cloud_metrics.counter("cloud.events.accepted_count", len(events))
+
+    # 2. Dedupe by event_id, within the batch and against earlier requests
+    stage = time.time()
+    unique = {}
+    for e in events:
+        unique.setdefault(f"event:{e['tenant_id']}:{e['event_id']}", e)
+    dedup = get_idempotency_cache()
+    already = dedup.seen(list(unique))
+    keys = [k for k in unique if k not in already]
+    events = [unique[k] for k in keys]
+    duplicates = len(items) - len(events)
+    cloud_metrics.histogram("cloud.events.dedup_latency_ms", (time.time() - stage) * 1000)
+    if duplicates:
+        cloud_metrics.counter("cloud.events.duplicate_count", duplicates)
+    if not events:
+        return 0, duplicates, []
+
+    # 3. Cold Path: one append for the batch
+    stage = time.time()
     rows = []
-    # TODO: Validate with EventRecord schema
-    rows = data # naive pass-through for MVP, ideally use schemas_v3.EventRecord
-    
-    errors = bq.insert_rows_json(table, rows)
+    for e in events:
+        row = {k: e.get(k) for k in RAW_EVENT_FIELDS}
+        # Serialize details for BQ JSON type compatibility
+        row["details"] = json.dumps(row["details"])
+        rows.append(row)
+    errors = get_event_sink().write(rows, row_ids=[e["event_id"] for e in events])
+    cloud_metrics.histogram("cloud.events.bq_append_latency_ms", (time.time() - stage) * 1000)
     if errors:
         logger.error(f"Event BQ Insert Failed: {errors}")
-        return https_fn.Response(json.dumps({"status": "PARTIAL_ERROR", "errors": errors}), status=500)
-        
-    # Hot Path for Events (Alerts)
-    # ... processor.process_event(...)
-    
-    return https_fn.Response(json.dumps({"status": "SUCCESS", "count": len(rows)}), mimetype="application/json")
+
+    # 4. Hot Path: event store + notifications
+    stage = time.time()
+    _run_hot_path(get_processor().ingest_events(events))
+    cloud_metrics.histogram("cloud.events.hot_path_latency_ms", (time.time() - stage) * 1000)
+
+    failed = {e.get("index") for e in errors}
+    dedup.mark([k for i, k in enumerate(keys) if i not in failed])
+    return len(events) - len(failed), duplicates, errors
 
 @https_fn.on_request()
 @cors_enabled
 def ingest_assets(req: https_fn.Request) -> https_fn.Response:
     """Ingest Asset metadata updates."""
+    from ingest_api.decoding import PayloadTooLarge, chunk_rows, chunked, iter_items, max_body_bytes
     if req.method != 'POST': return https_fn.Response('POST only', status=405)
-    data = req.get_json()
     
     bq = get_bq_client()
     dataset = os.environ.get("BQ_DATASET", "simco_telemetry")
     table = f"{dataset}.assets_current"
     # Filter fields for assets_current schema
     ALLOWED_FIELDS = {"machine_id", "tenant_id", "site_id", "ip", "vendor", "last_seen"}
-    if isinstance(data, list):
-        rows = [{k: v for k, v in row.items() if k in ALLOWED_FIELDS} for row in data]
-    else:
-        rows = [{k: v for k, v in data.items() if k in ALLOWED_FIELDS}]
 
-    errors = bq.insert_rows_json(table, rows)
-    if errors:
-        logger.error(f"Asset BQ Insert Failed: {errors}")
-        return https_fn.Response(json.dumps({"status": "ERROR", "errors": errors}), status=500, mimetype="application/json")
+    try:
+        for chunk in chunked(iter_items(req, max_body_bytes()), chunk_rows()):
+            rows = [{k: v for k, v in row.items() if k in ALLOWED_FIELDS} for row in chunk]
+            errors = bq.insert_rows_json(table, rows)
+            if errors:
+                logger.error(f"Asset BQ Insert Failed: {errors}")
+                return https_fn.Response(json.dumps({"status": "ERROR", "errors": errors}), status=500, mimetype="application/json")
+    except PayloadTooLarge as e:
+        return https_fn.Response(json.dumps({"status": "ERROR", "message": str(e)}), status=413, mimetype="application/json")
+    except ValueError as e:
+        return https_fn.Response(json.dumps({"status": "ERROR", "message": str(e)}), status=400, mimetype="application/json")
     
     return https_fn.Response(json.dumps({"status": "SUCCESS"}), mimetype="application/json")
 
@@ -263,6 +520,10 @@ def heartbeat(req: https_fn.Request) -> https_fn.Response:
     if not device_id:
         return https_fn.Response(json.dumps({"error": "Missing device_id"}), status=400, mimetype="application/json")
     
+    from cloud.processing.fleet_index import fleet_index
+    fleet_index.observe_heartbeat(device_id, tenant_id=data.get("tenant_id"), buffer_depth=data.get("buffer_depth"),
+                                  agent_version=data.get("agent_version"))
+
     # Audit check: Device reporting healthy/unhealthy
     if data.get("buffer_depth", 0) > 1000:
         log_audit_event(device_id, "DEVICE_UNHEALTHY", {"reason": "buffer_overflow", "depth": data["buffer_depth"]})
@@ -296,10 +557,6 @@ def manual_enroll(req: https_fn.Request) -> https_fn.Response:
         "message": f"Machine {machine_ip} added to pending enrollment list. Edge will sync shortly."
     }), mimetype="application/json")
 
-# Simple in-memory cache for ERP data (per instance)
-_erp_cache = {} # (tenant_id, site_id) -> (timestamp, data)
-ERP_CACHE_TTL = 30 
-
 # --- Pairing & Mobile APIs (PR12) ---
 # Migrated to Firestore for persistence across instances
 
@@ -315,7 +572,7 @@ def pair_init(req: https_fn.Request) -> https_fn.Response:
         code = ''.join(random.choices(string.digits, k=6))
         
         # Store in Firestore
-        db = firestore.client()
+        db = get_firestore_client()
         now = datetime.utcnow()
         db.collection("pairing_codes").document(code).set({
             "device_fp": device_fp,
@@ -346,7 +603,7 @@ def pair_confirm(req: https_fn.Request) -> https_fn.Response:
     tenant_id = data.get("tenant_id") or user_claims.get("tenant_id")
     site_id = data.get("site_id") or user_claims.get("site_id")
     
-    db = firestore.client()
+    db = get_firestore_client()
     doc_ref = db.collection("pairing_codes").document(code)
     doc = doc_ref.get()
     
@@ -381,7 +638,7 @@ def pair_token(req: https_fn.Request) -> https_fn.Response:
     data = req.get_json() or {}
     code = data.get("code")
     
-    db = firestore.client()
+    db = get_firestore_client()
     doc = db.collection("pairing_codes").document(code).get()
     
     if not doc.exists:
@@ -420,7 +677,16 @@ def resolve_mobile_context(req: https_fn.Request) -> https_fn.Response:
         decoded = base64.urlsafe_b64decode(token + "==").decode()
         machine_id = decoded
         
-        # Look up machine to find tenant/site
+        # Look up machine to find tenant/site: latest-state store, then assets_current
+        latest = get_machine_latest().find(machine_id)
+        if latest:
+            return https_fn.Response(json.dumps({
+                "machine_id": machine_id,
+                "tenant_id": latest["tenant_id"],
+                "site_id": latest["site_id"],
+                "vendor": latest.get("vendor")
+            }), mimetype="application/json")
+
         bq = get_bq_client()
         dataset = os.environ.get("BQ_DATASET", "simco_telemetry")
         query = f"""
@@ -432,7 +698,7 @@ def resolve_mobile_context(req: https_fn.Request) -> https_fn.Response:
         job_config = bigquery.QueryJobConfig(
             query_parameters=[bigquery.ScalarQueryParameter("mid", "STRING", machine_id)]
         )
-        results = list(bq.query(query, job_config=job_config).result())
+        results = get_query_cache().query(bq, query, job_config, query_class="assets")
         
         if not results:
              # Fallback for demo
@@ -460,7 +726,24 @@ def resolve_mobile_context(req: https_fn.Request) -> https_fn.Response:
 
 
 # --- Big Screen Summary Implementation ---
+# Per-instance serialized summaries: (tenant_id, site_id) -> {version, expires_at, etag, body}
+_bigscreen_snapshots = {}
+BIGSCREEN_FALLBACK_TTL = 30  # summaries built from the BigQuery fallback
+
+def _etag_matches(req: https_fn.Request, etag: str) -> bool:
+    header = req.headers.get("If-None-Match") or ""
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
 def _bigscreen_summary(req: https_fn.Request, tenant_id: str, site_id: str):
+    """
+    Serves the wallboard summary from a per-site snapshot. The snapshot is
+    rebuilt only when the site's processor version changes (a record or
+    event for the site arrived) or its ERP / fallback data expired, and is
+    serialized once. Polls with a matching If-None-Match get 304.
+    """
+    import time
+    import hashlib
     from simco_agent.observability.metrics import cloud_metrics
     cloud_metrics.counter("cloud.portal.bigscreen_summary_request_count", 1, labels={"tenant_id": tenant_id})
     
@@ -470,61 +753,82 @@ def _bigscreen_summary(req: https_fn.Request, tenant_id: str, site_id: str):
     if not allowed:
         return https_fn.Response(json.dumps({"error": error}), status=403, mimetype="application/json")
 
+    processor = get_processor()
+    key = (tenant_id, site_id)
+    # Read before building: a change during the build triggers the next rebuild
+    version = processor.site_version(tenant_id, site_id)
+    now = time.monotonic()
+    snapshot = _bigscreen_snapshots.get(key)
+    if snapshot is None or snapshot["version"] != version or now >= snapshot["expires_at"]:
+        build_start = time.monotonic()
+        payload, ttl = _build_bigscreen_summary(tenant_id, site_id, processor)
+        content = {k: v for k, v in payload.items() if k != "generated_at"}
+        etag = '"' + hashlib.sha1(json.dumps(content, default=str, sort_keys=True).encode()).hexdigest() + '"'
+        if snapshot is None or snapshot["etag"] != etag:
+            snapshot = {"etag": etag, "body": json.dumps(payload, default=str)}
+        snapshot.update(version=version, expires_at=now + ttl)
+        _bigscreen_snapshots[key] = snapshot
+        cloud_metrics.counter("cloud.portal.bigscreen_snapshot_rebuild_count", 1, labels={"tenant_id": tenant_id})
+        cloud_metrics.histogram("cloud.portal.bigscreen_snapshot_build_ms", (time.monotonic() - build_start) * 1000)
+    else:
+        cloud_metrics.counter("cloud.portal.bigscreen_snapshot_hit_count", 1, labels={"tenant_id": tenant_id})
+
+    headers = {"ETag": snapshot["etag"], "Cache-Control": "no-cache"}
+    if _etag_matches(req, snapshot["etag"]):
+        cloud_metrics.counter("cloud.portal.bigscreen_not_modified_count", 1, labels={"tenant_id": tenant_id})
+        return https_fn.Response(status=304, headers=headers)
+    return https_fn.Response(snapshot["body"], mimetype="application/json", headers=headers)
+
+def _build_bigscreen_summary(tenant_id: str, site_id: str, processor) -> Tuple[dict, float]:
+    """Builds the summary payload. Returns (payload, seconds it stays valid without a state change)."""
+    ttl = float("inf")
+
     # 1. ERP Orders (from BigQuery view site_orders_now)
     orders = []
     if os.environ.get("SIMCO_BIGSCREEN_ERP_ENABLED") == "1" or os.environ.get("DEV_MODE") == "1" or tenant_id == "tenant_demo":
-        now = datetime.utcnow()
-        cache_key = (tenant_id, site_id)
-        if cache_key in _erp_cache:
-            ts, cached_orders = _erp_cache[cache_key]
-            if (now - ts).total_seconds() < ERP_CACHE_TTL:
-                orders = cached_orders
-        
-        if not orders:
-            try:
-                bq = get_bq_client()
-                dataset = os.environ.get("BQ_DATASET", "simco_telemetry")
-                query = f"""
-                    SELECT * FROM `{dataset}.site_orders_now`
-                    WHERE tenant_id = @tenant_id AND site_id = @site_id
-                """
-                job_config = bigquery.QueryJobConfig(
-                    query_parameters=[
-                        bigquery.ScalarQueryParameter("tenant_id", "STRING", tenant_id),
-                        bigquery.ScalarQueryParameter("site_id", "STRING", site_id)
-                    ]
-                )
-                results = bq.query(query, job_config=job_config).result()
-                orders = [dict(row) for row in results]
-                _erp_cache[cache_key] = (now, orders)
-            except Exception as e:
-                logger.error(f"Error fetching ERP orders for BigScreen: {e}")
-                orders = []
-
-    # 2. Fleet Status (Merge Processor with BigQuery fallback)
-    fleet_counts = {"total": 0, "running": 0, "idle": 0, "alarm": 0, "offline": 0}
+        ttl = get_query_cache().ttl_for("erp")
+        try:
+            bq = get_bq_client()
+            dataset = os.environ.get("BQ_DATASET", "simco_telemetry")
+            query = f"""
+                SELECT * FROM `{dataset}.site_orders_now`
+                WHERE tenant_id = @tenant_id AND site_id = @site_id
+            """
+            job_config = bigquery.QueryJobConfig(
+                query_parameters=[
+                    bigquery.ScalarQueryParameter("tenant_id", "STRING", tenant_id),
+                    bigquery.ScalarQueryParameter("site_id", "STRING", site_id)
+                ]
+            )
+            results = get_query_cache().query(bq, query, job_config, query_class="erp")
+            orders = [dict(row) for row in results]
+        except Exception as e:
+            logger.error(f"Error fetching ERP orders for BigScreen: {e}")
+            orders = []
+
+    # 2. Fleet Status (Processor site index with BigQuery fallback)
+    from cloud.processing.site_index import empty_fleet, fleet_bucket
     machines_out = []
 
     # Map orders to machines for easy lookup
     machine_erp = {o["machine_id"]: o for o in orders if o.get("machine_id")}
 
-    # Get machines from processor
-    processor_machines = {}
-    for key, st in processor.state_store.items():
-        try:
-            tid, sid, mid = key.split(":", 2)
-            if tid == tenant_id and (not site_id or sid == site_id):
-                processor_machines[mid] = st
-        except: continue
+    # Machines, precomputed fleet counts and newest alerts, indexed by (tenant, site)
+    view = processor.site_view(tenant_id, site_id, 20)
+    processor_machines = view["machines"]
+    fleet_counts = view["fleet"]
 
     # If processor is empty (stateless restart), fetch machine list from assets_current
     if not processor_machines:
+        ttl = min(ttl, BIGSCREEN_FALLBACK_TTL)
         try:
             bq = get_bq_client()
             dataset = os.environ.get("BQ_DATASET", "simco_telemetry")
             # Fetch latest telemetry for each machine to get real status/metrics
+            from cloud.processing.telemetry_sql import METRICS_SELECT
+            from simco_common.signals import merge_metrics
             query = f"""
-                SELECT machine_id, status, metrics, timestamp
+                SELECT machine_id, status, {METRICS_SELECT}, timestamp
                 FROM `{dataset}.raw_telemetry`
                 WHERE tenant_id = @tid AND (@sid IS NULL OR site_id = @sid)
                 QUALIFY ROW_NUMBER() OVER (PARTITION BY machine_id ORDER BY timestamp DESC) = 1
@@ -535,9 +839,10 @@ def _bigscreen_summary(req: https_fn.Request, tenant_id: str, site_id: str):
                     bigquery.ScalarQueryParameter("sid", "STRING", site_id)
                 ]
             )
-            for row in bq.query(query, job_config=job_config):
+            fleet_counts = empty_fleet()
+            for row in get_query_cache().query(bq, query, job_config, query_class="fleet"):
                 mid = row.machine_id
-                metrics = json.loads(row.metrics) if isinstance(row.metrics, str) else row.metrics
+                metrics = merge_metrics(row)
                 processor_machines[mid] = {
                     "machine_id": mid,
                     "display_name": mid,
@@ -545,44 +850,33 @@ def _bigscreen_summary(req: https_fn.Request, tenant_id: str, site_id: str):
                     "timestamp": row.timestamp,
                     "metrics": metrics
                 }
+                fleet_counts["total"] += 1
+                fleet_counts[fleet_bucket(row.status)] += 1
         except Exception as e:
             logger.error(f"Error fetching raw_telemetry for fallback: {e}")
 
     # Build final list
     for mid, st in processor_machines.items():
-        status = (st.get("status") or "OFFLINE").upper()
-        fleet_counts["total"] += 1
-        if status in ("RUNNING", "ACTIVE"): fleet_counts["running"] += 1
-        elif status == "IDLE": fleet_counts["idle"] += 1
-        elif status in ("ALARM", "FAULT"): fleet_counts["alarm"] += 1
-        else: fleet_counts["offline"] += 1
-
         machines_out.append({
             "machine_id": mid,
             "display_name": st.get("display_name") or mid,
-            "status": status,
+            "status": (st.get("status") or "OFFLINE").upper(),
             "last_seen": st.get("timestamp"),
             "metrics": st.get("metrics") or {},
             "erp": machine_erp.get(mid),
         })
 
-    # 3. Alerts (Processor + BigQuery fallback)
-    alerts = []
-    for key, ev_list in processor.event_store.items():
-        try:
-            tid, sid, mid = key.split(":", 2)
-            if tid == tenant_id and (not site_id or sid == site_id):
-                for ev in ev_list:
-                    alerts.append({
-                        "severity": ev.get("severity", "LOW"),
-                        "machine_id": mid,
-                        "type": ev.get("event_type"),
-                        "message": ev.get("message"),
-                        "ts": ev.get("timestamp"),
-                    })
-        except: continue
+    # 3. Alerts (Processor top-N + BigQuery fallback), newest first
+    alerts = [{
+        "severity": ev.get("severity", "LOW"),
+        "machine_id": ev.get("machine_id"),
+        "type": ev.get("event_type"),
+        "message": ev.get("message"),
+        "ts": ev.get("timestamp"),
+    } for ev in view["alerts"]]
 
     if not alerts:
+        ttl = min(ttl, BIGSCREEN_FALLBACK_TTL)
         try:
             bq = get_bq_client()
             dataset = os.environ.get("BQ_DATASET", "simco_telemetry")
@@ -598,7 +892,7 @@ def _bigscreen_summary(req: https_fn.Request, tenant_id: str, site_id: str):
                     bigquery.ScalarQueryParameter("sid", "STRING", site_id)
                 ]
             )
-            for row in bq.query(query, job_config=job_config):
+            for row in get_query_cache().query(bq, query, job_config, query_class="events"):
                 details = json.loads(row.details) if isinstance(row.details, str) else row.details
                 alerts.append({
                     "severity": row.severity,
@@ -609,10 +903,8 @@ def _bigscreen_summary(req: https_fn.Request, tenant_id: str, site_id: str):
                 })
         except Exception as e:
             logger.error(f"Error fetching alerts fallback: {e}")
-            
-    alerts = sorted(alerts, key=lambda a: a.get("ts") or "", reverse=True)[:20]
 
-    return https_fn.Response(json.dumps({
+    return {
         "generated_at": datetime.now(timezone.utc).isoformat(),
         "tenant_id": tenant_id,
         "site_id": site_id,
@@ -620,7 +912,7 @@ def _bigscreen_summary(req: https_fn.Request, tenant_id: str, site_id: str):
         "machines": machines_out,
         "alerts": alerts,
         "orders": orders,
-    }, default=str), mimetype="application/json")
+    }, ttl
 
 # --- v1 UI API (Task 8) ---
 
@@ -680,7 +972,7 @@ def check_rbac(req: https_fn.Request, tenant_id: str, site_id: Optional[str] = N
             
         # PRODUCTION: Verify token against Firestore
         try:
-            db = firestore.client()
+            db = get_firestore_client()
             # Perform a query or lookup. Since token is stored in the document, we might need a query
             # or we could have stored token->doc mapping.
             # Current schema: pairing_codes collection has 'token' field.
@@ -790,7 +1082,7 @@ def portal_api(req: https_fn.Request) -> https_fn.Response:
         job_config = bigquery.QueryJobConfig(
             query_parameters=[bigquery.ScalarQueryParameter("tenant_id", "STRING", tenant_id)]
         )
-        results = bq.query(query, job_config=job_config).result()
+        results = get_query_cache().query(bq, query, job_config, query_class="assets")
         
         sites = [
             {"site_id": row.site_id, "name": row.site_id.capitalize(), "machine_count": row.machine_count}
@@ -821,7 +1113,7 @@ def portal_api(req: https_fn.Request) -> https_fn.Response:
                 bigquery.ScalarQueryParameter("site_id", "STRING", site_id)
             ]
         )
-        results = bq.query(query, job_config=job_config).result()
+        results = get_query_cache().query(bq, query, job_config, query_class="assets")
         
         machines = []
         for row in results:
@@ -840,9 +1132,22 @@ def portal_api(req: https_fn.Request) -> https_fn.Response:
                 idx = parts.index("machines")
                 machine_id = parts[idx+1]
                 
+                # Latest-state store first; raw_telemetry only for machines it has not seen
+                latest = get_machine_latest().get(tenant_id, machine_id)
+                if latest:
+                    state = {
+                        "machine_id": machine_id,
+                        "status": latest.get("status"),
+                        "timestamp": latest.get("timestamp"),
+                        "metrics": latest.get("metrics")
+                    }
+                    return https_fn.Response(json.dumps(state, default=str), mimetype="application/json")
+
                 # Fetch latest telemetry for this machine
+                from cloud.processing.telemetry_sql import METRICS_SELECT
+                from simco_common.signals import merge_metrics
                 query = f"""
-                    SELECT metrics, status, timestamp 
+                    SELECT {METRICS_SELECT}, status, timestamp 
                     FROM `{dataset}.raw_telemetry`
                     WHERE tenant_id = @tenant_id AND machine_id = @machine_id
                     ORDER BY timestamp DESC
@@ -854,14 +1159,14 @@ def portal_api(req: https_fn.Request) -> https_fn.Response:
                         bigquery.ScalarQueryParameter("machine_id", "STRING", machine_id)
                     ]
                 )
-                results = list(bq.query(query, job_config=job_config).result())
+                results = get_query_cache().query(bq, query, job_config, query_class="fleet")
                 if results:
                     row = results[0]
                     state = {
                         "machine_id": machine_id,
                         "status": row.status,
                         "timestamp": row.timestamp,
-                        "metrics": json.loads(row.metrics) if isinstance(row.metrics, str) else row.metrics
+                        "metrics": merge_metrics(row)
                     }
                     return https_fn.Response(json.dumps(state), mimetype="application/json")
                 return https_fn.Response(json.dumps({"error": "Machine not found"}), status=404, mimetype="application/json")
@@ -883,7 +1188,7 @@ def portal_api(req: https_fn.Request) -> https_fn.Response:
                 bigquery.ScalarQueryParameter("site_id", "STRING", site_id)
             ]
         )
-        results = bq.query(query, job_config=job_config).result()
+        results = get_query_cache().query(bq, query, job_config, query_class="events")
         events = [
             {
                 "event_id": row.event_id,
@@ -897,16 +1202,46 @@ def portal_api(req: https_fn.Request) -> https_fn.Response:
         return https_fn.Response(json.dumps(events), mimetype="application/json")
 
     if path.endswith("/health/fleet"):
-        # Real-time Ops View - Heavy query warning
-        query = f"""
-            SELECT machine_id, status, MAX(timestamp) as last_seen
-            FROM `{dataset}.raw_telemetry`
-            WHERE tenant_id = @tenant_id
-            GROUP BY machine_id, status
-        """
-        # Simplified for responsiveness
-        # ...
-        return https_fn.Response(json.dumps([]), mimetype="application/json")
+        # Real-time Ops View from the incremental fleet index (cloud/processing/fleet_index.py)
+        from cloud.processing.fleet_index import fleet_index
+        # Ingest and heartbeats run in other functions: re-seed from a shared source once the seed is older than the TTL
+        seed_age = fleet_index.seed_age(tenant_id)
+        if seed_age is None or seed_age > float(os.environ.get("FLEET_SEED_TTL_SEC", "30")):
+            rows = get_machine_latest().list_tenant(tenant_id)
+            if rows is None:
+                # No shared latest-state store: latest record per machine of the last day
+                query = f"""
+                    SELECT machine_id, site_id, device_id, status, timestamp
+                    FROM `{dataset}.raw_telemetry`
+                    WHERE tenant_id = @tenant_id
+                      AND timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL @hours HOUR)
+                    QUALIFY ROW_NUMBER() OVER (PARTITION BY machine_id ORDER BY timestamp DESC) = 1
+                """
+                job_config = bigquery.QueryJobConfig(
+                    query_parameters=[
+                        bigquery.ScalarQueryParameter("tenant_id", "STRING", tenant_id),
+                        bigquery.ScalarQueryParameter("hours", "INT64", int(os.environ.get("FLEET_SEED_HOURS", "24")))
+                    ]
+                )
+                try:
+                    rows = [dict(row) for row in get_query_cache().query(bq, query, job_config, query_class="fleet")]
+                except Exception as e:
+                    logger.error(f"Fleet health seed failed: {e}")
+            if rows is not None:
+                fleet_index.seed(tenant_id, rows)
+
+        try:
+            stale_minutes = req.args.get("stale_minutes")
+            health = fleet_index.health(
+                tenant_id,
+                site_id=req.args.get("site_id") or site_id,
+                status=req.args.get("status"),
+                stale_after_sec=float(stale_minutes) * 60 if stale_minutes else None,
+                stale_only=bool(stale_minutes),
+            )
+        except ValueError:
+            return https_fn.Response(json.dumps({"error": "stale_minutes must be a number"}), status=400, mimetype="application/json")
+        return https_fn.Response(json.dumps(health, default=str), mimetype="application/json")
 
     if "/deletion_requests" in path:
         if req.method != 'POST': return https_fn.Response('POST only', status=405)
@@ -931,10 +1266,11 @@ def portal_api(req: https_fn.Request) -> https_fn.Response:
 def debug_api(req: https_fn.Request) -> https_fn.Response:
     """Expansion Task 1: Debugging hot-path state."""
     path = req.path
+    processor = get_processor()
     if path.endswith("/debug/events"):
-        return https_fn.Response(json.dumps(list(processor.event_ids)), mimetype="application/json")
+        return https_fn.Response(json.dumps(processor.seen_event_ids()), mimetype="application/json")
     if path.endswith("/debug/state"):
-        return https_fn.Response(json.dumps(processor.state_store), mimetype="application/json")
+        return https_fn.Response(json.dumps(processor.machine_states()), mimetype="application/json")
     return https_fn.Response("Not Found", status=404)
 
 @https_fn.on_request()
@@ -1043,8 +1379,10 @@ def get_mobile_context(req: https_fn.Request) -> https_fn.Response:
     dataset = os.environ.get("BQ_DATASET", "simco_telemetry")
     
     # 1. Get Latest Telemetry
+    from cloud.processing.telemetry_sql import METRICS_SELECT
+    from simco_common.signals import merge_metrics
     tel_query = f"""
-        SELECT status, metrics, timestamp, ip 
+        SELECT status, {METRICS_SELECT}, timestamp, ip 
         FROM `{bq.project}.{dataset}.raw_telemetry`
         WHERE machine_id = @machine_id
         ORDER BY timestamp DESC LIMIT 1
@@ -1062,29 +1400,33 @@ def get_mobile_context(req: https_fn.Request) -> https_fn.Response:
         ]
     )
     
+    # 1. Latest telemetry: latest-state store (point lookup), raw_telemetry only if it has not seen the machine
     tel_row = {}
-    try:
-        res = list(bq.query(tel_query, job_config=job_config))
-        if res:
-            r = res[0]
-            # Handle JSON string in metrics
-            met = r.metrics
-            if isinstance(met, str):
-                try: met = json.loads(met)
-                except: pass
-            
-            tel_row = {
-                "status": r.status,
-                "last_seen": r.timestamp,
-                "ip": r.ip,
-                "metrics": met
-            }
-    except Exception as e:
-        logger.error(f"Tel Query Error: {e}")
+    latest = get_machine_latest().find(machine_id)
+    if latest:
+        tel_row = {
+            "status": latest.get("status"),
+            "last_seen": latest.get("timestamp"),
+            "ip": latest.get("ip"),
+            "metrics": latest.get("metrics")
+        }
+    else:
+        try:
+            res = get_query_cache().query(bq, tel_query, job_config, query_class="context")
+            if res:
+                r = res[0]
+                tel_row = {
+                    "status": r.status,
+                    "last_seen": r.timestamp,
+                    "ip": r.ip,
+                    "metrics": merge_metrics(r)
+                }
+        except Exception as e:
+            logger.error(f"Tel Query Error: {e}")
 
     erp_rows = []
     try:
-        res = list(bq.query(erp_query))
+        res = get_query_cache().query(bq, erp_query, query_class="erp")
         logger.info(f"DEBUG: ERP Rows Found: {len(res)}")
         for r in res:
             erp_rows.append({
@@ -1124,19 +1466,20 @@ from typing import Any, Dict, List, Tuple, Set
 # - bigquery already used elsewhere in this file
 # - PROJECT_ID and BQ_DATASET are used for ingestion; we reuse them for queries
 
+# "local" is the same aggregate over the hourly rollup used by the local evaluator (functions/equation_engine.py)
 EQUATION_VARS: Dict[str, Dict[str, str]] = {
-    # --- Telemetry aggregates (raw_telemetry.metrics is JSON) ---
-    "telemetry_samples": {"src": "telemetry", "expr": "COUNT(1)"},
-    "spindle_load_avg": {"src": "telemetry", "expr": "AVG(SAFE_CAST(JSON_VALUE(metrics, '$.spindle_load') AS FLOAT64))"},
-    "feed_rate_avg":     {"src": "telemetry", "expr": "AVG(SAFE_CAST(JSON_VALUE(metrics, '$.feed_rate') AS FLOAT64))"},
-    "power_kw_avg":      {"src": "telemetry", "expr": "AVG(SAFE_CAST(JSON_VALUE(metrics, '$.power_kw') AS FLOAT64))"},
+    # --- Telemetry aggregates (typed raw_telemetry columns, see simco_common/signals.py) ---
+    "telemetry_samples": {"src": "telemetry", "expr": "COUNT(1)", "local": "count:samples"},
+    "spindle_load_avg": {"src": "telemetry", "expr": "AVG(spindle_load)", "local": "avg:spindle_load"},
+    "feed_rate_avg":     {"src": "telemetry", "expr": "AVG(feed_rate)", "local": "avg:feed_rate"},
+    "power_kw_avg":      {"src": "telemetry", "expr": "AVG(power_kw)", "local": "avg:power_kw"},
 
     # --- Events aggregates (raw_events.details is JSON) ---
-    "event_count":       {"src": "events", "expr": "COUNT(1)"},
-    "alarm_count":       {"src": "events", "expr": "COUNTIF(type = 'ALARM')"},
-    "downtime_count":    {"src": "events", "expr": "COUNTIF(type = 'DOWNTIME')"},
+    "event_count":       {"src": "events", "expr": "COUNT(1)", "local": "count:events"},
+    "alarm_count":       {"src": "events", "expr": "COUNTIF(type = 'ALARM')", "local": "count:alarms"},
+    "downtime_count":    {"src": "events", "expr": "COUNTIF(type = 'DOWNTIME')", "local": "count:downtimes"},
     # If your event payload includes duration_seconds in details JSON, this works; otherwise it will sum NULLs -> 0
-    "downtime_sec":      {"src": "events", "expr": "SUM(CASE WHEN type='DOWNTIME' THEN SAFE_CAST(JSON_VALUE(details, '$.duration_seconds') AS FLOAT64) ELSE 0 END)"},
+    "downtime_sec":      {"src": "events", "expr": "SUM(CASE WHEN type='DOWNTIME' THEN SAFE_CAST(JSON_VALUE(details, '$.duration_seconds') AS FLOAT64) ELSE 0 END)", "local": "sum:downtime_sec"},
 
     # --- ERP envelope aggregates (erp_raw.payload is JSON) ---
     "erp_rows":          {"src": "erp", "expr": "COUNT(1)"},
@@ -1209,7 +1552,8 @@ def _compile_expr(node: ast.AST, base_alias: str = "base") -> str:
 
     raise EquationError("Unsupported expression. Use +, -, *, / and allowed functions (ABS, ROUND, SQRT, LOG, EXP, NULLIF).")
 
-def _build_sql(equation: str, tenant_id: str, site_id: str, start_ts: datetime, end_ts: datetime, group_by: str) -> Tuple[str, bigquery.QueryJobConfig]:
+def _compile_sql(equation: str, group_by: str, project_id: str, dataset: str) -> str:
+    from cloud.processing.telemetry_sql import time_range
     try:
         tree = ast.parse(equation, mode="eval")
     except SyntaxError as e:
@@ -1241,10 +1585,6 @@ def _build_sql(equation: str, tenant_id: str, site_id: str, start_ts: datetime,
     else:
         raise EquationError("group_by must be one of: none, day, machine")
 
-    # Project ID detection logic
-    project_id = os.getenv("GOOGLE_CLOUD_PROJECT") or os.getenv("GCP_PROJECT") or "solidcamal"
-    dataset = os.getenv("BQ_DATASET") or "simco_telemetry"
-
     raw_telemetry = f"`{project_id}.{dataset}.raw_telemetry`"
     raw_events    = f"`{project_id}.{dataset}.raw_events`"
     erp_raw       = f"`{project_id}.{dataset}.raw_erp_orders`"
@@ -1295,7 +1635,7 @@ telemetry_agg AS (
   FROM {raw_telemetry}
   WHERE tenant_id = @tenant_id
     AND site_id = @site_id
-    AND CAST(timestamp AS TIMESTAMP) >= TIMESTAMP(@start_ts) AND CAST(timestamp AS TIMESTAMP) < TIMESTAMP(@end_ts)
+    AND {time_range()}
   GROUP BY {tel_group}
 )
 """ if tel_cols else ""
@@ -1307,7 +1647,7 @@ events_agg AS (
   FROM {raw_events}
   WHERE tenant_id = @tenant_id
     AND site_id = @site_id
-    AND CAST(timestamp AS TIMESTAMP) >= TIMESTAMP(@start_ts) AND CAST(timestamp AS TIMESTAMP) < TIMESTAMP(@end_ts)
+    AND {time_range()}
   GROUP BY {evt_group}
 )
 """ if evt_cols else ""
@@ -1318,7 +1658,7 @@ erp_agg AS (
     {erp_key_select}{"," if erp_cols else ""}{",".join(erp_cols)}
   FROM {erp_raw}
   WHERE tenant_id = @tenant_id
-    AND CAST(timestamp AS TIMESTAMP) >= TIMESTAMP(@start_ts) AND CAST(timestamp AS TIMESTAMP) < TIMESTAMP(@end_ts)
+    AND {time_range("ingest_ts")}
   GROUP BY {erp_group}
 )
 """ if erp_cols else ""
@@ -1391,15 +1731,64 @@ FROM {final_from}
 {("ORDER BY " + ", ".join(order_by)) if order_by else ""}
 LIMIT 500
 """.strip()
+    return sql
 
+def _equation_target() -> Tuple[str, str]:
+    # Project ID detection logic
+    project_id = os.getenv("GOOGLE_CLOUD_PROJECT") or os.getenv("GCP_PROJECT") or "solidcamal"
+    dataset = os.getenv("BQ_DATASET") or "simco_telemetry"
+    return project_id, dataset
+
+@functools.lru_cache(maxsize=512)
+def _equation_plan(equation: str, group_by: str, project_id: str, dataset: str) -> Tuple[str, Any]:
+    """
+    Compiled (equation, group_by) -> (SQL, local plan or None), cached per
+    instance. The local plan is None when the equation needs BigQuery
+    (ERP variables, constant-only equations). Raises EquationError.
+    """
+    from equation_engine import LocalUnsupported, compile_local
+    sql = _compile_sql(equation, group_by, project_id, dataset)
+    try:
+        local = compile_local(ast.parse(equation, mode="eval"), EQUATION_VARS)
+    except LocalUnsupported:
+        local = None
+    return sql, local
+
+def _equation_params(tenant_id: str, site_id: str, start_ts: datetime, end_ts: datetime) -> "bigquery.QueryJobConfig":
     params = [
         bigquery.ScalarQueryParameter("tenant_id", "STRING", tenant_id),
         bigquery.ScalarQueryParameter("site_id", "STRING", site_id),
         bigquery.ScalarQueryParameter("start_ts", "TIMESTAMP", start_ts),
         bigquery.ScalarQueryParameter("end_ts", "TIMESTAMP", end_ts),
     ]
-    job_config = bigquery.QueryJobConfig(query_parameters=params)
-    return sql, job_config
+    return bigquery.QueryJobConfig(query_parameters=params)
+
+def _local_equation_window(start_ts: datetime, end_ts: datetime) -> bool:
+    """Short, hour-aligned windows are evaluated locally over the hourly rollup."""
+    max_hours = float(os.environ.get("EQUATIONS_LOCAL_MAX_HOURS", "72"))
+    aligned = all(t.minute == 0 and t.second == 0 and t.microsecond == 0 for t in (start_ts, end_ts))
+    return aligned and timedelta(0) < end_ts - start_ts <= timedelta(hours=max_hours)
+
+def _eval_equation(equation: str, tenant_id: str, site_id: str, start_ts: datetime, end_ts: datetime, group_by: str) -> Tuple[List[dict], str]:
+    """Rows of the equation and the engine that computed them ("local" or "bigquery")."""
+    import time
+    from simco_agent.observability.metrics import cloud_metrics
+    eval_start = time.monotonic()
+    project_id, dataset = _equation_target()
+    sql, local = _equation_plan(equation, group_by, project_id, dataset)
+    bq = get_bq_client()
+    if local is not None and _local_equation_window(start_ts, end_ts):
+        from equation_engine import evaluate, rollup_sql
+        start_ts, end_ts = (t if t.tzinfo else t.replace(tzinfo=timezone.utc) for t in (start_ts, end_ts))
+        # One rollup per (tenant, site, window), shared by every equation over it
+        rollup = get_query_cache().query(bq, rollup_sql(project_id, dataset),
+                                         _equation_params(tenant_id, site_id, start_ts, end_ts), query_class="equations")
+        rows, engine = evaluate(local, EQUATION_VARS, [dict(r) for r in rollup], group_by, start_ts, end_ts), "local"
+    else:
+        results = get_query_cache().query(bq, sql, _equation_params(tenant_id, site_id, start_ts, end_ts), query_class="equations")
+        rows, engine = [dict(r) for r in results], "bigquery"
+    cloud_metrics.histogram("cloud.equations.eval_ms", (time.monotonic() - eval_start) * 1000, labels={"engine": engine})
+    return rows, engine
 
 @https_fn.on_request()
 def equations_api(req: https_fn.Request) -> https_fn.Response:
@@ -1452,7 +1841,10 @@ def equations_api(req: https_fn.Request) -> https_fn.Response:
             start_ts = _parse_iso(tr["start"])
             end_ts = _parse_iso(tr["end"])
         else:
-            end_ts = datetime.utcnow().replace(tzinfo=timezone.utc)
+            # Last 24 hours up to the end of the current hour: hour-aligned, so the
+            # rollup (and its cache entry) is shared by every equation in the hour
+            now = datetime.utcnow().replace(tzinfo=timezone.utc)
+            end_ts = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
             start_ts = end_ts - timedelta(hours=24)
     except Exception as e:
         resp = https_fn.Response(json.dumps({"error":f"Invalid time_range: {e}"}), status=400, mimetype="application/json")
@@ -1460,10 +1852,7 @@ def equations_api(req: https_fn.Request) -> https_fn.Response:
         return resp
 
     try:
-        sql, job_config = _build_sql(equation, tenant_id, site_id, start_ts, end_ts, group_by)
-        bq = bigquery.Client()
-        results = bq.query(sql, job_config=job_config).result()
-        rows = [dict(r) for r in results]
+        rows, engine = _eval_equation(equation, tenant_id, site_id, start_ts, end_ts, group_by)
     except EquationError as e:
         resp = https_fn.Response(json.dumps({"error":str(e), "allowed_vars":sorted(EQUATION_VARS.keys())}), status=400, mimetype="application/json")
         resp.headers["Access-Control-Allow-Origin"] = "*"
@@ -1499,7 +1888,7 @@ def equations_api(req: https_fn.Request) -> https_fn.Response:
     if group_by == "none" and rows:
         answer = f"Result: {rows[0].get('value'):.4f}" if isinstance(rows[0].get('value'), float) else f"Result: {rows[0].get('value')}"
 
-    resp_data = {"answer": answer, "rows": rows, "visualization": viz}
+    resp_data = {"answer": answer, "rows": rows, "visualization": viz, "engine": engine}
     resp = https_fn.Response(json.dumps(resp_data, default=str), status=200, mimetype="application/json")
     resp.headers["Access-Control-Allow-Origin"] = "*"
     return resp
@@ -1546,6 +1935,7 @@ def ask(req: https_fn.Request) -> https_fn.Response:
             headers={"Access-Control-Allow-Origin": "*"},
         )
 
+    from cloud.processing.telemetry_sql import metric_expr, recent
     dataset = os.environ.get("BQ_DATASET", "simco_telemetry")
     bq = get_bq_client()
     q_lower = question.lower()
@@ -1579,16 +1969,14 @@ def ask(req: https_fn.Request) -> https_fn.Response:
         if "power" in q_lower: metric_key = "power_kw"
         elif "feed" in q_lower: metric_key = "feed_rate"
         
-        # Use JSON_VALUE (BigQuery standard SQL for JSON extraction)
-        # Note: If metrics is STRING, use JSON_EXTRACT_SCALAR.
-        # Assuming metrics is STRING based on seeding script.
+        # Typed column for catalog signals (JSON overflow otherwise), partition-pruned window
         sql = f"""
         SELECT machine_id, '{metric_key}' as metric, 
-               SAFE_CAST(JSON_VALUE(metrics, '$.{metric_key}') AS FLOAT64) as value, 
+               {metric_expr(metric_key)} as value, 
                timestamp
         FROM `{dataset}.raw_telemetry`
         WHERE tenant_id = @tenant_id AND site_id = @site_id
-          AND CAST(timestamp AS TIMESTAMP) >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 7 DAY)
+          AND {recent(days=7)}
         ORDER BY timestamp DESC
         LIMIT 50
         """
@@ -1612,7 +2000,7 @@ def ask(req: https_fn.Request) -> https_fn.Response:
         WHERE tenant_id = @tenant_id 
           AND site_id = @site_id
           {event_filter}
-          AND CAST(timestamp AS TIMESTAMP) >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 7 DAY)
+          AND {recent(days=7)}
         GROUP BY machine_id, type
         ORDER BY event_count DESC
         LIMIT 10
@@ -1631,7 +2019,7 @@ def ask(req: https_fn.Request) -> https_fn.Response:
     )
 
     try:
-        rows = [dict(r) for r in bq.query(sql, job_config=job_config).result()]
+        rows = [dict(r) for r in get_query_cache().query(bq, sql, job_config, query_class="analytics")]
     except Exception as e:
         logger.error(f"/ask BigQuery error: {e}")
         return https_fn.Response(
@@ -1715,6 +2103,7 @@ def admin_api(req: https_fn.Request) -> https_fn.Response:
     Administrative actions: Invite User, Create Tenant, etc.
     Strictly RBAC protected (Admin Only).
     """
+    from admin_api import routes as admin_api_routes # PR2
     return admin_api_routes.dispatch(req)
 
 
@@ -1733,6 +2122,7 @@ def admin_api(req: https_fn.Request) -> https_fn.Response:
     Administrative actions: Invite User, Create Tenant, etc.
     Strictly RBAC protected (Admin Only).
     """
+    from admin_api import routes as admin_api_routes # PR2
     return admin_api_routes.dispatch(req)
 
 
@@ -1745,11 +2135,12 @@ def metrics_history(req: https_fn.Request) -> https_fn.Response:
     
     tenant_id = req.args.get("tenant_id") # Normally from auth claims
     machine_id = req.args.get("machine_id")
-    start_ts = req.args.get("start")
-    end_ts = req.args.get("end")
+    granularity = req.args.get("granularity", "hour")
     
     if not machine_id:
         return https_fn.Response("Missing machine_id", status=400)
+    if granularity not in ("hour", "day"):
+        return https_fn.Response("granularity must be hour or day", status=400)
 
     # RBAC / Claims check
     user_claims = validate_auth(req)
@@ -1759,29 +2150,50 @@ def metrics_history(req: https_fn.Request) -> https_fn.Response:
     if not tenant_id:
         return https_fn.Response("Unauthorized Tenant", status=403)
 
+    # Bounded range (last 24 hours / 30 days by default): the stats tables are
+    # partitioned by time, so bytes scanned follow the requested range.
+    # The default end is minute-aligned so repeated calls share a cache entry.
+    try:
+        end_ts = (_parse_iso(req.args["end"]) if req.args.get("end")
+                  else datetime.now(timezone.utc).replace(second=0, microsecond=0))
+        start_ts = (_parse_iso(req.args["start"]) if req.args.get("start")
+                    else end_ts - (timedelta(days=30) if granularity == "day" else timedelta(hours=24)))
+    except ValueError:
+        return https_fn.Response("start/end must be ISO timestamps", status=400)
+
     try:
         bq = get_bq_client()
         dataset = os.environ.get("BQ_DATASET", "simco_telemetry")
         
-        # Query View
-        query = f"""
-            SELECT hour_bucket, minutes_active, minutes_idle, minutes_alarm
-            FROM `{dataset}.hourly_machine_stats`
-            WHERE tenant_id = @tid 
-              AND machine_id = @mid
-              AND hour_bucket BETWEEN @start AND @end
-            ORDER BY hour_bucket ASC
-        """
+        # Pre-aggregated by the rollup_machine_stats job
+        if granularity == "day":
+            query = f"""
+                SELECT day, minutes_active, minutes_idle, minutes_alarm, minutes_stopped
+                FROM `{dataset}.daily_machine_stats`
+                WHERE tenant_id = @tid 
+                  AND machine_id = @mid
+                  AND day BETWEEN DATE(@start) AND DATE(@end)
+                ORDER BY day ASC
+            """
+        else:
+            query = f"""
+                SELECT hour_bucket, minutes_active, minutes_idle, minutes_alarm, minutes_stopped
+                FROM `{dataset}.hourly_machine_stats`
+                WHERE tenant_id = @tid 
+                  AND machine_id = @mid
+                  AND hour_bucket BETWEEN @start AND @end
+                ORDER BY hour_bucket ASC
+            """
         job_config = bigquery.QueryJobConfig(
             query_parameters=[
                 bigquery.ScalarQueryParameter("tid", "STRING", tenant_id),
                 bigquery.ScalarQueryParameter("mid", "STRING", machine_id),
-                bigquery.ScalarQueryParameter("start", "TIMESTAMP", start_ts or datetime.utcnow().isoformat()),
-                bigquery.ScalarQueryParameter("end", "TIMESTAMP", end_ts or datetime.utcnow().isoformat())
+                bigquery.ScalarQueryParameter("start", "TIMESTAMP", start_ts.isoformat()),
+                bigquery.ScalarQueryParameter("end", "TIMESTAMP", end_ts.isoformat())
             ]
         )
         
-        results = bq.query(query, job_config=job_config).result()
+        results = get_query_cache().query(bq, query, job_config, query_class="history")
         data = [dict(row) for row in results]
         
         return https_fn.Response(json.dumps(data, default=str), mimetype="application/json")
@@ -0,0 +1,179 @@
+"""
+Shared BigQuery query-result cache for the read endpoints.
+
+Results are keyed by project + normalized SQL + query parameters, so the
+same dashboard query from any endpoint or display shares one entry. Each
+query class has its own TTL; within a further stale window an expired
+entry is still served while one background job refreshes it
+(stale-while-revalidate). Concurrent misses for the same key share a
+single BigQuery job (single-flight). The cache is an LRU bounded by entry
+count and by total cached rows; oversized results are never cached.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("functions.query_cache")
+
+# Seconds a result stays fresh, per query class (QUERY_CACHE_TTL_<CLASS> overrides)
+DEFAULT_TTLS: Dict[str, float] = {
+    "fleet": 10,       # latest machine state / status fallbacks
+    "events": 15,      # recent events lists
+    "erp": 30,         # site_orders_now, ERP orders
+    "context": 15,     # mobile machine context
+    "assets": 60,      # assets_current lookups (sites, machine lists)
+    "history": 60,     # hourly_machine_stats
+    "analytics": 300,  # /ask aggregates
+    "equations": 60,   # equations_api
+    "default": 30,
+}
+
+_WS = re.compile(r"\s+")
+
+def normalize_sql(sql: str) -> str:
+    return _WS.sub(" ", sql).strip()
+
+def _param_key(param: Any) -> Tuple:
+    value = getattr(param, "value", None)
+    if not isinstance(value, (str, int, float, bool, type(None))):
+        value = str(value)
+    return (getattr(param, "name", None), getattr(param, "type_", None), value)
+
+class _Entry:
+    __slots__ = ("rows", "bytes_processed", "fresh_until", "stale_until")
+
+    def __init__(self, rows: List[Any], bytes_processed: int, ttl: float, stale: float):
+        now = time.monotonic()
+        self.rows = rows
+        self.bytes_processed = bytes_processed
+        self.fresh_until = now + ttl
+        self.stale_until = now + ttl + stale
+
+class QueryCache:
+    def __init__(self, max_entries: int = 2000, max_rows: int = 200_000, max_rows_per_entry: int = 20_000,
+                 stale_factor: float = 1.0, ttls: Optional[Dict[str, float]] = None):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.max_rows_per_entry = max_rows_per_entry
+        self.stale_factor = stale_factor  # stale window = ttl * stale_factor
+        self.ttls = dict(DEFAULT_TTLS)
+        self.ttls.update(ttls or {})
+        self._entries: "OrderedDict[Tuple, _Entry]" = OrderedDict()
+        self._rows = 0
+        self._inflight: Dict[Tuple, Future] = {}
+        self._lock = threading.Lock()
+
+    def ttl_for(self, query_class: str) -> float:
+        override = os.environ.get(f"QUERY_CACHE_TTL_{query_class.upper()}")
+        if override is not None:
+            return float(override)
+        return self.ttls.get(query_class, self.ttls["default"])
+
+    def key(self, client: Any, sql: str, job_config: Any = None) -> Tuple:
+        params = tuple(_param_key(p) for p in (getattr(job_config, "query_parameters", None) or ()))
+        return (str(getattr(client, "project", "")), normalize_sql(sql), params)
+
+    def query(self, client: Any, sql: str, job_config: Any = None, query_class: str = "default") -> List[Any]:
+        """Rows of the query, from the cache when fresh (or stale within the window, refreshed behind)."""
+        from simco_agent.observability.metrics import cloud_metrics
+        labels = {"query_class": query_class}
+        key = self.key(client, sql, job_config)
+        ttl = self.ttl_for(query_class)
+        if ttl <= 0:
+            return self._run(client, sql, job_config)[0]
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now < entry.stale_until:
+                self._entries.move_to_end(key)
+                stale = now >= entry.fresh_until
+                refresh = stale and key not in self._inflight
+                if refresh:
+                    self._inflight[key] = Future()
+        if entry is not None and now < entry.stale_until:
+            cloud_metrics.counter("cloud.query_cache.hit_count", 1, labels={**labels, "stale": str(stale).lower()})
+            cloud_metrics.counter("cloud.query_cache.bytes_saved", entry.bytes_processed, labels=labels)
+            if refresh:
+                threading.Thread(target=self._fill, args=(key, client, sql, job_config, query_class),
+                                 name="query-cache-refresh", daemon=True).start()
+            return entry.rows
+
+        # Miss: join an in-flight job for the same key, or run it
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            cloud_metrics.counter("cloud.query_cache.coalesced_count", 1, labels=labels)
+            return future.result()
+        cloud_metrics.counter("cloud.query_cache.miss_count", 1, labels=labels)
+        return self._fill(key, client, sql, job_config, query_class)
+
+    def _run(self, client: Any, sql: str, job_config: Any) -> Tuple[List[Any], int]:
+        job = client.query(sql, job_config=job_config)
+        rows = list(job.result())
+        bytes_processed = getattr(job, "total_bytes_processed", None)
+        return rows, bytes_processed if isinstance(bytes_processed, int) else 0
+
+    def _fill(self, key: Tuple, client: Any, sql: str, job_config: Any, query_class: str) -> List[Any]:
+        """Runs the query for an in-flight key, stores the result and resolves its waiters."""
+        from simco_agent.observability.metrics import cloud_metrics
+        with self._lock:
+            future = self._inflight[key]
+        try:
+            rows, bytes_processed = self._run(client, sql, job_config)
+        except Exception as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            logger.error(f"QueryCache: {query_class} query failed: {e}")
+            raise
+
+        ttl = self.ttl_for(query_class)
+        with self._lock:
+            self._inflight.pop(key, None)
+            if len(rows) <= self.max_rows_per_entry:
+                self._store(key, _Entry(rows, bytes_processed, ttl, ttl * self.stale_factor))
+            entries, cached_rows = len(self._entries), self._rows
+        future.set_result(rows)
+        cloud_metrics.gauge("cloud.query_cache.entries", entries)
+        cloud_metrics.gauge("cloud.query_cache.rows", cached_rows)
+        return rows
+
+    def _store(self, key: Tuple, entry: _Entry):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._rows -= len(old.rows)
+        self._entries[key] = entry
+        self._rows += len(entry.rows)
+        while self._entries and (len(self._entries) > self.max_entries or self._rows > self.max_rows):
+            _, evicted = self._entries.popitem(last=False)
+            self._rows -= len(evicted.rows)
+
+    def invalidate(self, sql_contains: Optional[str] = None):
+        """Drops every entry, or those whose normalized SQL contains the given text."""
+        with self._lock:
+            if sql_contains is None:
+                self._entries.clear()
+                self._rows = 0
+                return
+            for key in [k for k in self._entries if sql_contains in k[1]]:
+                self._rows -= len(self._entries.pop(key).rows)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "rows": self._rows, "inflight": len(self._inflight)}
+
+def build_query_cache() -> QueryCache:
+    return QueryCache(
+        max_entries=int(os.environ.get("QUERY_CACHE_MAX_ENTRIES", 2000)),
+        max_rows=int(os.environ.get("QUERY_CACHE_MAX_ROWS", 200_000)),
+        stale_factor=float(os.environ.get("QUERY_CACHE_STALE_FACTOR", 1.0)),
+    )
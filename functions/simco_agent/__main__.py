@@ -44,9 +44,14 @@ async def main():
     ]
 
     from .discovery.orchestrator import DiscoveryOrchestrator
+    from .discovery.passive import NeighborWatcher
     orchestrator = DiscoveryOrchestrator()
     ingestor = Ingestor(state)
 
+    # Continuous passive discovery: new neighbors are fingerprinted within seconds
+    neighbor_watcher = NeighborWatcher(interval_seconds=settings.NEIGHBOR_WATCH_INTERVAL_SECONDS)
+    tasks.append(asyncio.create_task(neighbor_watcher.run(orchestrator.handle_neighbor_delta)))
+
     try:
         while True:
             # 3. Local Discovery (Policy-Driven)
@@ -73,6 +78,7 @@ async def main():
         config_mgr.stop()
         heartbeat.stop()
         uplink.stop()
+        neighbor_watcher.stop()
         for t in tasks:
             t.cancel()
         await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,12 +1,59 @@
 import subprocess
 import re
+import asyncio
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Callable, Awaitable
 
 logger = logging.getLogger(__name__)
 
+PROC_NET_ARP = "/proc/net/arp"
+# ATF_COM: entry is complete (MAC resolved). Incomplete entries carry flags 0x0.
+_ATF_COM = 0x2
+_NULL_MAC = "00:00:00:00:00:00"
+_IPV4_RE = re.compile(r"^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$")
+
+def read_neighbor_table(path: str = PROC_NET_ARP) -> Optional[Dict[str, str]]:
+    """Reads the kernel neighbor table directly. Returns {ip: mac}, or None if unavailable."""
+    try:
+        with open(path, "r") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+
+    neighbors = {}
+    # Header: IP address  HW type  Flags  HW address  Mask  Device
+    for line in lines[1:]:
+        parts = line.split()
+        if len(parts) < 4:
+            continue
+        ip, flags, mac = parts[0], parts[2], parts[3].lower()
+        try:
+            if not int(flags, 16) & _ATF_COM:
+                continue
+        except ValueError:
+            continue
+        if mac == _NULL_MAC or not _IPV4_RE.match(ip):
+            continue
+        neighbors[ip] = mac
+    return neighbors
+
+def _to_candidate(ip: str, mac: Optional[str]) -> Dict[str, Any]:
+    return {
+        "ip": ip,
+        "mac": mac,
+        "source": "passive_arp",
+        "confidence": 0.5 # Passive is lower confidence without probe
+    }
+
 def discover_passive() -> List[Dict[str, Any]]:
-    """Discovers neighbors passively by parsing the system ARP table."""
+    """Discovers neighbors passively from the kernel ARP table."""
+    table = read_neighbor_table()
+    if table is not None:
+        candidates = [_to_candidate(ip, mac) for ip, mac in table.items()]
+        logger.info(f"PassiveDiscovery: Found {len(candidates)} candidates")
+        return candidates
+
+    # Non-Linux hosts (no /proc): fall back to the userland tools
     candidates = []
     try:
         # Run 'ip neigh' or 'arp -a'
@@ -18,12 +65,9 @@ def discover_passive() -> List[Dict[str, Any]]:
             if len(parts) >= 4:
                 ip = parts[0]
                 # Validate IP
-                if re.match(r"^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$", ip):
-                    candidates.append({
-                        "ip": ip,
-                        "source": "passive_arp",
-                        "confidence": 0.5 # Passive is lower confidence without probe
-                    })
+                if _IPV4_RE.match(ip):
+                    mac = parts[parts.index("lladdr") + 1].lower() if "lladdr" in parts[:-1] else None
+                    candidates.append(_to_candidate(ip, mac))
     except (subprocess.CalledProcessError, FileNotFoundError):
         logger.warning("PassiveDiscovery: 'ip' command failed, trying 'arp -n'")
         try:
@@ -32,13 +76,54 @@ def discover_passive() -> List[Dict[str, Any]]:
             for line in output.splitlines():
                 match = re.search(r"(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})", line)
                 if match:
-                    candidates.append({
-                        "ip": match.group(1),
-                        "source": "passive_arp",
-                        "confidence": 0.5
-                    })
+                    mac = re.search(r"(([0-9a-fA-F]{2}:){5}[0-9a-fA-F]{2})", line)
+                    candidates.append(_to_candidate(match.group(1), mac.group(1).lower() if mac else None))
         except Exception as e:
             logger.error(f"PassiveDiscovery: Failed to run fallback arp command: {e}")
 
     logger.info(f"PassiveDiscovery: Found {len(candidates)} candidates")
     return candidates
+
+class NeighborWatcher:
+    """
+    Continuously watches the kernel neighbor table and emits add/remove deltas.
+    A MAC change on a known IP is reported as a removal followed by an addition.
+    """
+    def __init__(self, path: str = PROC_NET_ARP, interval_seconds: float = 2.0):
+        self.path = path
+        self.interval_seconds = interval_seconds
+        self.known: Dict[str, str] = {}
+        self._running = False
+
+    def poll(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Diffs the current table against the last snapshot."""
+        current = read_neighbor_table(self.path)
+        if current is None:
+            return {"added": [], "removed": []}
+
+        added = [_to_candidate(ip, mac) for ip, mac in current.items() if self.known.get(ip) != mac]
+        removed = [_to_candidate(ip, mac) for ip, mac in self.known.items() if current.get(ip) != mac]
+        self.known = current
+        return {"added": added, "removed": removed}
+
+    async def run(self, on_delta: Callable[[Dict[str, List[Dict[str, Any]]]], Awaitable[Any]]):
+        if read_neighbor_table(self.path) is None:
+            logger.warning(f"NeighborWatcher: {self.path} not readable, continuous passive discovery disabled")
+            return
+
+        from simco_agent.observability.metrics import edge_metrics
+        self._running = True
+        logger.info(f"NeighborWatcher: Watching {self.path} every {self.interval_seconds}s")
+        while self._running:
+            try:
+                delta = self.poll()
+                if delta["added"] or delta["removed"]:
+                    edge_metrics.counter("edge.discovery.neighbor_added_count", len(delta["added"]))
+                    edge_metrics.counter("edge.discovery.neighbor_removed_count", len(delta["removed"]))
+                    await on_delta(delta)
+            except Exception as e:
+                logger.error(f"NeighborWatcher: Delta handling failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def stop(self):
+        self._running = False
@@ -1,7 +1,23 @@
-from typing import Any, Union
+from typing import Any, Dict, Tuple, Union
 from .models import TelemetryPoint, SignalQuality
+from simco_common.signals import SIGNALS_BY_NAME, canonical_name, coerce
 import datetime
 
+EXECUTION_STATES = {
+    "ACTIVE": "ACTIVE",
+    "RUNNING": "ACTIVE",
+    "EXECUTING": "ACTIVE",
+    "READY": "READY",
+    "IDLE": "READY",
+    "STOPPED": "STOPPED",
+    "PAUSED": "FEED_HOLD",
+    "FEED_HOLD": "FEED_HOLD",
+    "INTERRUPTED": "INTERRUPTED",
+    "EMERGENCY_STOP": "ERROR",
+    "ALARM": "ERROR",
+    "ERROR": "ERROR"
+}
+
 def normalize_execution_state(raw_state: str) -> str:
     """
     Normalizes diverse execution states into canonical SIMCO states:
@@ -12,24 +28,40 @@ def normalize_execution_state(raw_state: str) -> str:
         
     s = raw_state.upper().strip()
     
-    mapping = {
-        "ACTIVE": "ACTIVE",
-        "RUNNING": "ACTIVE",
-        "EXECUTING": "ACTIVE",
-        "READY": "READY",
-        "IDLE": "READY",
-        "STOPPED": "STOPPED",
-        "PAUSED": "FEED_HOLD",
-        "FEED_HOLD": "FEED_HOLD",
-        "INTERRUPTED": "INTERRUPTED",
-        "EMERGENCY_STOP": "ERROR",
-        "ALARM": "ERROR"
-    }
-    
-    return mapping.get(s, "UNKNOWN")
+    return EXECUTION_STATES.get(s, "UNKNOWN")
+
+def normalize_signal(name: str, value: Any) -> Tuple[str, Any]:
+    """
+    Maps a signal to its catalog name (simco_common/signals.py) and column
+    type, so the cloud can store it in its typed raw_telemetry column.
+    Values that do not fit the type, and non-catalog signals, pass through.
+    Known execution states are canonicalized; others (vendor codes such as
+    PROGRAM_STOPPED or OPTIONAL_STOP) are kept as sent rather than UNKNOWN.
+    """
+    name = canonical_name(name)
+    signal = SIGNALS_BY_NAME.get(name)
+    if signal is None:
+        return name, value
+    if name == "execution_state" and isinstance(value, str):
+        value = EXECUTION_STATES.get(value.upper().strip(), value)
+    try:
+        return name, coerce(signal, value)
+    except (TypeError, ValueError):
+        return name, value
+
+def normalize_metrics(metrics: Dict[str, Any]) -> Dict[str, Any]:
+    """normalize_signal() applied to a metrics dict. A catalog name wins over an alias of it."""
+    out: Dict[str, Any] = {}
+    for raw_name, raw_value in metrics.items():
+        name, value = normalize_signal(raw_name, raw_value)
+        if name in out and raw_name != name:
+            continue
+        out[name] = value
+    return out
 
 def create_point(name: str, value: Any, quality: SignalQuality = SignalQuality.GOOD) -> TelemetryPoint:
     """Helper to create a TelemetryPoint with current timestamp."""
+    name, value = normalize_signal(name, value)
     return TelemetryPoint(
         name=name,
         value=value,
@@ -1,8 +1,10 @@
 import logging
 import asyncio
+from dataclasses import replace
 from typing import Dict, Optional, Type, List
 from simco_agent.drivers.common.base_driver import DriverBase
 from simco_agent.drivers.common.models import DriverMatch, TelemetryPoint
+from simco_agent.drivers.common.normalize import normalize_signal
 
 logger = logging.getLogger(__name__)
 
@@ -69,17 +71,23 @@ class DriverRuntime:
 
     async def sample_all(self) -> Dict[str, List[TelemetryPoint]]:
         """
-        Collect telemetry from all active drivers.
+        Collect telemetry from all active drivers, with points renamed and
+        typed per the signal catalog (simco_common/signals.py).
         """
         results = {}
         for mid, driver in self._active_drivers.items():
             if driver.is_connected():
                 try:
                     points = await driver.sample()
-                    results[mid] = points
+                    results[mid] = [self._normalize(p) for p in points]
                 except Exception as e:
                     logger.error(f"Sampling failed for {mid}: {e}")
             else:
                 # Attempt reconnect strategy here in future
                 pass
         return results
+
+    @staticmethod
+    def _normalize(point: TelemetryPoint) -> TelemetryPoint:
+        name, value = normalize_signal(point.name, point.value)
+        return replace(point, name=name, value=value)
@@ -2,6 +2,7 @@ from pydantic import BaseModel, Field
 from typing import Optional, Literal, Dict, Any
 from datetime import datetime
 from simco_common.schemas_v3 import TelemetryRecordV3 as TelemetryRecord, StatusEnum
+from simco_agent.drivers.common.normalize import normalize_metrics
 
 class MachineInfo(BaseModel):
     ip: str
@@ -35,12 +36,12 @@ class TelemetryPayload(BaseModel):
             "device_id": device_id,
             "timestamp": self.timestamp.isoformat(),
             "status": self.status if self.status in StatusEnum.__members__ else "UNKNOWN",
-            "metrics": {
+            "metrics": normalize_metrics({
                 "spindle_load": self.spindle_load,
                 "feed_rate": self.feed_rate,
                 "program_name": self.program_name or "",
                 "anomaly": self.anomaly
-            },
+            }),
             "driver": None # Optional
         }
 
@@ -2,6 +2,8 @@ from pydantic import BaseModel, Field, constr, field_validator
 from typing import Dict, Any, Optional, Union, List
 from enum import Enum
 from datetime import datetime
+import hashlib
+import json
 
 # --- Canonical IDs (Strong Types) ---
 # Using type aliases for clarity, but validated via regex in models if needed
@@ -90,6 +92,16 @@ class TelemetryRecordV3(BaseModel):
             raise ValueError("Invalid timestamp format. Expected RFC3339.")
         return v
 
+def content_record_id(data: Dict[str, Any]) -> str:
+    """
+    record_id for a record sent without one: a hash of its identity,
+    timestamp, status and metrics. Distinct readings never collide, while
+    an exact resend of the same reading maps to the same id.
+    """
+    content = {k: data.get(k) for k in ("tenant_id", "site_id", "machine_id", "device_id", "timestamp", "status", "metrics")}
+    digest = hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    return f"{data.get('machine_id', 'unknown')}:{digest[:32]}"
+
 class EventRecord(BaseModel):
     event_id: str = Field(..., description="Deterministic event ID for idempotency")
     tenant_id: str
@@ -0,0 +1,93 @@
+"""
+Canonical signal catalog, shared by the edge normalizer
+(simco_agent/drivers/common/normalize.py) and the warehouse.
+
+Every signal listed here has its own typed column in raw_telemetry, named
+after the signal. Other metrics stay in the `metrics` JSON column (overflow).
+Adding a signal means appending it here and running
+tools/migrate_typed_metrics.py to add and backfill its column.
+"""
+import json
+import math
+from dataclasses import dataclass
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+@dataclass(frozen=True)
+class Signal:
+    name: str
+    bq_type: str  # FLOAT64 | INT64 | STRING
+    unit: Optional[str] = None
+    aliases: Tuple[str, ...] = ()  # Vendor / protocol names mapped to `name` at the edge
+
+SIGNALS: Tuple[Signal, ...] = (
+    Signal("spindle_load", "FLOAT64", "%", ("SpindleLoad", "spindle_load_percent")),
+    Signal("spindle_speed", "FLOAT64", "rpm", ("SpindleSpeed", "RotaryVelocity")),
+    Signal("spindle_speed_override", "FLOAT64", "%", ("SpindleSpeedOverride",)),
+    Signal("feed_rate", "FLOAT64", "mm/min", ("PathFeedrate", "path_feedrate", "FeedRate")),
+    Signal("power_kw", "FLOAT64", "kW"),
+    Signal("part_count", "INT64", None, ("PartCount",)),
+    Signal("execution_state", "STRING", None, ("Execution", "execution")),
+    Signal("controller_mode", "STRING", None, ("ControllerMode",)),
+    Signal("program_name", "STRING", None, ("Program", "program")),
+)
+
+SIGNALS_BY_NAME: Dict[str, Signal] = {s.name: s for s in SIGNALS}
+SIGNAL_COLUMNS: Tuple[str, ...] = tuple(s.name for s in SIGNALS)
+_ALIASES: Dict[str, str] = {alias: s.name for s in SIGNALS for alias in s.aliases}
+
+def canonical_name(name: str) -> str:
+    """Catalog name for a vendor/protocol alias; other names are returned unchanged."""
+    return _ALIASES.get(name, name)
+
+def coerce(signal: Signal, value: Any) -> Any:
+    """Value converted to the signal's column type. Raises ValueError/TypeError if it does not fit."""
+    if value is None:
+        return None
+    if isinstance(value, (dict, list)):
+        raise TypeError(f"{signal.name}: structured value")
+    if signal.bq_type == "STRING":
+        return value if isinstance(value, str) else str(value)
+    if isinstance(value, bool):
+        raise TypeError(f"{signal.name}: boolean value")
+    number = float(value)
+    if math.isnan(number) or math.isinf(number):
+        raise ValueError(f"{signal.name}: not finite")
+    if signal.bq_type == "INT64":
+        if not number.is_integer():
+            raise ValueError(f"{signal.name}: not an integer")
+        return int(number)
+    return number
+
+def split_metrics(metrics: Optional[Mapping[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    (typed, overflow): catalog signals converted for their columns, and every
+    other metric. A catalog signal whose value does not fit its column type
+    stays in the overflow, so nothing is lost.
+    """
+    typed: Dict[str, Any] = {}
+    overflow: Dict[str, Any] = {}
+    for key, value in (metrics or {}).items():
+        signal = SIGNALS_BY_NAME.get(key)
+        if signal is None:
+            overflow[key] = value
+            continue
+        try:
+            typed[key] = coerce(signal, value)
+        except (TypeError, ValueError):
+            overflow[key] = value
+    return typed, overflow
+
+def merge_metrics(row: Mapping[str, Any], metrics_column: str = "metrics") -> Dict[str, Any]:
+    """Full metrics dict of a raw_telemetry row: the overflow JSON plus the non-NULL typed columns."""
+    overflow = row.get(metrics_column)
+    if isinstance(overflow, str):
+        try:
+            overflow = json.loads(overflow)
+        except ValueError:
+            overflow = None
+    merged = dict(overflow) if isinstance(overflow, dict) else {}
+    for column in SIGNAL_COLUMNS:
+        value = row.get(column)
+        if value is not None:
+            merged[column] = value
+    return merged
@@ -0,0 +1,78 @@
+import json
+import argparse
+import os
+import random
+import sys
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, REPO_ROOT)
+
+from cloud.processing.rules import RuleEvaluator
+
+DEFAULT_RULE_COUNTS = [3, 30, 300, 3000]
+METRICS_PER_RECORD = 8
+
+def synthetic_rules(count: int, metric_space: int, tenants: int):
+    """Threshold rules over `metric_space` metric names, most of them tenant/site-scoped."""
+    rules = []
+    for i in range(count):
+        rule = {
+            "id": f"BENCH_{i}", "type": "threshold",
+            "metric": f"metric_{i % metric_space}", "operator": ">", "value": 90.0,
+            "severity": "HIGH", "event_type": "ANOMALY_DETECTED",
+        }
+        if i % 4:
+            rule["tenant_id"] = f"t{i % tenants}"
+            if i % 2:
+                rule["site_id"] = "s0"
+        rules.append(rule)
+    rules.append({"id": "BENCH_STATE", "type": "state_change", "from": "ACTIVE", "to": "STOPPED",
+                  "severity": "MEDIUM", "event_type": "STATE_ALARM"})
+    return rules
+
+def synthetic_records(count: int, metric_space: int, tenants: int, seed: int = 7):
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        names = rng.sample(range(metric_space), min(METRICS_PER_RECORD, metric_space))
+        records.append({
+            "record_id": f"r{i}", "tenant_id": f"t{rng.randrange(tenants)}", "site_id": "s0",
+            "machine_id": f"m{i % 50}", "timestamp": f"2026-01-01T00:00:{i % 60:02d}Z",
+            "status": rng.choice(["ACTIVE", "STOPPED"]),
+            "metrics": {f"metric_{n}": rng.uniform(0, 100) for n in names},
+        })
+    return records
+
+def bench(rule_count: int, records: int, metric_space: int, tenants: int):
+    evaluator = RuleEvaluator(rules=synthetic_rules(rule_count, metric_space, tenants))
+    batch = synthetic_records(records, metric_space, tenants)
+    prev = None
+    events = 0
+    start = time.perf_counter()
+    for record in batch:
+        events += len(evaluator.evaluate(record, prev))
+        prev = record
+    elapsed = time.perf_counter() - start
+    return {"rules": rule_count, "records": records, "events": events,
+            "elapsed_s": round(elapsed, 4), "records_per_s": round(records / elapsed)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RuleEvaluator throughput (records/s) vs rule count")
+    parser.add_argument("--rule-counts", nargs="*", type=int, default=DEFAULT_RULE_COUNTS)
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--metric-space", type=int, default=200, help="Distinct metric names across rules/records")
+    parser.add_argument("--tenants", type=int, default=20)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    results = []
+    for n in args.rule_counts:
+        r = bench(n, args.records, args.metric_space, args.tenants)
+        results.append(r)
+        print(f"rules={r['rules']:>6} records/s={r['records_per_s']:>10} events={r['events']:>8}")
+
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,85 @@
+import json
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+FUNCTIONS_DIR = os.path.join(REPO_ROOT, "functions")
+DEFAULT_ENDPOINTS = ["ingest_telemetry", "portal_api", "get_mobile_context", "equations_api"]
+
+# python -X importtime line: "import time:   self [us] | cumulative | imported package"
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def parse_importtime(stderr: str):
+    """Returns [{"module", "self_us", "cumulative_us", "depth"}] from -X importtime output."""
+    entries = []
+    for line in stderr.splitlines():
+        m = _IMPORTTIME_RE.match(line)
+        if not m:
+            continue
+        entries.append({
+            "module": m.group(4),
+            "self_us": int(m.group(1)),
+            "cumulative_us": int(m.group(2)),
+            # One leading space is the column separator; each nesting level adds two
+            "depth": (len(m.group(3)) - 1) // 2,
+        })
+    return entries
+
+def profile_endpoint(endpoint: str, python: str = sys.executable):
+    """Cold-imports main.py in a fresh interpreter and warms `endpoint`'s modules (no clients)."""
+    code = (
+        "import os, coldstart, main; "
+        f"coldstart.warm_up({endpoint!r}, clients=False)"
+    )
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([FUNCTIONS_DIR, REPO_ROOT, env.get("PYTHONPATH", "")])
+    env["COLDSTART_PREWARM"] = "0"
+    start = time.perf_counter()
+    proc = subprocess.run([python, "-X", "importtime", "-c", code], cwd=FUNCTIONS_DIR, env=env,
+                          capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    entries = parse_importtime(proc.stderr)
+    return {
+        "endpoint": endpoint,
+        "ok": proc.returncode == 0,
+        "error": proc.stderr.strip().splitlines()[-1] if proc.returncode != 0 and proc.stderr.strip() else None,
+        "wall_ms": round(wall_ms, 1),
+        "import_ms": round(sum(e["cumulative_us"] for e in entries if e["depth"] == 0) / 1000, 1),
+        "modules": len(entries),
+        "top_modules": [
+            {"module": e["module"], "cumulative_ms": round(e["cumulative_us"] / 1000, 1)}
+            for e in sorted((e for e in entries if e["depth"] == 0), key=lambda e: e["cumulative_us"], reverse=True)[:15]
+        ],
+    }
+
+def profile_cold_start(endpoints, out_path, budget_ms=None):
+    results = {"endpoints": {}, "overall_status": "PASS"}
+    for ep in endpoints:
+        r = profile_endpoint(ep)
+        r["status"] = "PASS" if r["ok"] and (budget_ms is None or r["import_ms"] <= budget_ms) else "FAIL"
+        results["endpoints"][ep] = r
+        print(f"{ep:<24} import={r['import_ms']:>8.1f}ms wall={r['wall_ms']:>8.1f}ms modules={r['modules']:>5} [{r['status']}]")
+    if budget_ms is not None:
+        results["budget_ms"] = budget_ms
+    if any(r["status"] == "FAIL" for r in results["endpoints"].values()):
+        results["overall_status"] = "FAIL"
+
+    if out_path:
+        os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+        with open(out_path, "w") as f:
+            json.dump(results, f, indent=2)
+    return results["overall_status"] == "PASS"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-endpoint cold-start import profile for functions/main.py")
+    parser.add_argument("--endpoints", nargs="*", default=DEFAULT_ENDPOINTS)
+    parser.add_argument("--out", default="reports/cold_start_report.json")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail if any endpoint's import time exceeds this")
+    args = parser.parse_args()
+
+    ok = profile_cold_start(args.endpoints, args.out, args.budget_ms)
+    sys.exit(0 if ok else 1)
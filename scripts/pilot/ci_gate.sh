@@ -5,19 +5,25 @@ set -e
 echo "--- 🚀 STARTING CI QUALIFICATION GATE ---"
 
 # 1. Run Unit Tests
-echo "[1/3] Running Unit Tests..."
+echo "[1/4] Running Unit Tests..."
 python3 -m unittest discover tests -p "test_*.py" -q
 
 # 2. Run Pilot Suite (Compressed Outage)
-echo "[2/3] Running Pilot Qualification (Time-Compressed Outage)..."
+echo "[2/4] Running Pilot Qualification (Time-Compressed Outage)..."
 python3 scripts/pilot/run_pilot_suite.py \
   --machines 10 \
   --outage_sim_minutes 30 \
   --outage_time_compress_to_seconds 5 \
   --report_path reports/pilot_ci_report.json
 
-# 3. Certify
-echo "[3/3] Generating Acceptance Certificate..."
+# 3. Cold-Start Budget (functions/main.py import time per endpoint)
+echo "[3/4] Profiling Cloud Functions Cold Start..."
+python3 scripts/observability/profile_cold_start.py \
+  --out reports/cold_start_report.json \
+  --budget-ms 1500
+
+# 4. Certify
+echo "[4/4] Generating Acceptance Certificate..."
 python3 -m simco_agent.core.qa_certify --report reports/pilot_ci_report.json
 
 echo "--- ✅ CI GATE PASSED ---"
@@ -10,6 +10,7 @@ class Settings(BaseSettings):
     # Network Scanning
     SCAN_SUBNET: str = "127.0.0.1/32"
     SCAN_INTERVAL_SECONDS: int = 60
+    NEIGHBOR_WATCH_INTERVAL_SECONDS: float = 2.0
 
     # Data Buffering
     BUFFER_FILE: str = "buffer.jsonl"
@@ -1,8 +1,9 @@
 import json
 import os
 import time
+import asyncio
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Set
 from .policy import DiscoveryPolicy
 from .passive import discover_passive
 from .active import discover_active
@@ -76,7 +77,7 @@ class DiscoveryOrchestrator:
         # 2. Active Discovery
         if self.policy.is_active_allowed():
             # Extract subnets from policy or default to common local ranges if empty
-            subnets = self.policy.allowed_subnets or [settings.SCAN_SUBNET]
+            subnets = self.policy.scan_subnets(settings.SCAN_SUBNET)
             
             # Use normalized port dictionary
             port_map = self.policy.get_normalized_port_map()
@@ -101,6 +102,43 @@ class DiscoveryOrchestrator:
         
         return all_candidates
 
+    async def handle_neighbor_delta(self, delta: Dict[str, List[Dict[str, Any]]]) -> List[Any]:
+        """Applies a NeighborWatcher delta and fingerprints only the newly seen hosts."""
+        if not self.policy.is_passive_allowed():
+            return []
+
+        added = delta.get("added", [])
+        removed_ips = {c["ip"] for c in delta.get("removed", [])} - {c["ip"] for c in added}
+        if removed_ips:
+            self._mark_unreachable(removed_ips)
+        if not added:
+            return []
+
+        self._update_registry(added)
+
+        # Targeted probes on the new in-scope hosts only, when policy permits sending packets.
+        # Out-of-scope neighbors stay registered from the passive sighting but are never probed.
+        if not self.policy.is_active_allowed():
+            return []
+        targets = [c["ip"] for c in added if self.policy.in_scope(c["ip"], settings.SCAN_SUBNET)]
+        if len(targets) < len(added):
+            logger.info(f"Orchestrator: {len(added) - len(targets)} new neighbors outside the scan subnets, not probed")
+        if not targets:
+            return []
+        probed = await asyncio.to_thread(
+            discover_active,
+            subnets=[f"{ip}/32" for ip in targets],
+            port_map=self.policy.get_normalized_port_map(),
+            rate_limit_pps=self.policy.active_rate_limit_pps
+        )
+        if not probed:
+            return []
+        self._update_registry(probed)
+
+        fingerprints = await self.run_fingerprinting(probed)
+        self.save_fingerprints(fingerprints)
+        return fingerprints
+
     async def run_fingerprinting(self, candidates: List[Dict[str, Any]]) -> List[Any]:
         """Runs async fingerprinting on candidates."""
         from .fingerprinting import FingerprintOrchestrator
@@ -180,6 +218,7 @@ class DiscoveryOrchestrator:
                     "vendor": c.get("vendor", "UNKNOWN"),
                     "status": "DISCOVERED",
                     "source": c["source"],
+                    "mac": c.get("mac"),
                     "last_seen": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
                 }
                 if protocols:
@@ -191,6 +230,8 @@ class DiscoveryOrchestrator:
                 idx = existing[ip]
                 registry[idx]["last_seen"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
                 registry[idx]["status"] = "REACHABLE"
+                if c.get("mac"):
+                    registry[idx]["mac"] = c["mac"]
                 # Update metadata if we found new protocols
                 if protocols:
                     meta = registry[idx].get("metadata", {})
@@ -202,4 +243,14 @@ class DiscoveryOrchestrator:
         save_registry(registry, self.registry_path)
         logger.info(f"Orchestrator: Machine registry updated with {len(candidates)} candidates")
 
-
+    def _mark_unreachable(self, ips: Set[str]):
+        registry = load_registry(self.registry_path)
+        changed = 0
+        for entry in registry:
+            # Only discovery-owned states; enrolled machines are managed by their drivers
+            if entry.get("ip") in ips and entry.get("status") in ("DISCOVERED", "REACHABLE"):
+                entry["status"] = "UNREACHABLE"
+                changed += 1
+        if changed:
+            save_registry(registry, self.registry_path)
+            logger.info(f"Orchestrator: Marked {changed} machines unreachable (neighbor entry expired)")
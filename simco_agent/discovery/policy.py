@@ -1,3 +1,4 @@
+import ipaddress
 import logging
 from typing import List, Optional, Dict, Union
 from pydantic import BaseModel
@@ -32,6 +33,24 @@ class DiscoveryPolicy(BaseModel):
     def is_passive_allowed(self) -> bool:
         return self.mode in ["passive", "hybrid"]
 
+    def scan_subnets(self, default_subnet: str) -> List[str]:
+        """Subnets active probes may target: allowed_subnets, or the agent's default scan subnet."""
+        return self.allowed_subnets or [default_subnet]
+
+    def in_scope(self, ip: str, default_subnet: str) -> bool:
+        """Whether active probes may target `ip` (see scan_subnets)."""
+        try:
+            addr = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        for subnet in self.scan_subnets(default_subnet):
+            try:
+                if addr in ipaddress.ip_network(subnet, strict=False):
+                    return True
+            except ValueError:
+                logger.warning(f"DiscoveryPolicy: ignoring invalid subnet {subnet}")
+        return False
+
     def log_decision(self):
         logger.info(f"DiscoveryPolicy Decision: mode={self.mode}, active={self.active_enabled}, rate_limit={self.active_rate_limit_pps}pps")
         if self.allowed_subnets:
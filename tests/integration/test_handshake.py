@@ -25,3 +25,46 @@ async def test_probe_fail():
     with patch.object(handshake_service, "_check_port", return_value=False):
         result = await handshake_service.probe("192.168.1.99")
         assert result is None
+
+@pytest.mark.asyncio
+async def test_probe_priority_when_multiple_open():
+    # Both MTConnect and FOCAS open: FOCAS outranks MTConnect regardless of completion order
+    with patch.object(handshake_service, "_check_port", side_effect=lambda ip, port, t=1.0: port in (8193, 7878)):
+        result = await handshake_service.probe("192.168.1.12")
+        assert result.protocol == ProtocolEnum.FOCAS
+
+@pytest.mark.asyncio
+async def test_probe_ports_concurrently():
+    # Every port times out after 0.2s; sequential probing would take ~1s
+    async def slow_closed(ip, port, t=1.0):
+        await asyncio.sleep(0.2)
+        return False
+
+    with patch.object(handshake_service, "_check_port", side_effect=slow_closed):
+        start = asyncio.get_running_loop().time()
+        result = await handshake_service.probe("192.168.1.13")
+        elapsed = asyncio.get_running_loop().time() - start
+    assert result is None
+    assert elapsed < 0.5
+
+@pytest.mark.asyncio
+async def test_probe_many():
+    hosts = {"10.0.0.1": 4840, "10.0.0.2": 8193}
+    with patch.object(handshake_service, "_check_port", side_effect=lambda ip, port, t=1.0: hosts.get(ip) == port), \
+         patch("simco_agent.observability.metrics.edge_metrics") as metrics:
+        results = await handshake_service.probe_many(["10.0.0.1", "10.0.0.2", "10.0.0.3"], max_concurrent_hosts=2)
+    assert results["10.0.0.1"].protocol == ProtocolEnum.OPCUA
+    assert results["10.0.0.2"].protocol == ProtocolEnum.FOCAS
+    assert results["10.0.0.3"] is None
+    # Counts are metric values; labels stay bounded strings
+    metrics.gauge.assert_called_with("edge.handshake.identified_hosts", 2)
+    for call in metrics.histogram.call_args_list + metrics.gauge.call_args_list:
+        assert all(isinstance(v, str) for v in (call.kwargs.get("labels") or {}).values())
+
+@pytest.mark.asyncio
+async def test_check_port_real_socket():
+    server = await asyncio.start_server(lambda r, w: w.close(), "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        assert await handshake_service._check_port("127.0.0.1", port, 0.5) is True
+    assert await handshake_service._check_port("127.0.0.1", port, 0.5) is False
@@ -0,0 +1,43 @@
+from fastapi.testclient import TestClient
+from cloud.control_plane.app import app
+from cloud.control_plane.db import Base, get_db
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+import pytest
+import pytest_asyncio
+
+TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
+
+test_engine = create_async_engine(TEST_DATABASE_URL, echo=False)
+TestingSessionLocal = sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+
+async def override_get_db():
+    async with TestingSessionLocal() as session:
+        yield session
+
+@pytest_asyncio.fixture
+async def test_db():
+    app.dependency_overrides[get_db] = override_get_db
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+@pytest.fixture
+def client(test_db):
+    return TestClient(app)
+
+def test_live_stream_requires_auth(client):
+    assert client.get("/live/tenants/t1/sites/s1").status_code == 401
+
+def test_live_stream_display_token_is_site_bound(client):
+    res = client.post("/displays", json={"tenant_id": "t1", "site_id": "s1", "name": "Entrance"})
+    token = res.json()["token"]
+
+    assert client.get(f"/live/tenants/t1/sites/s2?display_token={token}").status_code == 403
+    assert client.get("/live/tenants/t1/sites/s1?display_token=wrong").status_code == 403
+
+def test_live_stream_user_without_membership(client):
+    res = client.get("/live/tenants/t1/sites/s1", headers={"Authorization": "Bearer u_nobody:nobody@simco.ai"})
+    assert res.status_code == 403
@@ -1,8 +1,13 @@
+import asyncio
+import os
+import tempfile
 import unittest
 from unittest.mock import patch, MagicMock
 from simco_agent.discovery.policy import DiscoveryPolicy
-from simco_agent.discovery.passive import discover_passive
+from simco_agent.discovery.passive import discover_passive, read_neighbor_table, NeighborWatcher
 from simco_agent.discovery.active import plan_active_scan
+from simco_agent.discovery.orchestrator import DiscoveryOrchestrator
+from simco_agent.core.registry import load_registry
 
 class TestDiscoverySuite(unittest.TestCase):
     def test_policy_decisions(self):
@@ -21,12 +26,74 @@ class TestDiscoverySuite(unittest.TestCase):
         self.assertTrue(p.is_active_allowed())
         self.assertTrue(p.is_passive_allowed())
 
+    @patch("simco_agent.discovery.passive.read_neighbor_table", return_value=None)
     @patch("subprocess.check_output")
-    def test_passive_parsing(self, mock_cmd):
+    def test_passive_parsing(self, mock_cmd, mock_table):
         mock_cmd.return_value = "192.168.1.10 dev eth0 lladdr 00:11:22:33:44:55 REACHABLE"
         res = discover_passive()
         self.assertEqual(len(res), 1)
         self.assertEqual(res[0]["ip"], "192.168.1.10")
+        self.assertEqual(res[0]["mac"], "00:11:22:33:44:55")
+
+    def _write_arp(self, path, rows):
+        with open(path, "w") as f:
+            f.write("IP address       HW type     Flags       HW address            Mask     Device\n")
+            for ip, flags, mac in rows:
+                f.write(f"{ip:<16} 0x1         {flags:<11} {mac}     *        eth0\n")
+
+    def test_proc_neighbor_table(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "arp")
+            self._write_arp(path, [
+                ("192.168.1.10", "0x2", "00:11:22:33:44:55"),
+                ("192.168.1.11", "0x0", "00:00:00:00:00:00"),  # Incomplete
+            ])
+            self.assertEqual(read_neighbor_table(path), {"192.168.1.10": "00:11:22:33:44:55"})
+            self.assertIsNone(read_neighbor_table(os.path.join(d, "missing")))
+
+    def test_neighbor_watcher_deltas(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "arp")
+            watcher = NeighborWatcher(path=path)
+
+            self._write_arp(path, [("10.0.0.5", "0x2", "aa:bb:cc:dd:ee:01")])
+            delta = watcher.poll()
+            self.assertEqual([c["ip"] for c in delta["added"]], ["10.0.0.5"])
+            self.assertEqual(delta["removed"], [])
+
+            # Unchanged table yields no delta
+            self.assertEqual(watcher.poll(), {"added": [], "removed": []})
+
+            self._write_arp(path, [("10.0.0.6", "0x2", "aa:bb:cc:dd:ee:02")])
+            delta = watcher.poll()
+            self.assertEqual([c["mac"] for c in delta["added"]], ["aa:bb:cc:dd:ee:02"])
+            self.assertEqual([c["ip"] for c in delta["removed"]], ["10.0.0.5"])
+
+    def test_policy_scope(self):
+        p = DiscoveryPolicy(allowed_subnets=["10.0.0.0/24"])
+        self.assertTrue(p.in_scope("10.0.0.7", "127.0.0.1/32"))
+        self.assertFalse(p.in_scope("10.0.1.7", "127.0.0.1/32"))
+        # Without allowed_subnets the agent's scan subnet applies
+        self.assertTrue(DiscoveryPolicy().in_scope("192.168.5.9", "192.168.5.0/24"))
+        self.assertFalse(DiscoveryPolicy().in_scope("not-an-ip", "0.0.0.0/0"))
+
+    @patch("simco_agent.discovery.orchestrator.discover_active", return_value=[])
+    def test_out_of_scope_neighbor_is_registered_but_not_probed(self, mock_active):
+        with tempfile.TemporaryDirectory() as d:
+            registry_path = os.path.join(d, "registry.json")
+            orch = DiscoveryOrchestrator(registry_path=registry_path)
+            orch.policy = DiscoveryPolicy(allowed_subnets=["10.0.0.0/24"])
+            delta = {"added": [{"ip": "10.0.0.5", "mac": "aa:bb:cc:dd:ee:01", "source": "passive_arp"},
+                               {"ip": "172.16.0.9", "mac": "aa:bb:cc:dd:ee:02", "source": "passive_arp"}],
+                     "removed": []}
+            asyncio.run(orch.handle_neighbor_delta(delta))
+
+            self.assertEqual(sorted(m["ip"] for m in load_registry(registry_path)), ["10.0.0.5", "172.16.0.9"])
+            self.assertEqual(mock_active.call_args.kwargs["subnets"], ["10.0.0.5/32"])
+
+            mock_active.reset_mock()
+            asyncio.run(orch.handle_neighbor_delta({"added": [delta["added"][1]], "removed": []}))
+            mock_active.assert_not_called()
 
     def test_active_scan_plan(self):
         plan = plan_active_scan(subnets=["10.0.0.0/24"], ports=[8193], dry_run=True)
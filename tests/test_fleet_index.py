@@ -0,0 +1,86 @@
+import unittest
+from datetime import datetime, timezone
+
+from cloud.processing.fleet_index import FleetIndex
+
+NOW = datetime(2026, 1, 12, 11, 0, tzinfo=timezone.utc).timestamp()
+
+def record(machine, status, minute, tenant="t1", site="s1", device="gw1"):
+    return {
+        "tenant_id": tenant, "site_id": site, "machine_id": machine, "device_id": device,
+        "timestamp": f"2026-01-12T10:{minute:02d}:00Z", "status": status, "metrics": {}
+    }
+
+class TestFleetIndex(unittest.TestCase):
+    def test_machines_track_latest_record_and_staleness(self):
+        index = FleetIndex(stale_after_sec=300)
+        index.observe_records([record("m1", "ACTIVE", 58), record("m2", "IDLE", 30), record("m1", "ALARM", 10)], now=NOW)
+
+        health = index.health("t1", now=NOW)
+        machines = {m["machine_id"]: m for m in health["machines"]}
+        self.assertEqual(machines["m1"]["status"], "ACTIVE")  # late ALARM record ignored
+        self.assertFalse(machines["m1"]["stale"])
+        self.assertTrue(machines["m2"]["stale"])
+        self.assertEqual(machines["m2"]["age_sec"], 1800)
+        self.assertEqual(health["machines"][0]["machine_id"], "m2")  # stalest first
+        self.assertEqual(health["summary"], {"machines": 2, "stale_machines": 1, "by_status": {"ACTIVE": 1, "IDLE": 1},
+                                             "gateways": 1, "stale_gateways": 0})
+
+    def test_filters(self):
+        index = FleetIndex()
+        index.observe_records([record("m1", "ACTIVE", 58), record("m2", "IDLE", 30), record("m3", "IDLE", 45, site="s2")], now=NOW)
+
+        stale = index.health("t1", stale_after_sec=10 * 60, stale_only=True, now=NOW)
+        self.assertEqual([m["machine_id"] for m in stale["machines"]], ["m2", "m3"])
+        self.assertEqual([m["machine_id"] for m in index.health("t1", site_id="s2", now=NOW)["machines"]], ["m3"])
+        self.assertEqual(len(index.health("t1", status="idle", now=NOW)["machines"]), 2)
+        self.assertEqual(index.health("t2", now=NOW)["machines"], [])
+
+    def test_gateway_heartbeats(self):
+        index = FleetIndex(stale_after_sec=300)
+        # Heartbeat before any telemetry and without a tenant: attached once its first record arrives
+        index.observe_heartbeat("gw2", buffer_depth=1500, agent_version="3.1.0", now=NOW - 60)
+        self.assertEqual(index.health("t1", now=NOW)["gateways"], [])
+
+        index.observe_records([record("m1", "ACTIVE", 0, device="gw2"), record("m2", "ACTIVE", 59, device="gw1")], now=NOW)
+        index.observe_heartbeat("gw3", tenant_id="t1", buffer_depth=0, now=NOW - 900)
+
+        gateways = {g["gateway_id"]: g for g in index.health("t1", now=NOW)["gateways"]}
+        self.assertEqual(gateways["gw2"]["buffer_depth"], 1500)
+        self.assertEqual(gateways["gw2"]["agent_version"], "3.1.0")
+        self.assertEqual(gateways["gw2"]["machines"], 1)
+        self.assertFalse(gateways["gw2"]["stale"])  # heartbeat is newer than its records
+        self.assertTrue(gateways["gw3"]["stale"])
+        self.assertEqual(gateways["gw1"]["age_sec"], 60)
+
+    def test_machine_moving_between_gateways(self):
+        index = FleetIndex()
+        index.observe_records([record("m1", "ACTIVE", 10, device="gw1")], now=NOW)
+        index.observe_records([record("m1", "ACTIVE", 20, device="gw2")], now=NOW)
+        gateways = {g["gateway_id"]: g["machines"] for g in index.health("t1", now=NOW)["gateways"]}
+        self.assertEqual(gateways, {"gw1": 0, "gw2": 1})
+
+    def test_seed_from_shared_store(self):
+        index = FleetIndex()
+        self.assertIsNone(index.seed_age("t1", now=NOW))
+        index.seed("t1", [{k: v for k, v in record("m1", "IDLE", 50).items() if k != "tenant_id"}], now=NOW - 40)
+        self.assertEqual(index.seed_age("t1", now=NOW), 40)
+
+        # A re-seed never replaces a newer entry
+        index.observe_records([record("m1", "ACTIVE", 55)], now=NOW)
+        index.seed("t1", [record("m1", "IDLE", 50), record("m2", "ALARM", 52)], now=NOW)
+        machines = {m["machine_id"]: m["status"] for m in index.health("t1", now=NOW)["machines"]}
+        self.assertEqual(machines, {"m1": "ACTIVE", "m2": "ALARM"})
+        self.assertEqual(index.seed_age("t1", now=NOW), 0)
+
+    def test_heartbeat_fields_only_when_heard(self):
+        index = FleetIndex()
+        index.observe_records([record("m1", "ACTIVE", 58)], now=NOW)
+        gateway = index.health("t1", now=NOW)["gateways"][0]
+        self.assertNotIn("buffer_depth", gateway)
+        self.assertNotIn("last_heartbeat", gateway)
+        index.observe_heartbeat("gw1", tenant_id="t1", buffer_depth=3, now=NOW)
+        self.assertEqual(index.health("t1", now=NOW)["gateways"][0]["buffer_depth"], 3)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,7 @@
 import unittest
 import asyncio
 import json
+import threading
 from cloud.processing.bus import LocalBus
 from cloud.processing.stream_processor import StreamProcessor
 from cloud.processing.notify import dispatcher
@@ -11,7 +12,7 @@ class TestHotPathProcessing(unittest.TestCase):
         self.processor = StreamProcessor()
         # Reset state for fresh test
         self.processor.state_store = {}
-        self.processor.event_ids = set()
+        self.processor.event_ids.clear()
         dispatcher.notification_log = []
         dispatcher.rate_limits = {}
 
@@ -93,5 +94,78 @@ class TestHotPathProcessing(unittest.TestCase):
                 found = True
         self.assertTrue(found)
 
+    def test_process_batch_keeps_machine_order(self):
+        # Interleaved machines in one batch; each machine's RUNNING -> STOPPED must be seen in order
+        def rec(mid, ts, status):
+            return {
+                "record_id": f"{mid}_{ts}",
+                "tenant_id": "t", "site_id": "s", "machine_id": mid,
+                "timestamp": f"2026-01-12T10:00:0{ts}Z",
+                "status": status, "metrics": {}
+            }
+        batch = [
+            rec("m1", 1, "RUNNING"), rec("m2", 1, "RUNNING"),
+            rec("m1", 2, "STOPPED"), rec("m2", 2, "STOPPED"),
+        ]
+        self.run_async(self.processor.process_batch(batch))
+
+        self.assertEqual(len(self.processor.event_ids), 2)
+        self.assertEqual(self.processor.state_store["t:s:m1"]["status"], "STOPPED")
+        self.assertEqual(self.processor.state_store["t:s:m2"]["status"], "STOPPED")
+
+    def test_ingest_edge_events(self):
+        event = {
+            "event_id": "edge_evt_1",
+            "tenant_id": "t", "site_id": "s", "machine_id": "m1",
+            "timestamp": "2026-01-12T10:00:00Z",
+            "type": "ALARM", "severity": "CRITICAL",
+            "details": {"message": "Spindle overtemp"}
+        }
+        accepted = self.run_async(self.processor.ingest_events([event, dict(event)]))
+
+        self.assertEqual(len(accepted), 1)
+        stored = self.processor.event_store["t:s:m1"][-1]
+        self.assertEqual((stored["event_type"], stored["message"], stored["source"]), ("ALARM", "Spindle overtemp", "edge"))
+        self.assertEqual(len(dispatcher.notification_log), 1)
+
+    def test_bus_thread_and_request_threads_share_processor(self):
+        # Records are processed on the bus thread while request threads ingest the
+        # same edge events and read the site view; each event must land exactly once
+        self.bus.subscribe(self.processor.process_batch)
+        events = [{
+            "event_id": f"edge_{i}",
+            "tenant_id": "t", "site_id": "s", "machine_id": f"m{i % 20}",
+            "timestamp": "2026-01-12T10:00:00Z",
+            "type": "ALARM", "severity": "WARNING", "details": {}
+        } for i in range(300)]
+        accepted = []
+
+        def request_thread():
+            accepted.extend(e["event_id"] for e in asyncio.run(self.processor.ingest_events(events)))
+            self.processor.site_view("t", "s")
+            self.processor.snapshot()
+
+        async def publish_all():
+            for ts in range(1, 6):
+                status = "RUNNING" if ts % 2 else "STOPPED"
+                await self.bus.publish([{
+                    "record_id": f"m{m}_{ts}", "tenant_id": "t", "site_id": "s", "machine_id": f"m{m}",
+                    "timestamp": f"2026-01-12T10:00:0{ts}Z", "status": status, "metrics": {}
+                } for m in range(20)])
+
+        threads = [threading.Thread(target=request_thread) for _ in range(4)]
+        for t in threads:
+            t.start()
+        self.run_async(publish_all())
+        for t in threads:
+            t.join()
+        self.assertTrue(self.bus.flush(timeout=5))
+
+        self.assertEqual(sorted(accepted), sorted(e["event_id"] for e in events))
+        stored = [e for evs in self.processor.machine_events("t", "s").values() for e in evs if e.get("source") == "edge"]
+        self.assertEqual(len({e["event_id"] for e in stored}), len(stored))
+        self.assertEqual(len(self.processor.site_view("t", "s")["machines"]), 20)
+        self.assertTrue(all(r["status"] == "RUNNING" for r in self.processor.machine_states("t", "s").values()))
+
 if __name__ == "__main__":
     unittest.main()
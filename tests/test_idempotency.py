@@ -0,0 +1,94 @@
+import os
+import tempfile
+import time
+import unittest
+from cloud.processing.idempotency import IdempotencyCache, DedupBackend, GenerationalSet, SQLiteDedupBackend
+
+class DictBackend(DedupBackend):
+    def __init__(self):
+        self.keys = {}
+
+    def seen(self, keys):
+        return {k for k in keys if k in self.keys}
+
+    def mark(self, keys, ttl_sec):
+        for k in keys:
+            self.keys[k] = ttl_sec
+
+class TestIdempotencyCache(unittest.TestCase):
+    def test_seen_after_mark(self):
+        cache = IdempotencyCache()
+        self.assertEqual(cache.seen(["a", "b"]), set())
+        cache.mark(["a"])
+        self.assertEqual(cache.seen(["a", "b"]), {"a"})
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 3))
+        self.assertAlmostEqual(stats["hit_rate"], 0.25)
+
+    def test_lru_is_bounded(self):
+        cache = IdempotencyCache(max_entries=2)
+        cache.mark(["a", "b"])
+        cache.seen(["a"])  # refresh a, so b is evicted next
+        cache.mark(["c"])
+        self.assertEqual(cache.seen(["a", "b", "c"]), {"a", "c"})
+
+    def test_entries_expire(self):
+        cache = IdempotencyCache(ttl_sec=0.05)
+        cache.mark(["a"])
+        time.sleep(0.1)
+        self.assertEqual(cache.seen(["a"]), set())
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_shared_backend_catches_other_instance(self):
+        backend = DictBackend()
+        IdempotencyCache(backend=backend).mark(["batch:t1:uuid-1"])
+        other = IdempotencyCache(backend=backend)
+        self.assertEqual(other.seen(["batch:t1:uuid-1"]), {"batch:t1:uuid-1"})
+        # Promoted into the local LRU
+        self.assertEqual(other.stats()["entries"], 1)
+
+    def test_sqlite_backend(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "idem.db")
+            SQLiteDedupBackend(path).mark(["a", "b"], ttl_sec=60)
+            SQLiteDedupBackend(path).mark(["old"], ttl_sec=-1)
+            self.assertEqual(SQLiteDedupBackend(path).seen(["a", "old", "z"]), {"a"})
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestGenerationalSet(unittest.TestCase):
+    def test_keys_age_out_after_window(self):
+        clock = FakeClock()
+        ids = GenerationalSet(window_sec=100, generations=4, clock=clock)
+        ids.add("e1")
+        clock.now = 60
+        self.assertIn("e1", ids)
+        ids.add("e2")
+        clock.now = 101
+        self.assertNotIn("e1", ids)
+        self.assertIn("e2", ids)
+        self.assertEqual(ids.stats()["evicted"], 1)
+
+    def test_size_bound_rotates_generations(self):
+        ids = GenerationalSet(window_sec=3600, generations=2, max_entries=4, clock=FakeClock())
+        for i in range(10):
+            ids.add(f"e{i}")
+        self.assertLessEqual(len(ids), 4)
+        self.assertIn("e9", ids)
+        self.assertNotIn("e0", ids)
+
+    def test_set_protocol(self):
+        ids = GenerationalSet(clock=FakeClock())
+        ids.add("a")
+        ids.add("a")
+        self.assertEqual((len(ids), list(ids)), (1, ["a"]))
+        ids.clear()
+        self.assertEqual(len(ids), 0)
+
+if __name__ == "__main__":
+    unittest.main()
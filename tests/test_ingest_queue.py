@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+from cloud.processing.ingest_queue import SQLiteIngestQueue, IngestConsumer
+
+class TestIngestQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.queue = SQLiteIngestQueue(os.path.join(self.tmp.name, "queue.db"), lease_sec=60)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_consumer_merges_messages_into_one_batch(self):
+        for i in range(3):
+            self.queue.enqueue({"records": [{"record_id": f"r{i}a"}, {"record_id": f"r{i}b"}]})
+        calls = []
+        consumer = IngestConsumer(self.queue, handler=calls.append)
+
+        self.assertEqual(consumer.drain(), 6)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([r["record_id"] for r in calls[0]], ["r0a", "r0b", "r1a", "r1b", "r2a", "r2b"])
+        self.assertEqual(self.queue.depth(), 0)
+
+    def test_failed_handler_leaves_messages_queued(self):
+        queue = SQLiteIngestQueue(os.path.join(self.tmp.name, "expiring.db"), lease_sec=0)
+        queue.enqueue({"records": [{"record_id": "r1"}]})
+
+        def boom(records):
+            raise RuntimeError("warehouse down")
+
+        with self.assertRaises(RuntimeError):
+            IngestConsumer(queue, handler=boom).drain_once()
+        self.assertEqual(queue.depth(), 1)
+
+        # Redelivered once the lease expires
+        calls = []
+        self.assertEqual(IngestConsumer(queue, handler=calls.append).drain(), 1)
+        self.assertEqual(queue.depth(), 0)
+
+    def test_sink_errors_leave_messages_queued(self):
+        self.queue.enqueue({"records": [{"record_id": "r1"}, {"record_id": "r2"}]})
+
+        def partial(records):
+            return 1, [{"index": 1, "errors": [{"reason": "append_failed"}]}]
+
+        self.assertEqual(IngestConsumer(self.queue, handler=partial).drain_once(), 0)
+        self.assertEqual(self.queue.depth(), 1)
+
+        # Nacked messages are redelivered right away
+        calls = []
+        self.assertEqual(IngestConsumer(self.queue, handler=lambda r: (calls.append(r) or (len(r), []))).drain(), 2)
+        self.assertEqual(self.queue.depth(), 0)
+
+    def test_permanently_bad_row_is_dead_lettered_without_blocking(self):
+        self.queue.enqueue({"records": [{"record_id": "a1"}]})
+        self.queue.enqueue({"records": [{"record_id": "b1"}, {"record_id": "bad"}]})
+        self.queue.enqueue({"records": [{"record_id": "c1"}]})
+        calls = []
+
+        def handler(records):
+            calls.append([r["record_id"] for r in records])
+            return len(records), [{"index": i, "errors": [{"reason": "invalid"}]}
+                                  for i, r in enumerate(records) if r["record_id"] == "bad"]
+
+        # Messages without failed rows are acked on the first pass, and the drain goes on
+        self.assertEqual(IngestConsumer(self.queue, handler=handler, max_attempts=3).drain(), 2)
+        self.assertEqual(calls, [["a1", "b1", "bad", "c1"], ["b1", "bad"], ["b1", "bad"]])
+        self.assertEqual(self.queue.depth(), 0)
+        dead = self.queue.dead_letters()
+        self.assertEqual([(d["payload"]["records"][1]["record_id"], d["attempts"]) for d in dead], [("bad", 3)])
+
+    def test_leased_messages_are_hidden(self):
+        self.queue.enqueue({"records": []})
+        self.assertEqual(len(self.queue.lease(10)), 1)
+        self.assertEqual(self.queue.lease(10), [])
+
+    def test_lease_counts_delivery_attempts(self):
+        self.queue.enqueue({"records": []})
+        handle, _, _, attempts = self.queue.lease(10)[0]
+        self.queue.nack([handle])
+        self.assertEqual((attempts, self.queue.lease(10)[0][3]), (1, 2))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import asyncio
+import json
+import unittest
+from cloud.processing.live_feed import LiveFeed, feed
+from cloud.processing.stream_processor import StreamProcessor
+from cloud.processing.notify import dispatcher
+from cloud.control_plane import router_live
+
+def record(machine, status, minute, load=50.0, site="s1"):
+    return {
+        "record_id": f"{machine}:{minute}", "tenant_id": "t1", "site_id": site, "machine_id": machine,
+        "timestamp": f"2026-01-12T10:{minute:02d}:00Z", "status": status, "metrics": {"spindle_load_pct": load}
+    }
+
+def parse(chunk):
+    fields = dict(line.split(": ", 1) for line in chunk.strip().splitlines() if not line.startswith(":"))
+    return fields.get("event"), fields.get("id"), json.loads(fields["data"]) if "data" in fields else None
+
+class TestLiveFeed(unittest.TestCase):
+    def test_since_and_gap_detection(self):
+        f = LiveFeed(history_per_site=2)
+        for i in range(3):
+            f.publish("t1", "s1", "machine", {"i": i})
+        f.publish("t1", "s2", "machine", {"i": 99})
+
+        deltas, complete = f.since("t1", "s1", 2)
+        self.assertTrue(complete)
+        self.assertEqual([d[2]["i"] for d in deltas], [2])
+        # seq 1 was evicted: a cursor before it has a gap
+        self.assertFalse(f.since("t1", "s1", 0)[1])
+        self.assertEqual(f.since("t1", "s3", 0), ([], True))
+
+    def test_cursor_ids(self):
+        f = LiveFeed()
+        self.assertEqual(f.parse_id(f.event_id(42)), 42)
+        self.assertIsNone(f.parse_id("1-42"))
+        self.assertIsNone(f.parse_id(None))
+
+    def test_wait_wakes_on_publish_from_another_thread(self):
+        f = LiveFeed()
+
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            loop.call_later(0.05, lambda: loop.run_in_executor(None, f.publish, "t1", "s1", "alert", {"x": 1}))
+            return await f.wait("t1", "s1", 0, timeout=5)
+
+        deltas, complete = asyncio.run(scenario())
+        self.assertTrue(complete)
+        self.assertEqual(deltas[0][1:], ("alert", {"x": 1}))
+
+class TestSiteEventStream(unittest.TestCase):
+    def setUp(self):
+        dispatcher.notification_log = []
+        dispatcher.rate_limits = {}
+        self.processor = StreamProcessor()
+        router_live._hot_path = (None, self.processor)
+
+    def tearDown(self):
+        router_live._hot_path = None
+
+    def collect(self, last_event_id, n, site="s1"):
+        async def run():
+            out = []
+            stream = router_live.site_events("t1", site, last_event_id, keepalive_sec=0.05)
+            async for chunk in stream:
+                if not chunk.startswith(":"):
+                    out.append(parse(chunk))
+                if len(out) == n:
+                    break
+            await stream.aclose()
+            return out
+        return asyncio.run(run())
+
+    def test_snapshot_then_deltas_then_resume(self):
+        asyncio.run(self.processor.process_record(record("m1", "RUNNING", 1, site="live1")))
+        first = self.collect(None, 1, site="live1")
+        self.assertEqual(first[0][0], "snapshot")
+        self.assertEqual(first[0][2]["fleet"]["total"], 1)
+
+        # Updates after the snapshot cursor arrive as deltas
+        asyncio.run(self.processor.process_record(record("m2", "IDLE", 2, site="live1")))
+        asyncio.run(self.processor.process_record(record("m1", "RUNNING", 3, load=95.0, site="live1")))
+        resumed = self.collect(first[0][1], 3, site="live1")
+        # The rule fires before the record becomes the machine's state
+        self.assertEqual([e[0] for e in resumed], ["machine", "alert", "machine"])
+        self.assertEqual([e[2]["machine_id"] for e in resumed], ["m2", "m1", "m1"])
+
+        # Reconnect from the last id: nothing is replayed, the next delta comes through
+        asyncio.run(self.processor.process_record(record("m2", "RUNNING", 4, site="live1")))
+        again = self.collect(resumed[-1][1], 1, site="live1")
+        self.assertEqual((again[0][0], again[0][2]["timestamp"]), ("machine", "2026-01-12T10:04:00Z"))
+
+    def test_unknown_cursor_gets_snapshot(self):
+        out = self.collect("0-5", 1, site="live2")
+        self.assertEqual(out[0][0], "snapshot")
+        self.assertEqual(feed.parse_id(out[0][1]), feed.last_seq)
+
+if __name__ == "__main__":
+    unittest.main()
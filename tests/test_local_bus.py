@@ -0,0 +1,140 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime, timezone
+from cloud.processing.bus import LocalBus
+
+class TestLocalBus(unittest.TestCase):
+    def batches(self, n):
+        return [[{"record_id": f"r{i}"}] for i in range(n)]
+
+    def test_slow_subscriber_does_not_block_publisher(self):
+        bus = LocalBus(max_queue=10)
+        seen = []
+
+        async def slow(records):
+            await asyncio.sleep(0.2)
+            seen.extend(r["record_id"] for r in records)
+        async def fast(records):
+            seen.append("fast")
+
+        bus.subscribe(slow)
+        bus.subscribe(fast)
+        start = time.monotonic()
+        asyncio.run(bus.publish([{"record_id": "r0"}]))
+        self.assertLess(time.monotonic() - start, 0.1)
+
+        self.assertTrue(bus.flush(timeout=5))
+        self.assertEqual(seen, ["fast", "r0"])
+
+    def test_block_policy_applies_backpressure_in_order(self):
+        bus = LocalBus(max_queue=1, policy="block")
+        seen = []
+        async def handler(records):
+            await asyncio.sleep(0.01)
+            seen.extend(r["record_id"] for r in records)
+        bus.subscribe(handler)
+
+        async def publish_all():
+            for batch in self.batches(5):
+                await bus.publish(batch)
+        asyncio.run(publish_all())
+        self.assertTrue(bus.flush(timeout=5))
+        self.assertEqual(seen, ["r0", "r1", "r2", "r3", "r4"])
+
+    def test_drop_oldest_policy(self):
+        bus = LocalBus(max_queue=2, policy="drop_oldest")
+        gate = asyncio.Event()
+        seen = []
+        async def handler(records):
+            if not gate.is_set():
+                await asyncio.wait_for(gate.wait(), timeout=5)
+            seen.extend(r["record_id"] for r in records)
+        bus.subscribe(handler)
+
+        async def publish_all():
+            for batch in self.batches(5):
+                await bus.publish(batch)
+        asyncio.run(publish_all())
+        # r0 is in the handler; r1, r2 were dropped for r3, r4
+        self.assertEqual(bus.depth(), {"TestLocalBus.test_drop_oldest_policy.<locals>.handler": 2})
+        bus._loop.call_soon_threadsafe(gate.set)
+        self.assertTrue(bus.flush(timeout=5))
+        self.assertEqual(seen, ["r0", "r3", "r4"])
+
+    def test_spill_policy_replays_in_order(self):
+        with tempfile.TemporaryDirectory() as spill_dir:
+            bus = LocalBus(max_queue=1, policy="spill", spill_dir=spill_dir)
+            gate = asyncio.Event()
+            seen = []
+            async def handler(records):
+                if not gate.is_set():
+                    await asyncio.wait_for(gate.wait(), timeout=5)
+                seen.extend(r["record_id"] for r in records)
+            bus.subscribe(handler)
+
+            async def publish_all():
+                for batch in self.batches(5):
+                    await bus.publish(batch)
+            asyncio.run(publish_all())
+            self.assertTrue(os.listdir(spill_dir))
+            bus._loop.call_soon_threadsafe(gate.set)
+            self.assertTrue(bus.flush(timeout=5))
+            self.assertEqual(seen, ["r0", "r1", "r2", "r3", "r4"])
+            self.assertFalse(os.listdir(spill_dir))
+
+    def test_spill_keeps_non_json_values(self):
+        with tempfile.TemporaryDirectory() as spill_dir:
+            bus = LocalBus(max_queue=1, policy="spill", spill_dir=spill_dir)
+            gate = asyncio.Event()
+            seen = []
+            async def handler(records):
+                if not gate.is_set():
+                    await asyncio.wait_for(gate.wait(), timeout=5)
+                seen.extend(r["ts"] for r in records)
+            bus.subscribe(handler)
+
+            ts = datetime(2026, 1, 12, tzinfo=timezone.utc)
+            async def publish_all():
+                for _ in range(3):
+                    await bus.publish([{"ts": ts}])
+            asyncio.run(publish_all())
+            bus._loop.call_soon_threadsafe(gate.set)
+            self.assertTrue(bus.flush(timeout=5))
+            self.assertEqual(len(seen), 3)
+            self.assertIn(str(ts), seen)  # replayed from the spill file
+
+    def test_failed_spill_drops_batch_without_wedging_flush(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            not_a_dir = os.path.join(tmp, "file")
+            open(not_a_dir, "w").close()
+            bus = LocalBus(max_queue=1, policy="spill", spill_dir=os.path.join(not_a_dir, "spill"))
+            gate = asyncio.Event()
+            slow_seen, fast_seen = [], []
+            async def slow(records):
+                if not gate.is_set():
+                    await asyncio.wait_for(gate.wait(), timeout=5)
+                slow_seen.extend(r["record_id"] for r in records)
+            async def fast(records):
+                fast_seen.extend(r["record_id"] for r in records)
+            bus.subscribe(slow)
+            bus.subscribe(fast)
+
+            async def publish_all():
+                for batch in self.batches(4):
+                    await bus.publish(batch)
+            asyncio.run(publish_all())
+            bus._loop.call_soon_threadsafe(gate.set)
+            self.assertTrue(bus.flush(timeout=5))
+            # Later subscribers still get every batch
+            self.assertEqual(fast_seen, ["r0", "r1", "r2", "r3"])
+            self.assertLess(len(slow_seen), 4)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            LocalBus(policy="ignore")
+
+if __name__ == "__main__":
+    unittest.main()
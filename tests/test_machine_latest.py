@@ -0,0 +1,96 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from cloud.processing.machine_latest import FirestoreLatestBackend, MachineLatestStore, SQLiteLatestBackend
+
+def record(tenant, machine, status, minute, load=50.0, site="s1"):
+    return {
+        "record_id": f"{machine}:{minute}", "tenant_id": tenant, "site_id": site, "machine_id": machine,
+        "timestamp": f"2026-01-12T10:{minute:02d}:00Z", "status": status, "metrics": {"spindle_load_pct": load},
+        "ip": "10.0.0.5", "vendor": "haas"
+    }
+
+class TestMachineLatestStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.backend = SQLiteLatestBackend(os.path.join(self.tmp.name, "latest.db"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_newest_record_wins_within_and_across_batches(self):
+        store = MachineLatestStore(self.backend)
+        store.update([record("t1", "m1", "RUNNING", 5), record("t1", "m1", "IDLE", 3)])
+        store.update([record("t1", "m1", "ALARM", 1)])  # late arrival
+
+        self.assertEqual(store.get("t1", "m1")["status"], "RUNNING")
+        self.assertEqual(self.backend.get("t1", "m1")["status"], "RUNNING")
+        self.assertNotIn("record_id", store.get("t1", "m1"))
+
+    def test_point_reads_from_another_instance(self):
+        MachineLatestStore(self.backend).update([record("t1", "m1", "RUNNING", 5), record("t2", "m2", "IDLE", 6, site="s9")])
+
+        reader = MachineLatestStore(self.backend)
+        self.assertEqual(reader.get("t1", "m1")["metrics"], {"spindle_load_pct": 50.0})
+        self.assertIsNone(reader.get("t2", "m1"))  # scoped by tenant
+        self.assertEqual(reader.find("m2")["tenant_id"], "t2")
+        self.assertEqual(reader.find("m2")["site_id"], "s9")
+        self.assertIsNone(reader.find("unknown"))
+
+    def test_list_tenant_reads_the_shared_backend(self):
+        MachineLatestStore(self.backend).update([record("t1", "m1", "RUNNING", 5), record("t1", "m2", "IDLE", 6),
+                                                 record("t2", "m3", "IDLE", 6)])
+        rows = MachineLatestStore(self.backend).list_tenant("t1")
+        self.assertEqual(sorted(r["machine_id"] for r in rows), ["m1", "m2"])
+        self.assertIsNone(MachineLatestStore().list_tenant("t1"))  # no shared store
+
+    def test_unchanged_status_writes_are_throttled(self):
+        self.backend.upsert = MagicMock(wraps=self.backend.upsert)
+        store = MachineLatestStore(self.backend, min_write_interval_sec=60)
+        self.assertEqual(store.update([record("t1", "m1", "RUNNING", 1)]), 1)
+        self.assertEqual(store.update([record("t1", "m1", "RUNNING", 2, load=70.0)]), 0)
+        self.assertEqual(store.update([record("t1", "m1", "ALARM", 3)]), 1)
+        self.assertEqual(self.backend.upsert.call_count, 2)
+        # The instance itself still serves the newest record
+        self.assertEqual(store.get("t1", "m1")["timestamp"], "2026-01-12T10:03:00Z")
+
+    def test_local_reads_expire_to_backend(self):
+        store = MachineLatestStore(self.backend, read_ttl_sec=0.05)
+        store.update([record("t1", "m1", "RUNNING", 1)])
+        MachineLatestStore(self.backend).update([record("t1", "m1", "IDLE", 2)])
+        self.assertEqual(store.get("t1", "m1")["status"], "RUNNING")
+        time.sleep(0.08)
+        self.assertEqual(store.get("t1", "m1")["status"], "IDLE")
+
+    def test_backend_failure_returns_none(self):
+        backend = MagicMock()
+        backend.find.side_effect = RuntimeError("unavailable")
+        self.assertIsNone(MachineLatestStore(backend).find("m1"))
+
+    def test_firestore_upsert_skips_rows_older_than_stored(self):
+        client = MagicMock()
+        client.collection.return_value.document.side_effect = lambda doc_id: MagicMock(id=doc_id)
+        stored = MagicMock(id="t1:m1", exists=True)
+        stored.to_dict.return_value = record("t1", "m1", "RUNNING", 5)
+        client.get_all.return_value = [stored]
+        transaction = client.transaction.return_value
+        transaction._max_attempts = 1
+
+        FirestoreLatestBackend(client).upsert([record("t1", "m1", "ALARM", 3), record("t1", "m2", "IDLE", 4)])
+        self.assertEqual(client.get_all.call_args.kwargs["transaction"], transaction)
+        written = [call.args[0].id for call in transaction.set.call_args_list]
+        self.assertEqual(written, ["t1:m2"])
+        transaction._commit.assert_called_once()
+
+    def test_in_instance_store_without_backend(self):
+        store = MachineLatestStore(max_entries=2)
+        store.update([record("t1", "m1", "RUNNING", 1), record("t1", "m2", "IDLE", 1), record("t1", "m3", "IDLE", 1)])
+        self.assertIsNone(store.get("t1", "m1"))  # evicted
+        self.assertIsNone(store.find("m1"))
+        self.assertEqual(store.find("m3")["status"], "IDLE")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from cloud.processing.notify import NotificationDispatcher
+
+def event(machine_id, event_type="ANOMALY_DETECTED", site_id="s1"):
+    return {"event_id": f"{machine_id}:{event_type}", "tenant_id": "t1", "site_id": site_id,
+            "machine_id": machine_id, "event_type": event_type}
+
+class TestNotificationDispatcher(unittest.TestCase):
+    def setUp(self):
+        self.dispatcher = NotificationDispatcher()
+        self.dispatcher.digest_window = 0.05
+        self.dispatcher.backoff_base = 0.01
+        self.sent = []
+
+    def test_slow_webhook_does_not_block_dispatch(self):
+        async def slow_webhook(digest, urls):
+            await asyncio.sleep(0.5)
+            self.sent.append(digest)
+        self.dispatcher._send_webhook = slow_webhook
+
+        start = time.monotonic()
+        asyncio.run(self.dispatcher.dispatch(event("m1")))
+        self.assertLess(time.monotonic() - start, 0.1)
+        self.assertEqual(self.dispatcher.notification_log[0]["status"], "QUEUED")
+
+        self.assertTrue(self.dispatcher.flush(timeout=5))
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual(self.dispatcher.notification_log[0]["status"], "SENT")
+
+    def test_events_for_a_site_are_coalesced(self):
+        async def webhook(digest, urls):
+            self.sent.append(digest)
+        self.dispatcher._send_webhook = webhook
+
+        async def burst():
+            for m in ("m1", "m2", "m3"):
+                await self.dispatcher.dispatch(event(m))
+            await self.dispatcher.dispatch(event("m4", site_id="s2"))
+        asyncio.run(burst())
+        self.assertTrue(self.dispatcher.flush(timeout=5))
+
+        sizes = sorted((d["site_id"], d["count"]) for d in self.sent)
+        self.assertEqual(sizes, [("s1", 3), ("s2", 1)])
+
+    def test_retries_with_backoff_then_succeeds(self):
+        attempts = []
+        async def flaky(digest, urls):
+            attempts.append(time.monotonic())
+            if len(attempts) < 3:
+                raise ConnectionError("webhook down")
+        self.dispatcher._send_webhook = flaky
+
+        asyncio.run(self.dispatcher.dispatch(event("m1")))
+        self.assertTrue(self.dispatcher.flush(timeout=5))
+        self.assertEqual(len(attempts), 3)
+        entry = self.dispatcher.notification_log[0]
+        self.assertEqual((entry["status"], entry["attempts"]), ("SENT", 3))
+
+    def test_gives_up_after_max_attempts(self):
+        async def down(digest, urls):
+            raise ConnectionError("webhook down")
+        self.dispatcher._send_webhook = down
+        self.dispatcher.max_attempts = 2
+
+        asyncio.run(self.dispatcher.dispatch(event("m1")))
+        self.assertTrue(self.dispatcher.flush(timeout=5))
+        self.assertEqual(self.dispatcher.notification_log[0]["status"], "FAILED")
+
+    def test_retry_goes_only_to_failed_targets(self):
+        self.dispatcher.webhook_urls = ["https://a.example", "https://b.example"]
+        posts = []
+        async def post(url, payload):
+            posts.append((url, payload["digest_id"]))
+            if url == "https://b.example" and len(posts) < 3:
+                raise ConnectionError("b down")
+        self.dispatcher._post = post
+
+        asyncio.run(self.dispatcher.dispatch(event("m1")))
+        self.assertTrue(self.dispatcher.flush(timeout=5))
+        self.assertEqual([url for url, _ in posts], ["https://a.example", "https://b.example", "https://b.example"])
+        # The same digest id on every POST, so receivers can deduplicate
+        self.assertEqual(len({digest_id for _, digest_id in posts}), 1)
+        entry = self.dispatcher.notification_log[0]
+        self.assertEqual((entry["status"], entry["attempts"], entry["digest_id"]), ("SENT", 2, posts[0][1]))
+
+    def test_audit_log_is_bounded(self):
+        from collections import deque
+        self.dispatcher.notification_log = deque(maxlen=2)
+        self.dispatcher.MIN_INTERVAL = 0
+        async def burst():
+            for m in range(5):
+                await self.dispatcher.dispatch(event(f"m{m}"))
+        asyncio.run(burst())
+        self.assertEqual([e["machine_id"] for e in self.dispatcher.notification_log], ["m3", "m4"])
+        self.dispatcher.flush(timeout=5)
+
+    def test_flush_sends_open_digests_without_waiting_for_the_window(self):
+        async def webhook(digest, urls):
+            self.sent.append(digest)
+            return []
+        self.dispatcher._send_webhook = webhook
+        self.dispatcher.digest_window = 60
+        asyncio.run(self.dispatcher.dispatch(event("m1")))
+
+        self.assertFalse(self.dispatcher.flush(timeout=0.2))
+        self.assertTrue(self.dispatcher.flush(timeout=2, close_digests=True))
+        self.assertEqual([d["count"] for d in self.sent], [1])
+
+    def test_queued_notifications_are_delivered_at_exit(self):
+        # The process exits while the digest window is still open; the atexit hook delivers it
+        with tempfile.TemporaryDirectory() as tmp:
+            out = os.path.join(tmp, "sent.jsonl")
+            script = (
+                "import asyncio, json\n"
+                "from cloud.processing.notify import NotificationDispatcher\n"
+                "d = NotificationDispatcher()\n"
+                "d.digest_window = 60\n"
+                "async def webhook(digest, urls):\n"
+                f"    open({out!r}, 'a').write(json.dumps(digest) + '\\n')\n"
+                "    return []\n"
+                "d._send_webhook = webhook\n"
+                "asyncio.run(d.dispatch({'event_id': 'e1', 'tenant_id': 't1', 'site_id': 's1', 'machine_id': 'm1', 'event_type': 'ALARM'}))\n"
+            )
+            subprocess.run([sys.executable, "-c", script], check=True, timeout=30,
+                           cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            with open(out) as f:
+                self.assertEqual([line.count('"e1"') for line in f], [1])
+
+if __name__ == "__main__":
+    unittest.main()
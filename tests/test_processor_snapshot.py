@@ -0,0 +1,126 @@
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+import time
+import unittest
+from cloud.processing.snapshot import FileSnapshotStore, ProcessorSnapshotter, encode
+from cloud.processing.stream_processor import StreamProcessor
+from cloud.processing.notify import dispatcher
+
+def record(machine_id, status, ts, load=50.0):
+    return {
+        "record_id": f"{machine_id}:{ts}", "tenant_id": "t1", "site_id": "s1", "machine_id": machine_id,
+        "timestamp": ts, "status": status, "metrics": {"spindle_load_pct": load}
+    }
+
+class TestProcessorSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = FileSnapshotStore(self.tmp.name)
+        dispatcher.notification_log = []
+        dispatcher.rate_limits = {}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_save_and_warm_restore(self):
+        before = StreamProcessor()
+        asyncio.run(before.process_batch([
+            record("M1", "RUNNING", "2026-01-12T10:00:00Z", load=95.0),
+            record("M2", "RUNNING", "2026-01-12T10:00:00Z"),
+        ]))
+        self.assertGreater(ProcessorSnapshotter(before, self.store).save(), 0)
+
+        after = StreamProcessor()
+        self.assertTrue(ProcessorSnapshotter(after, self.store).restore())
+        self.assertEqual(after.machine_states(), before.machine_states())
+        self.assertEqual(after.machine_events(), before.machine_events())
+        # Restored events are not re-emitted
+        self.assertEqual(sorted(after.seen_event_ids()), sorted(before.seen_event_ids()))
+
+    def test_restored_state_feeds_state_change_rules(self):
+        before = StreamProcessor()
+        asyncio.run(before.process_record(record("M1", "RUNNING", "2026-01-12T10:00:00Z")))
+        ProcessorSnapshotter(before, self.store).save()
+
+        after = StreamProcessor()
+        ProcessorSnapshotter(after, self.store).restore()
+        asyncio.run(after.process_record(record("M1", "STOPPED", "2026-01-12T10:01:00Z")))
+        events = after.machine_events()["t1:s1:M1"]
+        self.assertTrue(any(e["event_type"] == "STATE_ALARM" for e in events))
+
+    def test_missing_stale_or_foreign_snapshot_starts_cold(self):
+        processor = StreamProcessor()
+        snapshotter = ProcessorSnapshotter(processor, self.store, max_age_sec=60)
+        self.assertFalse(snapshotter.restore())
+
+        self.store.save("processor_state", encode({"version": 1, "taken_at": time.time() - 120, "state": {"t1:s1:M1": {}}}))
+        self.assertFalse(snapshotter.restore())
+        self.store.save("processor_state", encode({"version": 99, "taken_at": time.time(), "state": {"t1:s1:M1": {}}}))
+        self.assertFalse(snapshotter.restore())
+        self.assertEqual(processor.machine_states(), {})
+
+    def test_live_state_wins_over_snapshot(self):
+        processor = StreamProcessor()
+        live = record("M1", "RUNNING", "2026-01-12T10:05:00Z")
+        processor.state_store["t1:s1:M1"] = live
+        processor.restore({"state": {"t1:s1:M1": record("M1", "IDLE", "2026-01-12T10:00:00Z")}, "events": {}})
+        self.assertIs(processor.machine_states()["t1:s1:M1"], live)
+
+    def test_instances_write_their_own_snapshot_and_restore_merges_them(self):
+        a, b = StreamProcessor(), StreamProcessor()
+        asyncio.run(a.process_batch([record("M1", "RUNNING", "2026-01-12T10:00:00Z"),
+                                     record("M2", "RUNNING", "2026-01-12T10:05:00Z", load=95.0)]))
+        asyncio.run(b.process_batch([record("M1", "IDLE", "2026-01-12T10:03:00Z"),
+                                     record("M2", "IDLE", "2026-01-12T10:01:00Z")]))
+        ProcessorSnapshotter(a, self.store, instance_id="a").save()
+        ProcessorSnapshotter(b, self.store, instance_id="b").save()
+        self.assertEqual(self.store.keys("processor_state"), ["processor_state-a", "processor_state-b"])
+
+        after = StreamProcessor()
+        self.assertTrue(ProcessorSnapshotter(after, self.store).restore())
+        states = after.machine_states()
+        # Newest record per machine, whichever instance saw it
+        self.assertEqual((states["t1:s1:M1"]["status"], states["t1:s1:M2"]["status"]), ("IDLE", "RUNNING"))
+        self.assertEqual(sorted(after.seen_event_ids()), sorted(set(a.seen_event_ids()) | set(b.seen_event_ids())))
+
+    def test_stale_instance_snapshots_are_deleted(self):
+        self.store.save("processor_state-old", encode({"version": 1, "taken_at": time.time() - 120, "state": {}}))
+        self.assertFalse(ProcessorSnapshotter(StreamProcessor(), self.store, max_age_sec=60).restore())
+        self.assertEqual(self.store.keys("processor_state"), [])
+
+    def test_restore_compacts_many_instance_snapshots(self):
+        # Every cold start used to download all of these again
+        for i in range(40):
+            instance = StreamProcessor()
+            asyncio.run(instance.process_record(record(f"M{i}", "RUNNING", f"2026-01-12T10:{i:02d}:00Z")))
+            ProcessorSnapshotter(instance, self.store, instance_id=f"i{i:02d}").save()
+
+        first = StreamProcessor()
+        self.assertTrue(ProcessorSnapshotter(first, self.store).restore())
+        self.assertEqual(len(first.machine_states()), 40)
+        self.assertEqual(self.store.keys("processor_state"), ["processor_state"])
+
+        # The next cold start reads the compacted object plus what was saved since
+        late = StreamProcessor()
+        asyncio.run(late.process_record(record("M0", "IDLE", "2026-01-12T11:00:00Z")))
+        ProcessorSnapshotter(late, self.store, instance_id="late").save()
+        loads = []
+        load = self.store.load
+        self.store.load = lambda key: loads.append(key) or load(key)
+        second = StreamProcessor()
+        self.assertTrue(ProcessorSnapshotter(second, self.store).restore())
+        self.assertEqual(sorted(loads), ["processor_state", "processor_state-late"])
+        self.assertEqual(len(second.machine_states()), 40)
+        self.assertEqual(second.machine_states()["t1:s1:M0"]["status"], "IDLE")
+
+    def test_file_store_is_gzipped_json(self):
+        ProcessorSnapshotter(StreamProcessor(), self.store, instance_id="i1").save()
+        with open(os.path.join(self.tmp.name, "processor_state-i1.json.gz"), "rb") as f:
+            snapshot = json.loads(gzip.decompress(f.read()))
+        self.assertEqual(snapshot["version"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+from cloud.processing.rules import RuleEvaluator
+
+def threshold(rule_id, metric, op, value, **scope):
+    return dict({"id": rule_id, "type": "threshold", "metric": metric, "operator": op, "value": value,
+                 "severity": "HIGH", "event_type": "ANOMALY_DETECTED"}, **scope)
+
+def record(metrics, tenant_id="t1", site_id="s1", status="ACTIVE", second=0, machine_id="m1"):
+    return {"record_id": f"r{second}", "tenant_id": tenant_id, "site_id": site_id, "machine_id": machine_id,
+            "timestamp": f"2026-01-12T10:{second // 60:02d}:{second % 60:02d}Z", "status": status, "metrics": metrics}
+
+class TestRuleEngine(unittest.TestCase):
+    def test_default_ruleset_loads(self):
+        evaluator = RuleEvaluator()
+        events = evaluator.evaluate(record({"spindle_load_pct": 95.0}))
+        self.assertEqual([e["rule_id"] for e in events], ["RULE_SPINDLE_LOAD_THRESHOLD"])
+
+    def test_operators(self):
+        evaluator = RuleEvaluator(rules=[
+            threshold("GE", "x", ">=", 10), threshold("LT", "x", "<", 10), threshold("EQ", "x", "==", 10),
+        ])
+        self.assertEqual([e["rule_id"] for e in evaluator.evaluate(record({"x": 10}))], ["GE", "EQ"])
+        self.assertEqual([e["rule_id"] for e in evaluator.evaluate(record({"x": 9}))], ["LT"])
+
+    def test_only_metrics_in_record_are_evaluated(self):
+        evaluator = RuleEvaluator(rules=[threshold("A", "a", ">", 0), threshold("B", "b", ">", 0)])
+        self.assertEqual([e["rule_id"] for e in evaluator.evaluate(record({"b": 1}))], ["B"])
+        self.assertEqual(evaluator.evaluate(record({"b": "n/a"})), [])
+
+    def test_tenant_and_site_scoping(self):
+        evaluator = RuleEvaluator(rules=[
+            threshold("GLOBAL", "x", ">", 0),
+            threshold("TENANT", "x", ">", 0, tenant_id="t1"),
+            threshold("SITE", "x", ">", 0, tenant_id="t1", site_id="s2"),
+            threshold("ORPHAN_SITE", "x", ">", 0, site_id="s1"),
+        ])
+        ids = lambda r: [e["rule_id"] for e in evaluator.evaluate(r)]
+        self.assertEqual(ids(record({"x": 1})), ["GLOBAL", "TENANT"])
+        self.assertEqual(ids(record({"x": 1}, site_id="s2")), ["GLOBAL", "TENANT", "SITE"])
+        self.assertEqual(ids(record({"x": 1}, tenant_id="t2")), ["GLOBAL"])
+
+    def test_state_transition_index(self):
+        evaluator = RuleEvaluator(rules=[{"id": "STOP", "type": "state_change", "from": "ACTIVE", "to": "STOPPED",
+                                          "severity": "MEDIUM", "event_type": "STATE_ALARM"}])
+        prev = record({}, status="ACTIVE")
+        self.assertEqual(len(evaluator.evaluate(record({}, status="STOPPED"), prev)), 1)
+        self.assertEqual(evaluator.evaluate(record({}, status="ACTIVE"), prev), [])
+        self.assertEqual(evaluator.evaluate(record({}, status="STOPPED")), [])
+
+    def test_duration_rule_fires_once_after_hold(self):
+        evaluator = RuleEvaluator(rules=[threshold("HOT", "load", ">", 90, duration_sec=30)])
+        fired = [sec for sec in range(0, 50, 10) if evaluator.evaluate(record({"load": 95}, second=sec))]
+        self.assertEqual(fired, [30])
+        # Clearing re-arms the rule
+        self.assertEqual(evaluator.evaluate(record({"load": 50}, second=50)), [])
+        self.assertEqual(evaluator.evaluate(record({"load": 95}, second=60)), [])
+        self.assertEqual(len(evaluator.evaluate(record({"load": 95}, second=90))), 1)
+
+    def test_duration_is_tracked_per_machine(self):
+        evaluator = RuleEvaluator(rules=[threshold("HOT", "load", ">", 90, duration_sec=20)])
+        evaluator.evaluate(record({"load": 95}, second=0, machine_id="m1"))
+        evaluator.evaluate(record({"load": 95}, second=15, machine_id="m2"))
+        self.assertEqual(len(evaluator.evaluate(record({"load": 95}, second=20, machine_id="m1"))), 1)
+        self.assertEqual(evaluator.evaluate(record({"load": 95}, second=20, machine_id="m2")), [])
+
+    def test_windowed_average(self):
+        evaluator = RuleEvaluator(rules=[threshold("AVG", "load", ">", 80, window_sec=60, aggregate="avg")])
+        self.assertEqual(evaluator.evaluate(record({"load": 70}, second=0)), [])
+        self.assertEqual(evaluator.evaluate(record({"load": 85}, second=30)), [])  # avg 77.5
+        events = evaluator.evaluate(record({"load": 100}, second=60))              # avg 85
+        self.assertEqual(len(events), 1)
+        self.assertIn("avg(load) over 60s = 85.00", events[0]["message"])
+
+    def test_rolling_window_aggregates(self):
+        from cloud.processing.rules import RollingWindow
+        w = RollingWindow(10)
+        for ts, val in [(0, 5), (4, 1), (8, 9), (12, 3)]:
+            w.add(ts, val)
+        # Sample at t=0 fell out of the window
+        self.assertEqual((w.value("min"), w.value("max")), (1, 9))
+        self.assertAlmostEqual(w.value("avg"), 13 / 3)
+        self.assertAlmostEqual(w.value("rate"), (3 - 1) / 8)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import asyncio
+import os
+import signal
+import unittest
+from cloud.processing.sharding import HashRing, ShardedProcessor
+from cloud.processing.stream_processor import StreamProcessor
+
+def rec(tenant, site, machine, ts, status, load=10.0):
+    return {
+        "record_id": f"{machine}_{ts}", "tenant_id": tenant, "site_id": site, "machine_id": machine,
+        "timestamp": f"2026-01-12T10:00:{ts:02d}Z", "status": status, "metrics": {"spindle_load_pct": load}
+    }
+
+class TestHashRing(unittest.TestCase):
+    def test_stable_and_balanced(self):
+        ring = HashRing(4)
+        keys = [f"t:s:m{i}" for i in range(2000)]
+        owners = [ring.shard_for(k) for k in keys]
+        self.assertEqual(owners, [HashRing(4).shard_for(k) for k in keys])
+        counts = [owners.count(s) for s in range(4)]
+        self.assertGreater(min(counts), 300)
+
+    def test_adding_a_shard_moves_few_keys(self):
+        keys = [f"t:s:m{i}" for i in range(2000)]
+        before, after = HashRing(4), HashRing(5)
+        moved = sum(before.shard_for(k) != after.shard_for(k) for k in keys)
+        self.assertLess(moved, len(keys) * 0.35)
+
+class TestShardedProcessor(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.processor = ShardedProcessor(2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.processor.close()
+
+    def test_matches_single_process_results(self):
+        batch = []
+        for m in range(6):
+            batch += [rec("t1", f"s{m % 2}", f"m{m}", 1, "RUNNING"), rec("t1", f"s{m % 2}", f"m{m}", 2, "STOPPED", 95.0)]
+        batch.append(rec("t2", "s0", "m0", 1, "RUNNING"))
+
+        local = StreamProcessor()
+        asyncio.run(local.process_batch(batch))
+        asyncio.run(self.processor.process_batch(batch))
+
+        self.assertEqual(self.processor.machine_states("t1"), local.machine_states("t1"))
+        self.assertEqual(set(self.processor.machine_states("t1", "s0")), {"t1:s0:m0", "t1:s0:m2", "t1:s0:m4"})
+        self.assertEqual(self.processor.machine_events("t1", "s1"), local.machine_events("t1", "s1"))
+        self.assertEqual(sorted(self.processor.seen_event_ids()), sorted(local.seen_event_ids()))
+        self.assertEqual(self.processor.site_view("t1", "s0")["fleet"], local.site_view("t1", "s0")["fleet"])
+        self.assertEqual(self.processor.site_view("t1")["machines"], local.site_view("t1")["machines"])
+
+    def test_snapshot_round_trip(self):
+        asyncio.run(self.processor.process_batch([rec("t3", "s0", f"m{m}", 1, "RUNNING") for m in range(4)]))
+        snapshot = self.processor.snapshot()
+        self.assertEqual(len([k for k in snapshot["state"] if k.startswith("t3:")]), 4)
+
+        restored = StreamProcessor()
+        restored.restore(snapshot)
+        self.assertEqual(restored.machine_states("t3"), self.processor.machine_states("t3"))
+
+        # Routed back to the owning shards
+        self.processor.restore({"state": {"t4:s0:m0": rec("t4", "s0", "m0", 1, "RUNNING")}, "events": {}})
+        self.assertEqual(list(self.processor.machine_states("t4")), ["t4:s0:m0"])
+
+class TestShardFailure(unittest.TestCase):
+    def test_stalled_and_killed_worker(self):
+        processor = ShardedProcessor(2, batch_timeout=0.5, monitor_interval=0.1)
+        try:
+            batch = [rec("t5", "s0", "m0", 1, "RUNNING")]
+            shard = processor.ring.shard_for("t5:s0:m0")
+            worker = processor._workers[shard]
+            asyncio.run(processor.process_batch(batch))
+
+            # A stalled worker times the batch out instead of hanging the bus
+            os.kill(worker.pid, signal.SIGSTOP)
+            with self.assertRaises(asyncio.TimeoutError):
+                asyncio.run(processor.process_batch(batch))
+
+            # Killing it fails what it still owed and brings up a fresh shard
+            pending = processor._send(shard, "machine_states", None, None)
+            worker.kill()
+            with self.assertRaisesRegex(RuntimeError, f"shard {shard} exited"):
+                pending.result(timeout=5)
+            self.assertEqual(processor.machine_states("t5"), {})
+            self.assertIsNot(processor._workers[shard], worker)
+            asyncio.run(processor.process_batch(batch))
+            self.assertEqual(list(processor.machine_states("t5")), ["t5:s0:m0"])
+        finally:
+            processor.close()
+
+if __name__ == "__main__":
+    unittest.main()
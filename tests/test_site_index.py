@@ -0,0 +1,83 @@
+import asyncio
+import unittest
+from cloud.processing.site_index import SiteIndex, fleet_bucket
+from cloud.processing.stream_processor import StreamProcessor
+from cloud.processing.notify import dispatcher
+
+def record(tenant, site, machine, status, minute, load=50.0):
+    return {
+        "record_id": f"{machine}:{minute}", "tenant_id": tenant, "site_id": site, "machine_id": machine,
+        "timestamp": f"2026-01-12T10:{minute:02d}:00Z", "status": status, "metrics": {"spindle_load_pct": load}
+    }
+
+class TestSiteIndex(unittest.TestCase):
+    def test_fleet_counts_follow_status_changes(self):
+        index = SiteIndex()
+        index.update_state("t1:s1:m1", {"status": "RUNNING"})
+        index.update_state("t1:s1:m2", {"status": "IDLE"})
+        index.update_state("t1:s1:m1", {"status": "ALARM"})
+        index.update_state("t1:s2:m3", {"status": None})
+
+        self.assertEqual(index.view("t1", "s1")["fleet"], {"total": 2, "running": 0, "idle": 1, "alarm": 1, "offline": 0})
+        self.assertEqual(index.view("t1")["fleet"]["total"], 3)
+        self.assertEqual(index.view("t1", "missing")["machines"], {})
+        self.assertEqual(index.view("t2")["fleet"]["total"], 0)
+
+    def test_alerts_keep_newest_per_site(self):
+        index = SiteIndex(alerts_per_site=3)
+        for minute in (5, 1, 9, 3, 7):
+            index.add_alert("t1:s1:m1", {"timestamp": f"2026-01-12T10:{minute:02d}:00Z", "minute": minute})
+        index.add_alert("t1:s2:m2", {"timestamp": "2026-01-12T10:08:00Z", "minute": 8})
+
+        self.assertEqual([a["minute"] for a in index.view("t1", "s1")["alerts"]], [9, 7, 5])
+        self.assertEqual([a["minute"] for a in index.view("t1", top_n=2)["alerts"]], [9, 8])
+
+    def test_version_changes_only_for_touched_site(self):
+        index = SiteIndex(alerts_per_site=1)
+        index.update_state("t1:s1:m1", {"status": "RUNNING"})
+        index.update_state("t1:s2:m2", {"status": "RUNNING"})
+        s1, tenant = index.version("t1", "s1"), index.version("t1")
+
+        index.update_state("t1:s2:m2", {"status": "IDLE"})
+        self.assertEqual(index.version("t1", "s1"), s1)
+        self.assertGreater(index.version("t1"), tenant)
+
+        index.add_alert("t1:s1:m1", {"timestamp": "2026-01-12T10:05:00Z"})
+        s1 = index.version("t1", "s1")
+        # Older than everything kept: the view is unchanged
+        index.add_alert("t1:s1:m1", {"timestamp": "2026-01-12T10:00:00Z"})
+        self.assertEqual(index.version("t1", "s1"), s1)
+
+    def test_fleet_bucket(self):
+        self.assertEqual([fleet_bucket(s) for s in ("active", "IDLE", "FAULT", "STOPPED", None)],
+                         ["running", "idle", "alarm", "offline", "offline"])
+
+class TestProcessorSiteView(unittest.TestCase):
+    def setUp(self):
+        dispatcher.notification_log = []
+        dispatcher.rate_limits = {}
+
+    def test_matches_full_scan(self):
+        processor = StreamProcessor()
+        batch = [record("t1", f"s{m % 2}", f"m{m}", "RUNNING", m, load=95.0 if m % 3 == 0 else 40.0) for m in range(8)]
+        batch += [record("t1", "s0", "m0", "STOPPED", 30), record("t2", "s0", "m0", "RUNNING", 1)]
+        asyncio.run(processor.process_batch(batch))
+
+        view = processor.site_view("t1", "s0")
+        scanned = {k.split(":", 2)[2]: v for k, v in processor.machine_states("t1", "s0").items()}
+        self.assertEqual(view["machines"], scanned)
+        self.assertEqual(view["fleet"], {"total": 4, "running": 3, "idle": 0, "alarm": 0, "offline": 1})
+
+        events = [e for evs in processor.machine_events("t1", "s0").values() for e in evs]
+        newest = sorted(events, key=lambda e: e["timestamp"], reverse=True)[:20]
+        self.assertEqual([e["event_id"] for e in view["alerts"]], [e["event_id"] for e in newest])
+
+    def test_restore_rebuilds_index(self):
+        before = StreamProcessor()
+        asyncio.run(before.process_batch([record("t1", "s1", "m1", "RUNNING", 1, load=95.0)]))
+        after = StreamProcessor()
+        after.restore(before.snapshot())
+        self.assertEqual(after.site_view("t1", "s1"), before.site_view("t1", "s1"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+from cloud.processing.stats_rollup import StatsRollup, daily_merge_sql, hourly_merge_sql
+
+NOW = datetime(2026, 1, 12, 10, 25, tzinfo=timezone.utc)
+
+def params(call):
+    return {p.name: p.value for p in call.kwargs["job_config"].query_parameters}
+
+class TestStatsRollup(unittest.TestCase):
+    def client(self, watermark):
+        client = MagicMock()
+        client.query.return_value.result.return_value = [{"hour_bucket": watermark}]
+        client.query.return_value.num_dml_affected_rows = 3
+        client.query.return_value.total_bytes_processed = 1024
+        return client
+
+    def test_merge_sql_reads_only_the_rewritten_range(self):
+        sql = hourly_merge_sql("p", "d")
+        self.assertIn("MERGE `p.d.hourly_machine_stats` T", sql)
+        self.assertIn("WHERE timestamp >= @since AND timestamp < @until", sql)
+        self.assertIn("ON T.hour_bucket >= @since AND T.hour_bucket < @until", sql)
+        self.assertIn("PARTITION BY tenant_id, machine_id", sql)
+        self.assertIn("IN ('ALARM', 'FAULT', 'ERROR')", sql)
+
+        daily = daily_merge_sql("p", "d")
+        self.assertIn("FROM `p.d.hourly_machine_stats`", daily)
+        self.assertIn("WHERE hour_bucket >= TIMESTAMP(DATE(@since))", daily)
+        self.assertIn("ON T.day >= DATE(@since)", daily)
+
+    def test_resumes_from_watermark_minus_grace(self):
+        client = self.client(datetime(2026, 1, 12, 9, tzinfo=timezone.utc))
+        result = StatsRollup(client, "p", "d", grace_hours=6).run(now=NOW)
+
+        watermark_call, hourly_call, daily_call = client.query.call_args_list
+        since = datetime(2026, 1, 12, 3, tzinfo=timezone.utc)
+        self.assertEqual(params(watermark_call), {"floor": NOW - timedelta(days=30)})
+        self.assertEqual(params(hourly_call), {"since": since, "until": NOW})
+        self.assertEqual(params(daily_call), {"since": since})
+        self.assertEqual(result["hourly_rows"], 3)
+        self.assertEqual(result["bytes_processed"], 2048)
+
+    def test_empty_table_backfills(self):
+        client = self.client(None)
+        StatsRollup(client, "p", "d", backfill_days=7).run(now=NOW)
+        self.assertEqual(params(client.query.call_args_list[1])["since"], datetime(2026, 1, 5, 10, tzinfo=timezone.utc))
+
+    def test_explicit_range_skips_watermark(self):
+        client = self.client(None)
+        StatsRollup(client, "p", "d").run(since=datetime(2026, 1, 1, 4, 30, tzinfo=timezone.utc), now=NOW)
+        self.assertEqual(client.query.call_count, 2)
+        self.assertEqual(params(client.query.call_args_list[0])["since"], datetime(2026, 1, 1, 4, tzinfo=timezone.utc))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import json
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+from cloud.processing.telemetry_sink import (
+    TelemetrySink, SinkBackend, SQLiteSinkBackend, StreamingInsertBackend, build_telemetry_sink
+)
+
+class RecordingBackend(SinkBackend):
+    def __init__(self, fail_index=None):
+        self.calls = []
+        self.fail_index = fail_index
+
+    def append_rows(self, rows, row_ids):
+        self.calls.append(list(rows))
+        if self.fail_index is not None and self.fail_index < len(rows):
+            return [{"index": self.fail_index, "errors": [{"reason": "invalid"}]}]
+        return []
+
+class TestTelemetrySink(unittest.TestCase):
+    def test_coalesces_concurrent_writers(self):
+        backend = RecordingBackend()
+        sink = TelemetrySink(backend, max_linger_ms=100)
+        results = []
+
+        def writer(i):
+            results.append(sink.write([{"record_id": f"r{i}"}], row_ids=[f"r{i}"]))
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(8)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+
+        self.assertEqual(results, [[]] * 8)
+        self.assertEqual(sum(len(c) for c in backend.calls), 8)
+        self.assertLess(len(backend.calls), 8)
+        self.assertEqual(sink.backlog()["rows"], 0)
+
+    def test_row_budget_splits_batches(self):
+        backend = RecordingBackend()
+        sink = TelemetrySink(backend, max_batch_rows=3, max_linger_ms=50)
+        futures = [sink.submit([{"n": i}, {"n": i}]) for i in range(3)]
+        for f in futures:
+            f.result(timeout=5)
+        self.assertTrue(all(len(c) <= 3 for c in backend.calls))
+
+    def test_errors_reindexed_per_writer(self):
+        backend = RecordingBackend(fail_index=2)
+        sink = TelemetrySink(backend, max_linger_ms=100)
+        first = sink.submit([{"n": 0}, {"n": 1}])
+        second = sink.submit([{"n": 2}, {"n": 3}])
+        self.assertEqual(first.result(timeout=5), [])
+        self.assertEqual(second.result(timeout=5)[0]["index"], 0)
+
+    def test_sqlite_backend_dedups_row_ids(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "sink.db")
+            sink = TelemetrySink(SQLiteSinkBackend(path, "ds.raw_telemetry"), max_linger_ms=1)
+            sink.write([{"record_id": "a", "metrics": "{}"}], row_ids=["a"])
+            sink.write([{"record_id": "a", "metrics": "{}"}], row_ids=["a"])
+            with sqlite3.connect(path) as conn:
+                rows = conn.execute("SELECT payload FROM sink_rows").fetchall()
+            self.assertEqual(len(rows), 1)
+            self.assertEqual(json.loads(rows[0][0])["record_id"], "a")
+
+    def test_storage_write_needs_shared_dedup(self):
+        # The default stream ignores row_ids: without a shared idempotency store, keep insertId dedup
+        for env in ({}, {"TELEMETRY_SINK": "storage_write"}, {"TELEMETRY_SINK": "storage_write", "IDEMPOTENCY_BACKEND": "none"}):
+            with patch.dict(os.environ, env, clear=True):
+                sink = build_telemetry_sink("ds", "raw_telemetry", ["record_id"], client_factory=MagicMock)
+                self.assertIsInstance(sink.backend, StreamingInsertBackend, env)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import json
+import unittest
+from datetime import date
+from unittest.mock import MagicMock
+
+from google.api_core.exceptions import BadRequest
+
+from cloud.processing.telemetry_sql import (
+    RAW_TELEMETRY_FIELDS, backfill_signal_columns_sql, metric_expr, recent, telemetry_row, time_range
+)
+from simco_agent.drivers.common.normalize import create_point, normalize_metrics
+from simco_agent.schemas import TelemetryPayload
+from simco_common.signals import SIGNAL_COLUMNS, merge_metrics, split_metrics
+from tools.migrate_typed_metrics import migrate
+
+RECORD = {
+    "record_id": "gw1:1", "tenant_id": "t1", "site_id": "s1", "machine_id": "m1", "device_id": "gw1",
+    "timestamp": "2026-01-12T10:00:00Z", "status": "RUNNING", "gateway_id": "gw1",
+    "metrics": {"spindle_load": 42, "part_count": "17", "execution_state": "ACTIVE",
+                "feed_rate": "fast", "coolant_temp": 21.5},
+}
+
+class TestSignalCatalog(unittest.TestCase):
+    def test_split_promotes_catalog_signals_with_their_types(self):
+        typed, overflow = split_metrics(RECORD["metrics"])
+        self.assertEqual(typed, {"spindle_load": 42.0, "part_count": 17, "execution_state": "ACTIVE"})
+        # Unknown metrics and values that do not fit their column stay in the JSON overflow
+        self.assertEqual(overflow, {"feed_rate": "fast", "coolant_temp": 21.5})
+
+    def test_ingest_row_round_trips_through_merge(self):
+        row = telemetry_row(RECORD)
+        self.assertNotIn("gateway_id", row)
+        self.assertEqual(row["spindle_load"], 42.0)
+        self.assertEqual(json.loads(row["metrics"]), {"feed_rate": "fast", "coolant_temp": 21.5})
+        self.assertTrue(set(row) <= set(RAW_TELEMETRY_FIELDS))
+
+        self.assertEqual(merge_metrics(row), {"spindle_load": 42.0, "part_count": 17, "execution_state": "ACTIVE",
+                                              "feed_rate": "fast", "coolant_temp": 21.5})
+        # Rows written before the migration carry everything in the JSON
+        self.assertEqual(merge_metrics({"metrics": '{"spindle_load": 5}', "spindle_load": None}), {"spindle_load": 5})
+
+    def test_edge_normalizer_uses_catalog_names_and_types(self):
+        self.assertEqual(normalize_metrics({"SpindleSpeed": "1200", "PartCount": 3.0, "Execution": "running",
+                                            "vendor_flag": True}),
+                         {"spindle_speed": 1200.0, "part_count": 3, "execution_state": "ACTIVE", "vendor_flag": True})
+        # The catalog name wins over an alias of it
+        self.assertEqual(normalize_metrics({"spindle_speed": 900, "SpindleSpeed": 1200}), {"spindle_speed": 900.0})
+        point = create_point("SpindleLoad", "55.5")
+        self.assertEqual((point.name, point.value), ("spindle_load", 55.5))
+        # MTConnect drivers emit path_feedrate
+        self.assertEqual(normalize_metrics({"path_feedrate": "250"}), {"feed_rate": 250.0})
+
+    def test_agent_records_carry_catalog_metrics(self):
+        payload = TelemetryPayload(machine_id="m1", status="RUNNING", spindle_load=42, feed_rate=250)
+        metrics = payload.to_v3_record("t1", "s1", "gw1")["metrics"]
+        self.assertEqual(telemetry_row({"metrics": metrics})["feed_rate"], 250.0)
+        self.assertEqual(metrics["program_name"], "")
+
+    def test_query_builders(self):
+        self.assertEqual(metric_expr("spindle_load"), "spindle_load")
+        self.assertEqual(metric_expr("coolant_temp"), "SAFE_CAST(JSON_VALUE(metrics, '$.coolant_temp') AS FLOAT64)")
+        self.assertEqual(time_range(), "timestamp >= @start_ts AND timestamp < @end_ts")
+        self.assertNotIn("CAST(timestamp", recent(days=7))
+
+        sql = backfill_signal_columns_sql("p", "d")
+        self.assertIn("WHERE timestamp >= @start_ts AND timestamp < @end_ts", sql)
+        for column in SIGNAL_COLUMNS:
+            self.assertIn(f"{column} = COALESCE({column},", sql)
+
+    def test_migration_skips_days_in_the_streaming_buffer(self):
+        client = MagicMock()
+        client.query.return_value.result.side_effect = [
+            BadRequest("UPDATE would affect rows in the streaming buffer, which is not supported"), None]
+        client.query.return_value.num_dml_affected_rows = 3
+        client.query.return_value.total_bytes_processed = 0
+        skipped = migrate(client, "p", "d", date(2026, 1, 11), date(2026, 1, 12), dry_run=False, skip_alter=True)
+        self.assertEqual(skipped, [date(2026, 1, 12)])
+        self.assertEqual(client.query.call_count, 2)
+
+        client.query.return_value.result.side_effect = BadRequest("Syntax error")
+        with self.assertRaises(BadRequest):
+            migrate(client, "p", "d", date(2026, 1, 12), date(2026, 1, 12), dry_run=False, skip_alter=True)
+
+if __name__ == "__main__":
+    unittest.main()
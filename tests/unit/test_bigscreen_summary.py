@@ -8,10 +8,11 @@ import sys
 from unittest.mock import MagicMock
 
 class MockResponse:
-    def __init__(self, data, status=200, mimetype=None):
+    def __init__(self, data=None, status=200, mimetype=None, headers=None):
         self.data = data
         self.status = status
         self.mimetype = mimetype
+        self.headers = headers or {}
 
 mock_https = MagicMock()
 mock_https.Response = MockResponse
@@ -38,25 +39,30 @@ main.https_fn.Response = MockResponse
 def test_bigscreen_summary_basic(mock_rbac, mock_bq, mock_processor):
     # Setup mocks
     mock_rbac.return_value = (True, None)
+    main._bigscreen_snapshots.clear()
+    mock_processor.site_version.return_value = 1
     
-    mock_processor.state_store = {
-        "t1:s1:m1": {
-            "tenant_id": "t1",
-            "site_id": "s1",
-            "machine_id": "m1",
-            "status": "RUNNING",
-            "timestamp": "2026-01-13T08:00:00Z",
-            "metrics": {"spindle_load": 50}
-        }
-    }
-    mock_processor.event_store = {
-        "t1:s1:m1": [
-            {"severity": "HIGH", "event_type": "ALARM", "message": "Test Alarm", "timestamp": "2026-01-13T08:01:00Z"}
+    # Site index view (StreamProcessor / ShardedProcessor), already scoped to t1:s1
+    mock_processor.site_view.return_value = {
+        "machines": {
+            "m1": {
+                "tenant_id": "t1",
+                "site_id": "s1",
+                "machine_id": "m1",
+                "status": "RUNNING",
+                "timestamp": "2026-01-13T08:00:00Z",
+                "metrics": {"spindle_load": 50}
+            }
+        },
+        "fleet": {"total": 1, "running": 1, "idle": 0, "alarm": 0, "offline": 0},
+        "alerts": [
+            {"machine_id": "m1", "severity": "HIGH", "event_type": "ALARM", "message": "Test Alarm", "timestamp": "2026-01-13T08:01:00Z"}
         ]
     }
     
     # Mock request
     mock_req = MagicMock()
+    mock_req.headers = {}
     
     # Call function
     response = _bigscreen_summary(mock_req, "t1", "s1")
@@ -74,6 +80,7 @@ def test_bigscreen_summary_basic(mock_rbac, mock_bq, mock_processor):
     assert data["machines"][0]["status"] == "RUNNING"
     assert len(data["alerts"]) == 1
     assert data["alerts"][0]["message"] == "Test Alarm"
+    mock_processor.site_view.assert_called_once_with("t1", "s1", 20)
 
 @patch("main.check_rbac")
 def test_bigscreen_summary_unauthorized(mock_rbac):
@@ -85,3 +92,43 @@ def test_bigscreen_summary_unauthorized(mock_rbac):
     assert response.status == 403
     data = json.loads(response.data)
     assert data["error"] == "Access Denied"
+
+@patch("main.processor")
+@patch("main.get_bq_client")
+@patch("main.check_rbac")
+def test_bigscreen_summary_etag_and_invalidation(mock_rbac, mock_bq, mock_processor):
+    mock_rbac.return_value = (True, None)
+    main._bigscreen_snapshots.clear()
+    mock_processor.site_version.return_value = 7
+    mock_processor.site_view.return_value = {
+        "machines": {"m1": {"machine_id": "m1", "status": "IDLE", "timestamp": "2026-01-13T08:00:00Z"}},
+        "fleet": {"total": 1, "running": 0, "idle": 1, "alarm": 0, "offline": 0},
+        "alerts": [{"machine_id": "m1", "severity": "LOW", "event_type": "X", "message": "x", "timestamp": "2026-01-13T08:00:00Z"}],
+    }
+    mock_req = MagicMock()
+    mock_req.headers = {}
+
+    first = _bigscreen_summary(mock_req, "t1", "s1")
+    etag = first.headers["ETag"]
+    assert first.status == 200 and etag
+
+    # Unchanged site: 304, no rebuild, no BigQuery
+    mock_req.headers = {"If-None-Match": etag}
+    second = _bigscreen_summary(mock_req, "t1", "s1")
+    assert second.status == 304
+    assert second.headers["ETag"] == etag
+    assert mock_processor.site_view.call_count == 1
+    mock_bq.assert_not_called()
+
+    # A display without the ETag gets the same serialized body
+    mock_req.headers = {}
+    assert _bigscreen_summary(mock_req, "t1", "s1").data == first.data
+
+    # New record for the site: rebuilt with a new ETag
+    mock_processor.site_version.return_value = 8
+    mock_processor.site_view.return_value["fleet"] = {"total": 1, "running": 1, "idle": 0, "alarm": 0, "offline": 0}
+    mock_req.headers = {"If-None-Match": etag}
+    third = _bigscreen_summary(mock_req, "t1", "s1")
+    assert third.status == 200
+    assert third.headers["ETag"] != etag
+    assert json.loads(third.data)["fleet"]["running"] == 1
@@ -0,0 +1,38 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../functions")))
+
+import coldstart
+from scripts.observability.profile_cold_start import parse_importtime
+
+def test_lazy_module_defers_import():
+    mod = coldstart.LazyModule("json")
+    assert mod._module is None
+    assert mod.dumps({"a": 1}) == '{"a": 1}'
+    assert mod._module is not None
+
+def test_shared_client_created_once():
+    calls = []
+    def factory():
+        calls.append(1)
+        return object()
+    first = coldstart.shared_client("test_client", factory)
+    second = coldstart.shared_client("test_client", factory)
+    assert first is second
+    assert len(calls) == 1
+
+def test_warm_up_unknown_endpoint_is_noop():
+    assert coldstart.warm_up("no_such_function") == {}
+
+def test_parse_importtime():
+    stderr = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       120 |        120 |     json.decoder",
+        "import time:       300 |        420 |   json",
+        "import time:        50 |        470 | main",
+    ])
+    entries = parse_importtime(stderr)
+    assert [e["module"] for e in entries] == ["json.decoder", "json", "main"]
+    assert [e["depth"] for e in entries] == [2, 1, 0]
+    assert entries[-1]["cumulative_us"] == 470
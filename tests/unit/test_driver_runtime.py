@@ -54,3 +54,22 @@ async def test_driver_lifecycle(runtime):
     await runtime.stop_driver("machine-1")
     assert "machine-1" not in runtime._active_drivers
     assert not driver.is_connected()
+
+class VendorDriver(MockDriver):
+    async def sample(self) -> List[TelemetryPoint]:
+        return [TelemetryPoint(name="path_feedrate", value="250", timestamp="2023-01-01"),
+                TelemetryPoint(name="Execution", value="running", timestamp="2023-01-01"),
+                TelemetryPoint(name="execution_state", value="PROGRAM_STOPPED", timestamp="2023-01-01")]
+
+@pytest.mark.asyncio
+async def test_sampled_points_are_normalized(runtime):
+    DriverRuntime.register_implementation("vendor-driver", VendorDriver)
+    match = DriverMatch(manifest=DriverManifest(name="vendor-driver", version="1.0"), score=1.0)
+    await runtime.start_driver("machine-2", match, "mock://vendor")
+
+    points = (await runtime.sample_all())["machine-2"]
+    # Catalog names and types; unmapped execution states are kept, not turned into UNKNOWN
+    assert [(p.name, p.value) for p in points] == [
+        ("feed_rate", 250.0), ("execution_state", "ACTIVE"), ("execution_state", "PROGRAM_STOPPED")]
+
+    await runtime.stop_driver("machine-2")
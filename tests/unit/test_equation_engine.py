@@ -0,0 +1,77 @@
+import ast
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../functions")))
+
+from equation_engine import LocalUnsupported, compile_local, evaluate
+
+VARS = {
+    "telemetry_samples": {"src": "telemetry", "local": "count:samples"},
+    "spindle_load_avg": {"src": "telemetry", "local": "avg:spindle_load"},
+    "alarm_count": {"src": "events", "local": "count:alarms"},
+    "downtime_sec": {"src": "events", "local": "sum:downtime_sec"},
+    "erp_rows": {"src": "erp"},
+}
+
+START = datetime(2026, 1, 12, 0, tzinfo=timezone.utc)
+END = START + timedelta(hours=48)
+
+def hour(h):
+    return START + timedelta(hours=h)
+
+# Hourly per-machine rollup rows, as the rollup query returns them (FULL OUTER JOIN: missing side is None)
+ROWS = [
+    {"hour": hour(1), "machine_id": "m1", "samples": 10, "spindle_load_sum": 500.0, "spindle_load_n": 10,
+     "events": 2, "alarms": 1, "downtime_sec": 30.0},
+    {"hour": hour(2), "machine_id": "m1", "samples": 30, "spindle_load_sum": 900.0, "spindle_load_n": 30,
+     "events": None, "alarms": None, "downtime_sec": None},
+    {"hour": hour(3), "machine_id": "m2", "samples": 5, "spindle_load_sum": None, "spindle_load_n": 0,
+     "events": 1, "alarms": 1, "downtime_sec": 0.0},
+    {"hour": hour(26), "machine_id": "m1", "samples": None, "spindle_load_sum": None, "spindle_load_n": None,
+     "events": 4, "alarms": 2, "downtime_sec": 60.0},
+    {"hour": hour(50), "machine_id": "m1", "samples": 99, "spindle_load_sum": 99.0, "spindle_load_n": 99,
+     "events": 9, "alarms": 9, "downtime_sec": 9.0},  # outside the window
+]
+
+def run(equation, group_by, start=START, end=END):
+    plan = compile_local(ast.parse(equation, mode="eval"), VARS)
+    return evaluate(plan, VARS, ROWS, group_by, start, end)
+
+def test_average_is_exact_across_hours():
+    # (500 + 900) / (10 + 30), not the mean of the hourly means
+    assert run("spindle_load_avg", "none") == [{"value": 35.0}]
+    assert run("spindle_load_avg", "machine") == [{"machine_id": "m1", "value": 35.0},
+                                                  {"machine_id": "m2", "value": 0.0}]
+
+def test_groups_follow_sql_join_semantics():
+    # Day 2 has only events: no telemetry group, so a telemetry-only equation has no row for it
+    assert run("telemetry_samples", "day") == [{"day": "2026-01-12", "value": 45}]
+    assert run("alarm_count + telemetry_samples", "day") == [{"day": "2026-01-12", "value": 47},
+                                                            {"day": "2026-01-13", "value": 2}]
+
+def test_counts_stay_integers_and_division_is_safe():
+    rows = run("alarm_count / telemetry_samples", "machine")
+    assert rows == [{"machine_id": "m1", "value": 3 / 40}, {"machine_id": "m2", "value": 0.2}]
+    assert isinstance(run("alarm_count * 2", "none")[0]["value"], int)
+    assert run("downtime_sec / NULLIF(alarm_count, 4)", "none") == [{"value": None}]
+    assert run("alarm_count / (telemetry_samples - telemetry_samples)", "none") == [{"value": None}]
+
+def test_functions():
+    assert run("ROUND(downtime_sec / 36, 1)", "none") == [{"value": 2.5}]
+    assert run("ROUND(-2.5 + alarm_count - alarm_count)", "none") == [{"value": -3.0}]  # half away from zero
+    assert run("SQRT(-alarm_count)", "none") == [{"value": None}]
+    assert run("ABS(-alarm_count)", "none") == [{"value": 4}]
+
+def test_window_filters_hours():
+    assert run("telemetry_samples", "none", start=hour(2), end=hour(3)) == [{"value": 30}]
+    assert run("telemetry_samples", "none", start=hour(60), end=hour(61)) == []
+
+def test_erp_and_constant_equations_need_bigquery():
+    with pytest.raises(LocalUnsupported):
+        compile_local(ast.parse("erp_rows + alarm_count", mode="eval"), VARS)
+    with pytest.raises(LocalUnsupported):
+        compile_local(ast.parse("1 + 2", mode="eval"), VARS)
@@ -0,0 +1,78 @@
+import gzip
+import io
+import json
+import os
+import sys
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../functions")))
+
+from ingest_api.decoding import (PayloadDecodeError, PayloadTooLarge, chunked, iter_items,
+                                 iter_ndjson, read_json)
+from cloud.processing.idempotency import IdempotencyCache
+from simco_common.schemas_v3 import TelemetryRecordV3, content_record_id
+
+class FakeRequest:
+    def __init__(self, body: bytes, mimetype="application/json", encoding=None, content_length=None):
+        self.stream = io.BytesIO(body)
+        self.mimetype = mimetype
+        self.content_length = content_length
+        self.headers = {"Content-Encoding": encoding} if encoding else {}
+
+ROWS = [{"record_id": f"r{i}", "metrics": {"load": i}} for i in range(5)]
+NDJSON = "\n".join(json.dumps(r) for r in ROWS).encode()
+
+def test_ndjson_plain_and_gzip():
+    assert list(iter_ndjson(FakeRequest(NDJSON + b"\n\n", "application/x-ndjson"), 10_000)) == ROWS
+    gz = FakeRequest(gzip.compress(NDJSON), "application/x-ndjson", encoding="gzip")
+    assert list(iter_ndjson(gz, 10_000)) == ROWS
+
+def test_ndjson_lines_split_across_blocks(monkeypatch):
+    import ingest_api.decoding as decoding
+    monkeypatch.setattr(decoding, "READ_BLOCK_BYTES", 7)
+    assert list(iter_ndjson(FakeRequest(NDJSON, "application/x-ndjson"), 10_000)) == ROWS
+
+def test_iter_items_json_forms():
+    assert list(iter_items(FakeRequest(json.dumps(ROWS).encode()), 10_000)) == ROWS
+    assert list(iter_items(FakeRequest(json.dumps(ROWS[0]).encode()), 10_000)) == [ROWS[0]]
+    assert list(iter_items(FakeRequest(b""), 10_000)) == []
+
+def test_gzip_json_document():
+    assert read_json(FakeRequest(gzip.compress(json.dumps(ROWS).encode()), encoding="gzip"), 10_000) == ROWS
+
+def test_size_limits():
+    with pytest.raises(PayloadTooLarge):
+        read_json(FakeRequest(NDJSON, content_length=len(NDJSON)), 10)
+    with pytest.raises(PayloadTooLarge):
+        read_json(FakeRequest(NDJSON), 10)
+    # Small on the wire, large once inflated
+    bomb = gzip.compress(b" " * 1_000_000)
+    with pytest.raises(PayloadTooLarge):
+        read_json(FakeRequest(bomb, encoding="gzip"), 100_000)
+
+def test_decode_errors():
+    with pytest.raises(PayloadDecodeError, match="line 2"):
+        list(iter_ndjson(FakeRequest(b'{"a": 1}\n{bad', "application/x-ndjson"), 10_000))
+    with pytest.raises(PayloadDecodeError):
+        read_json(FakeRequest(b"not gzip", encoding="gzip"), 10_000)
+    with pytest.raises(PayloadDecodeError):
+        read_json(FakeRequest(b"{}", encoding="br"), 10_000)
+
+def test_chunked():
+    assert list(chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+def test_ndjson_records_without_ids_are_not_collapsed():
+    reading = {"tenant_id": "t1", "site_id": "s1", "machine_id": "m1", "timestamp": "2026-01-12T10:00:00Z",
+               "status": "ACTIVE"}
+    body = "\n".join(json.dumps(dict(reading, metrics={"spindle_load": load})) for load in (10, 20)).encode()
+    records = [TelemetryRecordV3(**dict(d, record_id=content_record_id(d)))
+               for d in iter_ndjson(FakeRequest(body, "application/x-ndjson"), 10_000)]
+
+    # Same machine, same second: both records get their own dedup key and are ingested
+    keys = [f"record:{r.tenant_id}:{r.record_id}" for r in records]
+    cache = IdempotencyCache()
+    assert cache.seen(keys) == set()
+    cache.mark(keys)
+    assert len(set(keys)) == 2
+    # An exact resend of a reading maps to the same id
+    assert content_record_id(dict(reading, metrics={"spindle_load": 10})) == records[0].record_id
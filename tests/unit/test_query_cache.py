@@ -0,0 +1,141 @@
+import os
+import sys
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../functions")))
+
+from query_cache import QueryCache, normalize_sql
+
+class Param:
+    def __init__(self, name, type_, value):
+        self.name, self.type_, self.value = name, type_, value
+
+class JobConfig:
+    def __init__(self, *params):
+        self.query_parameters = list(params)
+
+class FakeClient:
+    """BigQuery client stand-in: counts jobs, optionally blocks or fails them."""
+    def __init__(self, rows=None, delay=0.0, project="proj"):
+        self.project = project
+        self.rows = rows if rows is not None else [{"n": 1}]
+        self.delay = delay
+        self.calls = 0
+        self.fail = False
+        self._lock = threading.Lock()
+
+    def query(self, sql, job_config=None):
+        with self._lock:
+            self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("bq down")
+        job = MagicMock()
+        job.result.return_value = list(self.rows)
+        job.total_bytes_processed = 1024
+        return job
+
+SQL = "SELECT * FROM t WHERE tenant_id = @tid"
+
+def test_hit_after_miss_and_whitespace_insensitive_key():
+    cache, client = QueryCache(), FakeClient()
+    assert cache.query(client, SQL, JobConfig(Param("tid", "STRING", "t1"))) == [{"n": 1}]
+    assert cache.query(client, "SELECT *\n  FROM t\n WHERE tenant_id = @tid ", JobConfig(Param("tid", "STRING", "t1"))) == [{"n": 1}]
+    assert client.calls == 1
+    assert normalize_sql(" a\n\tb  c ") == "a b c"
+
+def test_params_and_project_are_part_of_the_key():
+    cache, client = QueryCache(), FakeClient()
+    cache.query(client, SQL, JobConfig(Param("tid", "STRING", "t1")))
+    cache.query(client, SQL, JobConfig(Param("tid", "STRING", "t2")))
+    cache.query(FakeClient(project="other"), SQL, JobConfig(Param("tid", "STRING", "t1")))
+    assert client.calls == 2
+    assert cache.stats()["entries"] == 3
+
+def test_expired_entry_is_refetched():
+    cache, client = QueryCache(stale_factor=0, ttls={"fleet": 0.05}), FakeClient()
+    cache.query(client, SQL, query_class="fleet")
+    time.sleep(0.08)
+    cache.query(client, SQL, query_class="fleet")
+    assert client.calls == 2
+
+def test_stale_entry_served_while_refreshing():
+    cache, client = QueryCache(stale_factor=100, ttls={"fleet": 0.05}), FakeClient()
+    cache.query(client, SQL, query_class="fleet")
+    time.sleep(0.08)
+    client.rows = [{"n": 2}]
+    client.delay = 0.1
+    start = time.monotonic()
+    assert cache.query(client, SQL, query_class="fleet") == [{"n": 1}]
+    assert time.monotonic() - start < 0.05  # did not wait for the refresh
+    deadline = time.monotonic() + 2
+    while cache.stats()["inflight"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cache.query(client, SQL, query_class="fleet") == [{"n": 2}]
+    assert client.calls == 2
+
+def test_concurrent_misses_share_one_job():
+    cache, client = QueryCache(), FakeClient(delay=0.1)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.query(client, SQL))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert client.calls == 1
+    assert results == [[{"n": 1}]] * 8
+
+def test_errors_are_not_cached():
+    cache, client = QueryCache(), FakeClient()
+    client.fail = True
+    with pytest.raises(RuntimeError):
+        cache.query(client, SQL)
+    client.fail = False
+    assert cache.query(client, SQL) == [{"n": 1}]
+    assert client.calls == 2
+    assert cache.stats()["inflight"] == 0
+
+def test_lru_bounds_entries_and_rows():
+    cache, client = QueryCache(max_entries=2), FakeClient()
+    cache.query(client, "SELECT 1")
+    cache.query(client, "SELECT 2")
+    cache.query(client, "SELECT 1")  # touch: SELECT 2 is now least recent
+    cache.query(client, "SELECT 3")
+    cache.query(client, "SELECT 1")
+    assert client.calls == 3
+    cache.query(client, "SELECT 2")
+    assert client.calls == 4
+
+    big = QueryCache(max_rows=5, max_rows_per_entry=3)
+    wide = FakeClient(rows=[{"n": i} for i in range(3)])
+    big.query(wide, "SELECT a")
+    big.query(wide, "SELECT b")
+    assert big.stats() == {"entries": 1, "rows": 3, "inflight": 0}
+    huge = FakeClient(rows=[{"n": i} for i in range(4)])
+    big.query(huge, "SELECT c")
+    big.query(huge, "SELECT c")
+    assert huge.calls == 2  # larger than max_rows_per_entry: never cached
+
+def test_ttl_override_and_disable(monkeypatch):
+    cache, client = QueryCache(), FakeClient()
+    assert cache.ttl_for("analytics") == 300
+    assert cache.ttl_for("unknown") == cache.ttl_for("default")
+    monkeypatch.setenv("QUERY_CACHE_TTL_ASSETS", "0")
+    cache.query(client, SQL, query_class="assets")
+    cache.query(client, SQL, query_class="assets")
+    assert client.calls == 2
+    assert cache.stats()["entries"] == 0
+
+def test_invalidate():
+    cache, client = QueryCache(), FakeClient()
+    cache.query(client, "SELECT * FROM site_orders_now")
+    cache.query(client, "SELECT * FROM assets_current")
+    cache.invalidate("site_orders_now")
+    assert cache.stats()["entries"] == 1
+    cache.invalidate()
+    assert cache.stats() == {"entries": 0, "rows": 0, "inflight": 0}
@@ -2,6 +2,8 @@ from google.cloud import bigquery
 from google.api_core.exceptions import NotFound
 import logging
 
+from simco_common.signals import SIGNALS
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("bq_setup")
 
@@ -33,9 +35,11 @@ def setup_bigquery():
         bigquery.SchemaField("device_id", "STRING", mode="NULLABLE"),
         bigquery.SchemaField("timestamp", "TIMESTAMP", mode="REQUIRED"),
         bigquery.SchemaField("status", "STRING", mode="REQUIRED"),
-        bigquery.SchemaField("metrics", "JSON", mode="NULLABLE"), # JSON type is best for flexible metrics
+        bigquery.SchemaField("metrics", "JSON", mode="NULLABLE"), # Overflow: metrics outside the signal catalog
         bigquery.SchemaField("driver", "JSON", mode="NULLABLE")
     ]
+    # Typed columns for catalog signals (existing tables: tools/migrate_typed_metrics.py)
+    schema += [bigquery.SchemaField(s.name, s.bq_type, mode="NULLABLE") for s in SIGNALS]
     
     try:
         client.get_table(telemetry_ref)
@@ -153,5 +157,47 @@ def setup_bigquery():
         client.create_table(table)
         logger.info("Created table erp_machine_map.")
 
+    # 8. Hourly / Daily Machine Stats (written by the rollup_machine_stats job)
+    # Replaces the former hourly_machine_stats view over all of raw_telemetry
+    stats_schema = [
+        bigquery.SchemaField("tenant_id", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("site_id", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("machine_id", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("minutes_active", "FLOAT", mode="NULLABLE"),
+        bigquery.SchemaField("minutes_idle", "FLOAT", mode="NULLABLE"),
+        bigquery.SchemaField("minutes_alarm", "FLOAT", mode="NULLABLE"),
+        bigquery.SchemaField("minutes_stopped", "FLOAT", mode="NULLABLE"),
+        bigquery.SchemaField("samples", "INTEGER", mode="NULLABLE"),
+        bigquery.SchemaField("updated_at", "TIMESTAMP", mode="NULLABLE"),
+    ]
+    stats_tables = {
+        "hourly_machine_stats": (
+            [bigquery.SchemaField("hour_bucket", "TIMESTAMP", mode="REQUIRED")],
+            bigquery.TimePartitioning(type_=bigquery.TimePartitioningType.DAY, field="hour_bucket"),
+        ),
+        "daily_machine_stats": (
+            [bigquery.SchemaField("day", "DATE", mode="REQUIRED"), bigquery.SchemaField("hours", "INTEGER", mode="NULLABLE")],
+            bigquery.TimePartitioning(type_=bigquery.TimePartitioningType.MONTH, field="day"),
+        ),
+    }
+    for name, (extra_fields, partitioning) in stats_tables.items():
+        stats_ref = dataset_ref.table(name)
+        try:
+            existing = client.get_table(stats_ref)
+        except NotFound:
+            existing = None
+        if existing is not None and existing.table_type == "VIEW":
+            client.delete_table(stats_ref)
+            logger.info(f"Dropped view {name}.")
+            existing = None
+        if existing is not None:
+            logger.info(f"Table {name} exists.")
+            continue
+        table = bigquery.Table(stats_ref, schema=stats_schema[:3] + extra_fields + stats_schema[3:])
+        table.time_partitioning = partitioning
+        table.clustering_fields = ["tenant_id", "site_id", "machine_id"]
+        client.create_table(table)
+        logger.info(f"Created table {name}.")
+
 if __name__ == "__main__":
     setup_bigquery()
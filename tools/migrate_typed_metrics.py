@@ -0,0 +1,91 @@
+"""
+Schema migration for the typed metric columns of raw_telemetry.
+
+1. Adds one NULLABLE column per signal in simco_common/signals.py (metadata only).
+2. Backfills them from the `metrics` JSON, one daily partition per UPDATE,
+   newest day first, so each statement scans a single partition and the
+   dashboards' recent ranges are migrated first.
+
+Re-running is safe: filled columns are kept and the UPDATE only touches
+rows with a signal still missing from its column. The range ends yesterday
+by default: DML cannot touch rows still in the streaming buffer, so days
+that hit it are skipped and reported for a later run.
+
+    python -m tools.migrate_typed_metrics --project solidcamal --dataset simco_telemetry --days 90 --dry-run
+"""
+import argparse
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+
+from cloud.processing.telemetry_sql import add_signal_columns_sql, backfill_signal_columns_sql
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("migrate_typed_metrics")
+
+def backfill_days(start: date, end: date):
+    """Days in [start, end], newest first."""
+    day = end
+    while day >= start:
+        yield day
+        day -= timedelta(days=1)
+
+def migrate(client, project_id: str, dataset: str, start: date, end: date, dry_run: bool = True,
+            skip_alter: bool = False):
+    if not skip_alter:
+        sql = add_signal_columns_sql(project_id, dataset)
+        if dry_run:
+            print(f"[DRY-RUN] Would apply: {sql}")
+        else:
+            client.query(sql).result()
+            logger.info("Typed metric columns added.")
+
+    sql = backfill_signal_columns_sql(project_id, dataset)
+    if dry_run:
+        print(f"[DRY-RUN] Would run per day {start}..{end}:\n{sql}")
+        return
+
+    from google.api_core.exceptions import BadRequest
+    from google.cloud import bigquery
+    total_rows = total_bytes = 0
+    skipped = []
+    for day in backfill_days(start, end):
+        day_start = datetime.combine(day, time.min, tzinfo=timezone.utc)
+        job = client.query(sql, job_config=bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ScalarQueryParameter("start_ts", "TIMESTAMP", day_start),
+            bigquery.ScalarQueryParameter("end_ts", "TIMESTAMP", day_start + timedelta(days=1)),
+        ]))
+        try:
+            job.result()
+        except BadRequest as e:
+            if "streaming buffer" not in str(e):
+                raise
+            logger.warning(f"{day}: skipped, rows still in the streaming buffer (re-run later)")
+            skipped.append(day)
+            continue
+        rows, nbytes = job.num_dml_affected_rows or 0, job.total_bytes_processed or 0
+        total_rows += rows
+        total_bytes += nbytes
+        logger.info(f"{day}: {rows} rows backfilled ({nbytes / 1e6:.1f} MB scanned)")
+    logger.info(f"Backfill done: {total_rows} rows, {total_bytes / 1e9:.2f} GB scanned")
+    if skipped:
+        logger.warning(f"Skipped days: {', '.join(str(d) for d in skipped)}")
+    return skipped
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--project", default="solidcamal")
+    parser.add_argument("--dataset", default="simco_telemetry")
+    parser.add_argument("--days", type=int, default=90, help="Backfill the last N days (raw_telemetry retention)")
+    parser.add_argument("--start", type=date.fromisoformat, help="First day to backfill (overrides --days)")
+    parser.add_argument("--end", type=date.fromisoformat, help="Last day to backfill (default: yesterday)")
+    parser.add_argument("--skip-alter", action="store_true", help="Columns already exist; backfill only")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    end = args.end or datetime.now(timezone.utc).date() - timedelta(days=1)
+    start = args.start or end - timedelta(days=args.days - 1)
+    client = None
+    if not args.dry_run:
+        from google.cloud import bigquery
+        client = bigquery.Client(project=args.project)
+    migrate(client, args.project, args.dataset, start, end, dry_run=args.dry_run, skip_alter=args.skip_alter)